@@ -1,5 +1,11 @@
+from __future__ import annotations
+
 from contextlib import contextmanager
 from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
 
 # Holds the music dir context
 _music_dir_var: ContextVar[bytes] = ContextVar("music_dir", default=b"")
@@ -23,3 +29,28 @@ def music_dir(value: bytes):
         yield
     finally:
         _music_dir_var.reset(token)
+
+
+# Holds the tables with a full-text index of their search fields
+_fts_tables_var: ContextVar[Collection[str]] = ContextVar(
+    "fts_tables", default=()
+)
+
+
+def get_fts_tables() -> Collection[str]:
+    """Get the tables whose search fields can be queried with a full-text
+    index in the current context.
+    """
+    return _fts_tables_var.get()
+
+
+@contextmanager
+def fts_tables(value: Collection[str]):
+    """Temporarily bind the tables with a full-text index for query
+    parsing.
+    """
+    token = _fts_tables_var.set(value)
+    try:
+        yield
+    finally:
+        _fts_tables_var.reset(token)
@@ -0,0 +1,186 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Aggregate functions for summarizing the results of database queries,
+see :meth:`beets.dbcore.Database.aggregate`.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, ClassVar
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from beets.dbcore.columnar import Columns
+    from beets.dbcore.db import Model
+
+
+def _sql_literal(value: Any) -> str | None:
+    """Get an SQL literal for `value`, or None if it has none."""
+    if isinstance(value, bool) or not isinstance(
+        value, (str, bytes, int, float)
+    ):
+        return None
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    if isinstance(value, str):
+        return "'{}'".format(value.replace("'", "''"))
+    return repr(value)
+
+
+class Aggregate:
+    """An aggregate function over a field of the objects matching a
+    query.
+
+    As when reading a field of an object, null values in the database
+    stand for the null value of the field's type, so the aggregate only
+    skips them if that is None.
+
+    The aggregate is computed by SQLite when the query is fast and the
+    field is stored in a table column. Otherwise, it is accumulated in
+    Python from the objects: `initial` is the starting value, `step`
+    folds an object into it and `final` turns it into the result.
+
+    If the database has a column store, the aggregate is computed from
+    the `array` of values of the matching rows with `reduce` instead.
+    """
+
+    function: ClassVar[str]
+    """The SQL aggregate function, applied to `operand`."""
+
+    def __init__(self, field: str | None = None):
+        self.field = field
+
+    def operand(self, model_cls: type[Model]) -> str | None:
+        """Get the SQL expression to aggregate, or None if the values are
+        not available in SQL.
+        """
+        if (typ := model_cls._fields.get(self.field)) is None:
+            return None
+        if (null := _sql_literal(typ.null)) is None:
+            return self.field
+        return f"COALESCE({self.field}, {null})"
+
+    def clause(self, model_cls: type[Model]) -> str | None:
+        """Get the SQL aggregate expression, or None if the aggregate must
+        be computed in Python.
+        """
+        if (operand := self.operand(model_cls)) is None:
+            return None
+        return f"{self.function}({operand})"
+
+    def value(self, obj: Model) -> Any:
+        """Get the value of `obj` to aggregate."""
+        return obj.get(self.field)
+
+    def array(self, columns: Columns) -> np.ma.MaskedArray | None:
+        """Get the values to aggregate from the cached `columns` of the
+        matching rows, with null values masked, or None if they are not
+        cached.
+        """
+        return columns.get(self.field)
+
+    def reduce(self, values: np.ma.MaskedArray) -> Any:
+        raise NotImplementedError
+
+    def initial(self) -> Any:
+        return None
+
+    def step(self, acc: Any, obj: Model) -> Any:
+        raise NotImplementedError
+
+    def final(self, acc: Any) -> Any:
+        return acc
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.field!r})"
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.field == other.field
+
+    def __hash__(self) -> int:
+        return hash((type(self), self.field))
+
+
+class Count(Aggregate):
+    """The number of objects, or of objects with a non-null value for
+    `field` if it is given.
+    """
+
+    function = "COUNT"
+
+    def operand(self, model_cls: type[Model]) -> str | None:
+        if self.field is None:
+            return "*"
+        return super().operand(model_cls)
+
+    def initial(self) -> int:
+        return 0
+
+    def step(self, acc: int, obj: Model) -> int:
+        if self.field is None or self.value(obj) is not None:
+            acc += 1
+        return acc
+
+    def reduce(self, values: np.ma.MaskedArray) -> int:
+        return int(values.count())
+
+
+class CountDistinct(Aggregate):
+    """The number of distinct non-null values of `field`."""
+
+    function = "COUNT"
+
+    def clause(self, model_cls: type[Model]) -> str | None:
+        if (operand := self.operand(model_cls)) is None:
+            return None
+        return f"{self.function}(DISTINCT {operand})"
+
+    def initial(self) -> set[Any]:
+        return set()
+
+    def step(self, acc: set[Any], obj: Model) -> set[Any]:
+        if (value := self.value(obj)) is not None:
+            acc.add(value)
+        return acc
+
+    def final(self, acc: set[Any]) -> int:
+        return len(acc)
+
+    def reduce(self, values: np.ma.MaskedArray) -> int:
+        return len(np.unique(values.compressed()))
+
+
+class Sum(Aggregate):
+    """The sum of the values of `field`, treating null values as zero."""
+
+    function = "SUM"
+
+    def clause(self, model_cls: type[Model]) -> str | None:
+        if (clause := super().clause(model_cls)) is None:
+            return None
+        return f"COALESCE({clause}, 0)"
+
+    def initial(self) -> int | float:
+        return 0
+
+    def step(self, acc: int | float, obj: Model) -> int | float:
+        return acc + (self.value(obj) or 0)
+
+    def array(self, columns: Columns) -> np.ma.MaskedArray | None:
+        if columns.is_text(self.field):
+            return None
+        return super().array(columns)
+
+    def reduce(self, values: np.ma.MaskedArray) -> int | float:
+        return values.filled(0).sum().item()
@@ -0,0 +1,523 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""A columnar cache of the fixed fields of a database's models, which
+lets queries and aggregates over many rows be evaluated with NumPy, see
+:class:`ColumnStore`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .query import (
+    AndQuery,
+    DateQuery,
+    FalseQuery,
+    NotQuery,
+    NumericQuery,
+    OrQuery,
+    TrueQuery,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping, Sequence
+
+    from .aggregate import Aggregate
+    from .db import Database, Model
+    from .query import FieldQuery, Query
+
+JOURNAL_TABLE = "column_changes"
+"""The table in which triggers log the ids of the rows written to the
+tables of the models, see `Database._make_column_journal`.
+"""
+
+NUMERIC_TYPES = ("INTEGER", "REAL")
+"""The SQL types of the fields stored as floats."""
+
+
+def stored_fields(model_cls: type[Model]) -> dict[str, str]:
+    """Get the SQL types of the fixed fields of `model_cls` that are kept
+    in the column store: all numeric fields, and the text fields listed in
+    `Model._column_store_fields`.
+    """
+    getters = model_cls._getters()
+    fields = {}
+    for field, typ in model_cls._fields.items():
+        if field == "id" or field in getters:
+            continue
+        if typ.sql in NUMERIC_TYPES or (
+            typ.sql == "TEXT" and field in model_cls._column_store_fields
+        ):
+            fields[field] = typ.sql
+    return fields
+
+
+def _floats(values: Sequence[Any]) -> np.ndarray:
+    """Convert column values to floats, using NaN for null values and
+    values that are not numbers.
+    """
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array(
+            [v if isinstance(v, (int, float)) else None for v in values],
+            dtype=np.float64,
+        )
+
+
+class Columns:
+    """The cached columns of a model's table.
+
+    `ids` holds the sorted row ids and `arrays` maps each stored field to
+    an array with its value in every row. Numeric fields are stored as
+    floats with NaN for null values. Text fields are dictionary-encoded:
+    each value is replaced by its position in the field's list in
+    `strings`, and null values by -1.
+    """
+
+    def __init__(
+        self,
+        model_cls: type[Model],
+        ids: np.ndarray,
+        arrays: Mapping[str, np.ndarray],
+        strings: Mapping[str, list[str]],
+    ):
+        self.model_cls = model_cls
+        self.fields = stored_fields(model_cls)
+        self.ids = ids
+        self.arrays = dict(arrays)
+        self.strings = {f: list(strings.get(f, ())) for f in self.fields}
+        self._selected: np.ndarray | None = None
+
+    @classmethod
+    def from_rows(
+        cls,
+        model_cls: type[Model],
+        rows: Sequence[Sequence[Any]],
+        strings: Mapping[str, list[str]] | None = None,
+    ) -> Columns:
+        """Build the columns of `rows`, which hold the id followed by the
+        stored fields in order. Text values are encoded by extending the
+        lists in `strings`.
+        """
+        columns = cls(model_cls, np.empty(0, np.int64), {}, strings or {})
+        values = list(zip(*rows)) or [()] * (len(columns.fields) + 1)
+        columns.ids = np.array(values[0], dtype=np.int64)
+        for (field, sql), column in zip(columns.fields.items(), values[1:]):
+            if sql == "TEXT":
+                columns.arrays[field] = columns._encode(field, column)
+            else:
+                columns.arrays[field] = _floats(column)
+        return columns
+
+    def _encode(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        """Dictionary-encode the text `values` of `field`."""
+        strings = self.strings[field]
+        codes = {s: i for i, s in enumerate(strings)}
+        encoded = []
+        for value in values:
+            if value is None:
+                encoded.append(-1)
+                continue
+            if value not in codes:
+                codes[value] = len(strings)
+                strings.append(value)
+            encoded.append(codes[value])
+        return np.array(encoded, dtype=np.int64)
+
+    def update(
+        self,
+        rows: Sequence[Sequence[Any]],
+        changed: Sequence[int],
+        allocate: Callable[[str, int, np.dtype], np.ndarray] | None = None,
+    ) -> set[str]:
+        """Replace the rows with the `changed` ids by the current `rows` of
+        these ids. Rows that were deleted are left out of `rows`.
+
+        Only the arrays whose values change are replaced, by new arrays
+        that `allocate(key, length, dtype)` creates, so that they can be
+        mapped to files. The old arrays are copied one at a time. Return
+        the keys of the replaced arrays: "id", the stored fields, and
+        "strings" if new strings were encoded.
+        """
+        allocate = allocate or (
+            lambda key, length, dtype: np.empty(length, dtype)
+        )
+        counts = {f: len(s) for f, s in self.strings.items()}
+        new = Columns.from_rows(self.model_cls, rows, self.strings)
+        replaced = set()
+        if any(len(s) != counts[f] for f, s in new.strings.items()):
+            replaced.add("strings")
+        self.strings = new.strings
+
+        positions = np.searchsorted(self.ids, new.ids)
+        existing = positions < len(self.ids)
+        existing[existing] = self.ids[positions[existing]] == new.ids[existing]
+        if existing.all() and len(new.ids) == len(changed):
+            # No row was added or removed: update the changed values in
+            # copies of the arrays they are in.
+            for field in self.fields:
+                old, values = self.arrays[field], new.arrays[field]
+                if np.array_equal(old[positions], values, equal_nan=True):
+                    continue
+                array = allocate(field, len(old), old.dtype)
+                array[:] = old
+                array[positions] = values
+                self.arrays[field] = array
+                replaced.add(field)
+            return replaced
+
+        # Merge the kept rows and the new ones, which are both sorted.
+        keep = ~np.isin(self.ids, np.array(changed, dtype=np.int64))
+        kept_ids = self.ids[keep]
+        added = np.zeros(len(kept_ids) + len(new.ids), dtype=bool)
+        added[np.searchsorted(kept_ids, new.ids) + np.arange(len(new.ids))] = (
+            True
+        )
+        for key in ["id", *self.fields]:
+            old = self.ids if key == "id" else self.arrays[key]
+            values = new.ids if key == "id" else new.arrays[key]
+            array = allocate(key, len(added), old.dtype)
+            array[~added] = old[keep]
+            array[added] = values
+            if key == "id":
+                self.ids = array
+            else:
+                self.arrays[key] = array
+            replaced.add(key)
+        return replaced
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Vectorised evaluation.
+
+    def _column(self, query: FieldQuery) -> np.ndarray | None:
+        """Get the stored values of the field that `query` matches, or
+        None if they are not stored.
+        """
+        if query.table not in ("", self.model_cls._table):
+            return None
+        if self.fields.get(query.field_name) not in NUMERIC_TYPES:
+            return None
+        return self.arrays[query.field_name]
+
+    def mask(self, query: Query) -> np.ndarray | None:
+        """Get a boolean array of the rows that match `query`, or None if
+        the query cannot be evaluated on the stored columns.
+
+        Only numeric and date range queries on stored fields, and their
+        combinations, are supported. Null values never match a range.
+        """
+        if isinstance(query, TrueQuery):
+            return np.ones(len(self), dtype=bool)
+        if isinstance(query, FalseQuery):
+            return np.zeros(len(self), dtype=bool)
+        if isinstance(query, (AndQuery, OrQuery)):
+            conjunction = isinstance(query, AndQuery)
+            result = np.full(len(self), conjunction)
+            for subquery in query.subqueries:
+                if (mask := self.mask(subquery)) is None:
+                    return None
+                result = result & mask if conjunction else result | mask
+            return result
+        if isinstance(query, NotQuery):
+            mask = self.mask(query.subquery)
+            return None if mask is None else ~mask
+
+        if type(query).value_test is NumericQuery.value_test and isinstance(
+            query, NumericQuery
+        ):
+            column = self._column(query)
+            if column is None:
+                return None
+            if query.point is not None:
+                return column == query.point
+            mask = ~np.isnan(column)
+            if query.rangemin is not None:
+                mask &= column >= query.rangemin
+            if query.rangemax is not None:
+                mask &= column <= query.rangemax
+            return mask
+
+        if type(query).value_test is DateQuery.value_test and isinstance(
+            query, DateQuery
+        ):
+            column = self._column(query)
+            if column is None:
+                return None
+            mask = ~np.isnan(column)
+            if start := query.interval.start:
+                mask &= column >= start.timestamp()
+            if end := query.interval.end:
+                mask &= column < end.timestamp()
+            return mask
+
+        return None
+
+    def select(self, mask: np.ndarray) -> Columns:
+        """Get a view of the rows selected by the boolean `mask`."""
+        columns = Columns(self.model_cls, self.ids, self.arrays, self.strings)
+        columns._selected = mask
+        return columns
+
+    def get(self, field: str | None) -> np.ma.MaskedArray | None:
+        """Get the values of `field` in the selected rows as a masked
+        array, or None if the field is not stored. Integer fields are
+        returned as integers and text fields as their codes. Without a
+        field, get an array of zeros with one element per row.
+
+        As in :meth:`Model.get`, null values stand for the null value of
+        the field's type. They are only masked if that is None.
+        """
+        rows = slice(None) if self._selected is None else self._selected
+        if field is None:
+            return np.ma.masked_array(np.zeros(len(self.ids[rows])))
+        if (sql := self.fields.get(field)) is None:
+            return None
+
+        values = self.arrays[field][rows]
+        default = self.model_cls._fields[field].null
+        if sql == "TEXT":
+            if default is None:
+                return np.ma.masked_less(values, 0)
+            strings = self.strings[field]
+            # A code that no other string has if the null string has none.
+            code = strings.index(default) if default in strings else -2
+            return np.ma.masked_array(np.where(values < 0, code, values))
+        null = np.isnan(values)
+        values = np.nan_to_num(values, nan=default or 0)
+        if sql == "INTEGER":
+            values = values.astype(np.int64)
+        return np.ma.masked_array(
+            values, mask=null if default is None else False
+        )
+
+    def is_text(self, field: str | None) -> bool:
+        return self.fields.get(field or "") == "TEXT"
+
+
+class ColumnStore:
+    """A cache of the stored fields of each model's table, kept as NumPy
+    arrays in `directory` and memory-mapped when they are read.
+
+    Triggers log the ids of the rows written to the tables in a change
+    journal. Whenever the journal has grown since the columns of a table
+    were last used, the rows logged since they were saved are read again,
+    and only the arrays whose values changed are written anew. Changes
+    made by other processes are thus picked up the next time a table is
+    used. Reading the columns never writes to the database: the journal
+    is compacted when the database is opened instead.
+    """
+
+    def __init__(self, db: Database, directory: str):
+        self.db = db
+        self.directory = directory
+        # The saved columns of each table, with the journal position they
+        # reflect and the files of their arrays.
+        self._columns: dict[str, tuple[int, Columns, dict[str, str]]] = {}
+        # The journal position at which each table was last synced.
+        self._seqs: dict[str, int] = {}
+
+    def columns(self, model_cls: type[Model]) -> Columns:
+        """Get the up-to-date columns of the table of `model_cls`."""
+        table = model_cls._table
+        with self.db.transaction(read_only=True) as tx:
+            rows = tx.query(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?",
+                (JOURNAL_TABLE,),
+            )
+        seq = rows[0][0] if rows else 0
+        if self._seqs.get(table) != seq:
+            self._sync(model_cls)
+            self._seqs[table] = seq
+        return self._columns[table][1]
+
+    def _sync(self, model_cls: type[Model]):
+        """Load the saved columns of `model_cls` and apply the changes
+        logged in the journal since they were saved.
+        """
+        table = model_cls._table
+        fields = list(stored_fields(model_cls))
+        select = f"SELECT {', '.join(['id', *fields])} FROM {table}"
+        saved = self._load(model_cls, fields)
+
+        with self.db.transaction(read_only=True) as tx:
+            seq = tx.query(
+                f"SELECT COALESCE(MAX(seq), 0) FROM {JOURNAL_TABLE}"
+            )[0][0]
+            if saved is None:
+                rows = tx.query(f"{select} ORDER BY id")
+                columns = Columns.from_rows(model_cls, rows)
+                files = {}
+            else:
+                saved_seq, columns, files = saved
+                changed = [
+                    row[0]
+                    for row in tx.query(
+                        f"SELECT DISTINCT entity_id FROM {JOURNAL_TABLE} "
+                        "WHERE table_name = ? AND seq > ? ORDER BY entity_id",
+                        (table, saved_seq),
+                    )
+                ]
+                if not changed:
+                    self._columns[table] = saved
+                    return
+                rows = tx.query(
+                    f"{select} WHERE id IN (SELECT entity_id "
+                    f"FROM {JOURNAL_TABLE} WHERE table_name = ? AND seq > ?) "
+                    "ORDER BY id",
+                    (table, saved_seq),
+                )
+                written: dict[str, str] = {}
+                replaced = columns.update(
+                    rows, changed, self._allocator(table, written)
+                )
+                files = {
+                    k: v for k, v in files.items() if k not in replaced
+                } | written
+
+        self._save(table, seq, fields, columns, files)
+        self._columns[table] = (seq, columns, files)
+
+    def _load(
+        self, model_cls: type[Model], fields: list[str]
+    ) -> tuple[int, Columns, dict[str, str]] | None:
+        """Get the saved columns of `model_cls`, the journal position they
+        reflect and the files they are stored in, or None if there are
+        none for the current fields.
+        """
+        table = model_cls._table
+        try:
+            with open(os.path.join(self.directory, f"{table}.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("fields") != fields or "files" not in meta:
+            return None
+
+        cached = self._columns.get(table)
+        if cached and cached[0] == meta["seq"]:
+            return cached
+
+        files = meta["files"]
+        try:
+            ids, *arrays = (
+                np.load(os.path.join(self.directory, files[key]), mmap_mode="r")
+                for key in ["id", *fields]
+            )
+            with open(os.path.join(self.directory, files["strings"])) as f:
+                strings = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        columns = Columns(model_cls, ids, dict(zip(fields, arrays)), strings)
+        return meta["seq"], columns, files
+
+    def _new_file(self, table: str, key: str, suffix: str) -> str:
+        """Create a new, empty file for the `key` array of `table`."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(
+            prefix=f"{table}-{key}-", suffix=suffix, dir=self.directory
+        )
+        os.close(handle)
+        return path
+
+    def _allocator(
+        self, table: str, written: dict[str, str]
+    ) -> Callable[[str, int, np.dtype], np.ndarray]:
+        """Get a function that creates the arrays of `table` in new
+        memory-mapped files, which it records in `written`.
+        """
+
+        def allocate(key: str, length: int, dtype: np.dtype) -> np.ndarray:
+            path = self._new_file(table, key, ".npy")
+            written[key] = os.path.basename(path)
+            return np.lib.format.open_memmap(
+                path, mode="w+", dtype=dtype, shape=(length,)
+            )
+
+        return allocate
+
+    def _save(
+        self,
+        table: str,
+        seq: int,
+        fields: list[str],
+        columns: Columns,
+        files: dict[str, str],
+    ):
+        """Save the columns of `table` at journal position `seq`. Arrays
+        that have a file in `files` are kept there, the others are written
+        to new files.
+
+        The metadata file is replaced atomically, so that other processes
+        either read the previous columns or the new ones.
+        """
+        for key in ["id", *fields]:
+            array = columns.ids if key == "id" else columns.arrays[key]
+            if isinstance(array, np.memmap):
+                array.flush()
+            if key not in files:
+                path = self._new_file(table, key, ".npy")
+                np.save(path, array)
+                files[key] = os.path.basename(path)
+        if "strings" not in files:
+            path = self._new_file(table, "strings", ".json")
+            with open(path, "w") as f:
+                json.dump(columns.strings, f)
+            files["strings"] = os.path.basename(path)
+
+        meta = os.path.join(self.directory, f"{table}.json")
+        with open(f"{meta}.tmp", "w") as f:
+            json.dump({"seq": seq, "fields": fields, "files": files}, f)
+        os.replace(f"{meta}.tmp", meta)
+
+        # Remove the superseded files. Memory maps of them remain valid on
+        # POSIX systems, elsewhere they are removed later.
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{table}-") and name not in files.values():
+                path = os.path.join(self.directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def aggregate(
+        self,
+        model_cls: type[Model],
+        query: Query,
+        aggregates: Mapping[str, Aggregate],
+    ) -> dict[str, Any] | None:
+        """Compute `aggregates` over the rows of `model_cls` that match
+        `query`, or return None if the query or one of the aggregates
+        cannot be evaluated on the stored columns.
+        """
+        columns = self.columns(model_cls)
+        mask = columns.mask(query)
+        if mask is None:
+            return None
+
+        selected = columns.select(mask)
+        values = {n: a.array(selected) for n, a in aggregates.items()}
+        if any(v is None for v in values.values()):
+            return None
+        return {n: a.reduce(values[n]) for n, a in aggregates.items()}
@@ -19,16 +19,20 @@ from __future__ import annotations
 import functools
 import os
 import re
+import shutil
 import sqlite3
 import sys
 import threading
 import time
+import zlib
 from abc import ABC, abstractmethod
-from collections import UserDict, defaultdict
+from collections import Counter, OrderedDict, UserDict, defaultdict
 from collections.abc import Mapping
+from concurrent.futures import Future
 from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import cached_property
+from itertools import islice
 from sqlite3 import Connection, sqlite_version_info
 from typing import (
     TYPE_CHECKING,
@@ -39,6 +43,7 @@ from typing import (
     Literal,
     NamedTuple,
     TypedDict,
+    overload,
 )
 
 from typing_extensions import (
@@ -48,11 +53,17 @@ from typing_extensions import (
 from unidecode import unidecode
 
 import beets
+from beets import logging
 
 from ..util import cached_classproperty, functemplate
 from . import types
+from .aggregate import Count
+from .columnar import JOURNAL_TABLE, ColumnStore
+from .indexes import IndexSuggestion, index_name, query_shape
+from .journal import ADD, CHANGES_TABLE, REMOVE, UPDATE, Change, compact
 from .query import MatchQuery, TrueQuery
 from .sort import NullSort
+from .writequeue import WriteQueue
 
 if TYPE_CHECKING:
     from collections.abc import (
@@ -66,15 +77,34 @@ if TYPE_CHECKING:
     from sqlite3 import Connection
     from types import TracebackType
 
+    from .aggregate import Aggregate
+    from .profile import SQLProfiler
     from .query import FieldQueryType, Query, SQLiteType
     from .sort import FieldSort, Sort
 
+log = logging.getLogger("beets")
+
 D = TypeVar("D", bound="Database", default=Any)
+T = TypeVar("T")
 
 FlexAttrs = dict[str, str]
 JSONDict = dict[str, Any]
 
 
+def deflate(value: str) -> bytes:
+    """Compress the value of a large field for storage."""
+    return zlib.compress(value.encode())
+
+
+def inflate(value: SQLiteType) -> SQLiteType:
+    """Get the value of a large field as it was stored, compressed with
+    `deflate` or not.
+    """
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode()
+    return value
+
+
 class DBAccessError(Exception):
     """The SQLite database became inaccessible.
 
@@ -99,6 +129,10 @@ class NotFoundError(LookupError):
     pass
 
 
+DRIVE_RE = re.compile(r"^[a-zA-Z]:")
+DRIVE_SEP_RE = re.compile(r"(?<=[a-zA-Z]):")
+
+
 class FormattedMapping(Mapping[str, str]):
     """A `dict`-like formatted view of a model.
 
@@ -111,6 +145,10 @@ class FormattedMapping(Mapping[str, str]):
 
     If `for_path` is true, all path separators in the formatted values
     are replaced.
+
+    Formatted values are memoized on the model. A memoized value is used
+    as long as the model's value and the configuration it was formatted
+    with are the same, so a model formats each field once.
     """
 
     model: Model
@@ -118,6 +156,15 @@ class FormattedMapping(Mapping[str, str]):
 
     ALL_KEYS = "*"
 
+    _config_settings: ClassVar[tuple[Any, dict[bool, tuple[Any, ...]]]] = (
+        None,
+        {},
+    )
+    """The configuration values that formatting depends on, with and
+    without the path settings, and the state of the configuration they
+    were read from.
+    """
+
     def __init__(
         self,
         model: Model,
@@ -126,9 +173,10 @@ class FormattedMapping(Mapping[str, str]):
     ) -> None:
         self.for_path = for_path
         self.model = model
+        self._settings = self._read_settings(for_path)
         self.model_keys = set(
             # Performance note: this triggers a database query.
-            self.model.keys(True)
+            self.model._loaded_keys(True)
             if included_keys == self.ALL_KEYS
             else included_keys
         )
@@ -154,22 +202,70 @@ class FormattedMapping(Mapping[str, str]):
             default = self.model._type(key).format(None)
         return super().get(key, default)
 
+    @classmethod
+    def _read_settings(cls, for_path: bool) -> tuple[Any, ...]:
+        """Get the configuration values that formatting depends on.
+
+        They are shared by all mappings and only read again once the
+        configuration has changed, so usually once per command.
+        """
+        # Setting or reading configuration adds a source.
+        sources = beets.config.sources
+        state = (id(sources), len(sources), id(sources[0]) if sources else 0)
+        read_state, settings = FormattedMapping._config_settings
+        if state != read_state:
+            common = (
+                beets.config["time_format"].as_str(),
+                beets.config["format_raw_length"].get(bool),
+            )
+            settings = {
+                False: common,
+                True: (
+                    *common,
+                    beets.config["path_sep_replace"].as_str(),
+                    beets.config["drive_sep_replace"].as_str(),
+                ),
+            }
+            FormattedMapping._config_settings = state, settings
+        return settings[for_path]
+
     def _get_formatted(self, model: Model, key: str) -> str:
-        value = model._type(key).format(model.get(key))
+        raw = model.get(key)
+        typ = model._type(key)
+        cache_key = (key, self.for_path)
+        cached = model._formatted_values.get(cache_key)
+        if (
+            cached is not None
+            and cached[0] is typ
+            and cached[1] == self._settings
+            and type(cached[2]) is type(raw)
+            and cached[2] == raw
+        ):
+            return cached[3]
+
+        value = typ.format(raw)
         if isinstance(value, bytes):
             value = value.decode("utf-8", "ignore")
 
         if self.for_path:
-            sep_repl: str = beets.config["path_sep_replace"].as_str()
-            sep_drive: str = beets.config["drive_sep_replace"].as_str()
+            sep_repl, sep_drive = self._settings[2:]
 
-            if re.match(r"^[a-zA-Z]:", value):
-                value = re.sub(r"(?<=[a-zA-Z]):", sep_drive, value)
+            if DRIVE_RE.match(value):
+                value = DRIVE_SEP_RE.sub(sep_drive, value)
 
             for sep in (os.path.sep, os.path.altsep):
                 if sep:
                     value = value.replace(sep, sep_repl)
 
+        # Keep a copy of mutable values so that changes made to them in
+        # place are noticed.
+        snapshot = raw.copy() if isinstance(raw, list) else raw
+        model._formatted_values[cache_key] = (
+            typ,
+            self._settings,
+            snapshot,
+            value,
+        )
         return value
 
 
@@ -182,16 +278,37 @@ class LazyDict(UserDict[str, Any]):
         super().__init__()
         self._raw = data
         self._convert = convert
+        self._deferred: set[str] = set()
+        self._load: Callable[[], JSONDict] | None = None
+
+    def defer(self, keys: Iterable[str], load: Callable[[], JSONDict]):
+        """Mark `keys` as present but not fetched yet. The raw values of
+        all deferred keys are fetched together by calling `load` when
+        one of them is first accessed. Keys that `load` leaves out have a
+        null value.
+        """
+        self._deferred = set(keys) - self._raw.keys() - self.data.keys()
+        self._load = load
 
     def __missing__(self, key: str) -> Any:
+        if key in self._deferred and self._load:
+            loaded = self._load()
+            for deferred in self._deferred:
+                self._raw[deferred] = loaded.get(deferred)
+            self._deferred = set()
         if key in self._raw:
             value = self._convert(key, self._raw[key])
             self.data[key] = value
             return value
         return None
 
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._deferred.discard(key)
+        super().__setitem__(key, value)
+
     def __delitem__(self, key: str) -> None:
         """Delete both converted and base data"""
+        self._deferred.discard(key)
         if key in self.data:
             del self.data[key]
         if key in self._raw:
@@ -199,7 +316,7 @@ class LazyDict(UserDict[str, Any]):
 
     def __contains__(self, key: Any) -> bool:
         """Determine whether `key` is an attribute on this object."""
-        return key in self.data or key in self._raw
+        return key in self.data or key in self._raw or key in self._deferred
 
     def __iter__(self) -> Iterator[str]:
         """Iterate over the available field names (excluding computed fields)."""
@@ -210,7 +327,7 @@ class LazyDict(UserDict[str, Any]):
 
     @property
     def _all_keys(self) -> set[str]:
-        return self._raw.keys() | self.data.keys()
+        return self._raw.keys() | self.data.keys() | self._deferred
 
     def keys(self) -> KeysView[str]:
         return dict.fromkeys(self._all_keys).keys()
@@ -218,6 +335,8 @@ class LazyDict(UserDict[str, Any]):
     def copy(self) -> Self:
         new = self.__class__(self._raw.copy(), self._convert)
         new.data = self.data.copy()
+        new._deferred = self._deferred.copy()
+        new._load = self._load
         return new
 
     def get(self, key: str, default: Any | None = None) -> Any:
@@ -274,11 +393,35 @@ class Model(ABC, Generic[D]):
     terms.
     """
 
+    @cached_classproperty
+    def _fts_table(cls) -> str:
+        """The name of the full-text index of the search fields, see
+        `Database._make_fts_table`.
+        """
+        return f"{cls._table}_fts"
+
     _indices: Sequence[Index] = ()
     """A sequence of `Index` objects that describe the indices to be
     created for this table.
     """
 
+    _column_store_fields: Sequence[str] = ()
+    """The text fields that are kept in the column store, in addition to
+    all numeric fields, see :class:`beets.dbcore.columnar.ColumnStore`.
+    """
+
+    _large_fields: Sequence[str] = ()
+    """The large text fields that are stored in a separate table, see
+    `_large_table`, unless the database keeps them inline.
+    """
+
+    @cached_classproperty
+    def _large_table(cls) -> str:
+        """The name of the table storing the separated large fields, see
+        `Database._make_large_table`.
+        """
+        return f"{cls._table}_large"
+
     @cached_classproperty
     def _types(cls) -> dict[str, types.Type]:
         """Optional types for non-fixed (flexible and computed) fields."""
@@ -344,7 +487,8 @@ class Model(ABC, Generic[D]):
     def get_fresh_from_db(self) -> Self:
         """Load this object from the database."""
         model_cls = self.__class__
-        if obj := self.db._get(model_cls, self.id):
+        # Bypass the identity map: the caller gets an object of its own.
+        if obj := self.db._fetch(model_cls, MatchQuery("id", self.id)).get():
             return obj
 
         raise NotFoundError(f"No matching {model_cls.__name__} found") from None
@@ -382,6 +526,17 @@ class Model(ABC, Generic[D]):
         self._values_fixed = LazyDict(fixed_values or {}, self._convert)
         self._values_flex = LazyDict(flex_values or {}, self._convert)
 
+        # The fields fetched from the database if the object was loaded
+        # with a projection, see `Database._fetch`. The other fields are
+        # loaded on first access.
+        self._projection: frozenset[str] | None = None
+
+        # The formatted values of fields with the types, settings and
+        # values they were formatted from, see `FormattedMapping`.
+        self._formatted_values: dict[
+            tuple[str, bool], tuple[types.Type, tuple[Any, ...], Any, str]
+        ] = {}
+
         # Initial contents.
         self.update(kwargs)
         self.clear_dirty()
@@ -425,6 +580,7 @@ class Model(ABC, Generic[D]):
         new._values_fixed = self._values_fixed.copy()
         new._values_flex = self._values_flex.copy()
         new._dirty = self._dirty.copy()
+        new._projection = self._projection
         return new
 
     # Essential field accessors.
@@ -465,6 +621,13 @@ class Model(ABC, Generic[D]):
         getters = self._getters()
         if key in getters:  # Computed.
             return getters[key](self)
+        if (
+            self._projection is not None
+            and key not in self._projection
+            and key not in self._values_fixed
+            and key not in self._values_flex
+        ):
+            self._load_unprojected()
         if key in self._fields:  # Fixed.
             if key in self._values_fixed:
                 return self._values_fixed[key]
@@ -526,11 +689,18 @@ class Model(ABC, Generic[D]):
         `computed` parameter controls whether computed (plugin-provided)
         fields are included in the key list.
         """
+        self._load_unprojected()
+        return dict.fromkeys(self._loaded_keys(computed)).keys()
+
+    def _loaded_keys(self, computed: bool = False) -> set[str]:
+        """Get the available field names like `keys`, but without loading
+        the flexible attributes left out of the projection the object was
+        fetched with.
+        """
         keys = {*self._fields, *self._values_flex}
         if computed:
             keys.update(self._getters())
-
-        return dict.fromkeys(keys).keys()
+        return keys
 
     @classmethod
     def all_keys(cls) -> KeysView[str]:
@@ -592,46 +762,35 @@ class Model(ABC, Generic[D]):
         :param fields: the fields to be stored. If not specified, all fields
         will be.
         """
-        if fields is None:
-            fields = self._fields
+        self.db._write(self.db._store_many, [self], fields)
 
-        # Build assignments for query.
-        assignments = []
-        subvars: list[SQLiteType] = []
-        for key in fields:
-            if key != "id" and key in self._dirty:
-                self._dirty.remove(key)
-                assignments.append(f"{key}=?")
-                value = self._type(key).to_sql(self[key])
-                subvars.append(value)
+    def _take_changes(
+        self, fields: Iterable[str] | None = None
+    ) -> tuple[dict[str, SQLiteType], dict[str, SQLiteType], set[str]]:
+        """Get the pending changes to the object's database rows and mark
+        it as clean.
 
-        with self.db.transaction() as tx:
-            # Main table update.
-            if assignments:
-                query = f"UPDATE {self._table} SET {','.join(assignments)} WHERE id=?"
-                subvars.append(self.id)
-                tx.mutate(query, subvars)
-
-            # Modified/added flexible attributes.
-            for key, value in self._values_flex.items():
-                if key in self._dirty:
-                    self._dirty.remove(key)
-                    value = self._type(key).to_sql(value)
-                    tx.mutate(
-                        f"INSERT INTO {self._flex_table} "
-                        "(entity_id, key, value) "
-                        "VALUES (?, ?, ?);",
-                        (self.id, key, value),
-                    )
+        Return the SQL values of the modified `fields` (all fixed fields if
+        not specified), the SQL values of the modified flexible attributes
+        and the keys of the deleted flexible attributes.
+        """
+        if fields is None:
+            fields = self._fields
 
-            # Deleted flexible attributes.
-            for key in self._dirty:
-                tx.mutate(
-                    f"DELETE FROM {self._flex_table} WHERE entity_id=? AND key=?",
-                    (self.id, key),
-                )
+        fixed = {
+            key: self._type(key).to_sql(self[key])
+            for key in fields
+            if key != "id" and key in self._dirty
+        }
+        flex = {
+            key: self._type(key).to_sql(value)
+            for key, value in self._values_flex.items()
+            if key in self._dirty
+        }
+        deleted = self._dirty - self._fields.keys() - flex.keys()
 
         self.clear_dirty()
+        return fixed, flex, deleted
 
     def load(self):
         """Refresh the object's metadata from the library database.
@@ -643,16 +802,55 @@ class Model(ABC, Generic[D]):
             # Exit early
             return
 
+        if not self._dirty and self.db._is_cached(self):
+            # The shared object for the row is up to date.
+            self._revision = self.db.revision
+            return
+
         self.__dict__.update(self.get_fresh_from_db().__dict__)
         self.clear_dirty()
 
+    def _load_unprojected(self):
+        """Load the fields left out of the projection the object was
+        fetched with. Values that have been modified since are kept.
+        """
+        if self._projection is None:
+            return
+
+        fresh = self.get_fresh_from_db()
+        for values, fresh_values in (
+            (self._values_fixed, fresh._values_fixed),
+            (self._values_flex, fresh._values_flex),
+        ):
+            for key in fresh_values:
+                if key not in values and key not in self._dirty:
+                    values[key] = fresh_values[key]
+        self._projection = None
+
+    def _load_large_fields(self) -> JSONDict:
+        """Fetch the raw values of the object's separated large fields."""
+        return self.db._load_large_fields(self)
+
     def remove(self):
         """Remove the object's associated rows from the database."""
+        self.db._write(self._remove_rows)
+
+    def _remove_rows(self):
         with self.db.transaction() as tx:
-            tx.mutate(f"DELETE FROM {self._table} WHERE id=?", (self.id,))
+            rows = [(self._table, self.id)]
+            tx.mutate(f"DELETE FROM {self._table} WHERE id=?", (self.id,), rows)
+            self.db._journal(tx, [(self._table, self.id, REMOVE, None)])
             tx.mutate(
-                f"DELETE FROM {self._flex_table} WHERE entity_id=?", (self.id,)
+                f"DELETE FROM {self._flex_table} WHERE entity_id=?",
+                (self.id,),
+                rows,
             )
+            if self.db._separate_fields(type(self)):
+                tx.mutate(
+                    f"DELETE FROM {self._large_table} WHERE entity_id=?",
+                    (self.id,),
+                    rows,
+                )
 
     def add(self, db: D | None = None):
         """Add the object to the library database. This object must be
@@ -665,11 +863,17 @@ class Model(ABC, Generic[D]):
         if db:
             self._db = db
         db = self._check_db(need_id=False)
+        db._write(self._insert, db)
 
+    def _insert(self, db: D):
+        """Insert the object's rows into `db` with a new id."""
         with db.transaction() as tx:
-            new_id = tx.mutate(f"INSERT INTO {self._table} DEFAULT VALUES")
+            new_id = tx.mutate(
+                f"INSERT INTO {self._table} DEFAULT VALUES", rows=()
+            )
             self.id = new_id
             self.added = time.time()
+            db._journal(tx, [(self._table, new_id, ADD, None)])
 
             # Mark every non-null field as dirty and store.
             for key in self:
@@ -745,11 +949,15 @@ class Results(Generic[AnyModel]):
     def __init__(
         self,
         model_class: type[AnyModel],
-        rows: list[sqlite3.Row],
+        rows: list[sqlite3.Row] | None,
         db: D,
         flex_rows,
         query: Query | None = None,
         sort=None,
+        projection: frozenset[str] | None = None,
+        sql: str | None = None,
+        subvals: Sequence[SQLiteType] = (),
+        order_by: str | None = None,
     ):
         """Create a result set that will construct objects of type
         `model_class`.
@@ -758,30 +966,119 @@ class Results(Generic[AnyModel]):
         constructed. `rows` is a query result: a list of mappings. The
         new objects will be associated with the database `db`.
 
+        If `rows` is None, the rows returned by `sql`, ordered by the
+        `order_by` clause, and their flexible attributes are fetched when
+        first needed. A slice of the results then only fetches its own
+        rows if the query and sort are fast.
+
         If `query` is provided, it is used as a predicate to filter the
         results for a "slow query" that cannot be evaluated by the
         database directly. If `sort` is provided, it is used to sort the
         full list of results before returning. This means it is a "slow
         sort" and all objects must be built before returning the first
         one.
+
+        `projection` is the set of fields contained in the rows, if they
+        do not hold all of them.
         """
         self.model_class = model_class
-        self.rows = rows
+        self._rows = rows
         self.db = db
         self.query = query
         self.sort = sort
-        self.flex_rows = flex_rows
+        self._flex_rows = flex_rows
+        self.projection = projection
+        self.sql = sql
+        self.subvals = subvals
+        self.order_by = order_by
 
-        # We keep a queue of rows we haven't yet consumed for
-        # materialization. We preserve the original total number of
-        # rows.
-        self._rows = rows
-        self._row_count = len(rows)
+        # The window of rows to fetch, applied with LIMIT and OFFSET. A
+        # negative limit means no limit.
+        self._limit = -1
+        self._offset = 0
+
+        # The position of the next row to consume for materialization.
+        self._row_index = 0
 
         # The materialized objects corresponding to rows that have been
         # consumed.
         self._objects: list[AnyModel] = []
 
+        # The flexible attributes indexed by entity id, once needed.
+        self._flex_attrs: dict[int, FlexAttrs] | None = None
+
+    @property
+    def rows(self) -> list[sqlite3.Row]:
+        """The rows of the result set, fetched when first needed."""
+        if self._rows is None:
+            self._fetch_rows()
+            assert self._rows is not None
+        return self._rows
+
+    @property
+    def flex_rows(self) -> list[sqlite3.Row]:
+        """The flexible attribute rows of the objects in the result set."""
+        if self._flex_rows is None:
+            self._fetch_rows()
+        return self._flex_rows
+
+    @property
+    def _window_sql(self) -> tuple[str, list[SQLiteType]]:
+        """Get the statement and values that fetch the rows in the
+        window.
+        """
+        assert self.sql is not None
+        sql, subvals = self.sql, [*self.subvals]
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        if self._limit >= 0 or self._offset:
+            sql += " LIMIT ? OFFSET ?"
+            subvals += [self._limit, self._offset]
+        return sql, subvals
+
+    @cached_property
+    def _flex_keys(self) -> list[str] | None:
+        """The flexible attributes to fetch, or None for all of them."""
+        if self.projection is None:
+            return None
+        return sorted(self.projection - self.model_class._fields.keys())
+
+    def _fetch_rows(self):
+        """Fetch the rows in the window and their flexible attributes."""
+        sql, subvals = self._window_sql
+        # Fetch the flexible attributes of all objects at once. Doing the
+        # per-object filtering in python is faster than issuing one query
+        # per object to sqlite.
+        if self._limit < 0 and not self._offset:
+            # Without a window, the ids do not need to be sorted.
+            ids_sql, flex_subvals = self.sql, [*self.subvals]
+        else:
+            ids_sql, flex_subvals = sql, [*subvals]
+        flex_sql = (
+            f"SELECT * FROM {self.model_class._flex_table} "
+            f"WHERE entity_id IN (SELECT id FROM ({ids_sql}))"
+        )
+        flex_keys = self._flex_keys
+        if flex_keys is not None:
+            flex_sql += f" AND key IN ({', '.join('?' * len(flex_keys))})"
+            flex_subvals += flex_keys
+
+        with self.db.transaction(read_only=True) as tx:
+            self._rows = tx.query(sql, subvals)
+            self._flex_rows = []
+            if flex_keys != [] and self._rows:
+                self._flex_rows = tx.query(flex_sql, flex_subvals)
+
+    def _narrow(self, start: int, stop: int | None) -> tuple[int, int]:
+        """Get the limit and offset of the rows from `start` up to `stop`
+        in the window, where a negative limit means no limit.
+        """
+        limit = -1 if stop is None else max(stop - start, 0)
+        if self._limit >= 0:
+            remaining = max(self._limit - start, 0)
+            limit = remaining if limit < 0 else min(limit, remaining)
+        return limit, self._offset + start
+
     def _get_objects(self) -> Iterator[AnyModel]:
         """Construct and generate Model objects for they query. The
         objects are returned in the order emitted from the database; no
@@ -795,9 +1092,10 @@ class Results(Generic[AnyModel]):
 
         # Index flexible attributes by the item ID, so we have easier access
         flex_attrs = self._get_indexed_flex_attrs()
+        row_match, obj_match = self._predicates
 
         index = 0  # Position in the materialized objects.
-        while index < len(self._objects) or self._rows:
+        while index < len(self._objects) or not self._consumed:
             # Are there previously-materialized objects to produce?
             if index < len(self._objects):
                 yield self._objects[index]
@@ -806,17 +1104,41 @@ class Results(Generic[AnyModel]):
             # Otherwise, we consume another row, materialize its object
             # and produce it.
             else:
-                while self._rows:
-                    row = self._rows.pop(0)
+                while not self._consumed:
+                    row = self.rows[self._row_index]
+                    self._row_index += 1
+                    if row_match and not row_match(row):
+                        continue
                     obj = self._make_model(row, flex_attrs.get(row["id"], {}))
                     # If there is a slow-query predicate, ensurer that the
                     # object passes it.
-                    if not self.query or self.query.match(obj):
+                    if not obj_match or obj_match(obj):
                         self._objects.append(obj)
                         index += 1
                         yield obj
                         break
 
+    @cached_property
+    def _predicates(
+        self,
+    ) -> tuple[
+        Callable[[sqlite3.Row], bool] | None, Callable[[Model], bool] | None
+    ]:
+        """The slow query compiled into a predicate on rows, so that only
+        matching rows are turned into objects, or else on objects.
+        """
+        if not self.query:
+            return None, None
+        row_match = self.query.compile_row(self.model_class)
+        if row_match:
+            return row_match, None
+        return None, self.query.compile(self.model_class)
+
+    @property
+    def _consumed(self) -> bool:
+        """Whether all rows have been materialized."""
+        return self._row_index >= len(self.rows)
+
     def __iter__(self) -> Iterator[AnyModel]:
         """Construct and generate Model objects for all matching
         objects, in sorted order.
@@ -830,9 +1152,20 @@ class Results(Generic[AnyModel]):
         return self._get_objects()
 
     def _get_indexed_flex_attrs(self) -> dict[int, FlexAttrs]:
-        """Index flexible attributes by the entity id they belong to"""
+        """Index flexible attributes by the entity id they belong to. The
+        index is built once for the result set.
+        """
+        if self._flex_attrs is None:
+            self._flex_attrs = self._index_flex_rows(self.flex_rows)
+        return self._flex_attrs
+
+    @staticmethod
+    def _index_flex_rows(
+        flex_rows: Iterable[sqlite3.Row],
+    ) -> dict[int, FlexAttrs]:
+        """Group flexible attribute rows by the entity id they belong to."""
         flex_values: dict[int, FlexAttrs] = {}
-        for row in self.flex_rows:
+        for row in flex_rows:
             if row["entity_id"] not in flex_values:
                 flex_values[row["entity_id"]] = {}
 
@@ -848,16 +1181,27 @@ class Results(Generic[AnyModel]):
         values = {k: v for (k, v) in cols.items() if not k[:4] == "flex"}
 
         # Construct the Python object
-        return self.model_class(
+        obj = self.model_class(
             self.db, fixed_values=values, flex_values=flex_values
         )
+        obj._projection = self.projection
+        if separate := self.db._separate_fields(self.model_class):
+            # Unless a query needed them, the large fields are not part of
+            # the row and are only fetched when accessed.
+            obj._values_fixed.defer(
+                (f for f in separate if f not in values), obj._load_large_fields
+            )
+        return obj
 
     def __len__(self) -> int:
         """Get the number of matching objects."""
-        if not self._rows:
+        if self._rows is not None and self._consumed:
             # Fully materialized. Just count the objects.
             return len(self._objects)
 
+        if self.sql is not None and (self.query or self._rows is None):
+            return self._count()
+
         if self.query:
             # A slow query. Fall back to testing every object.
             count = 0
@@ -866,7 +1210,16 @@ class Results(Generic[AnyModel]):
             return count
 
         # A fast query. Just count the rows.
-        return self._row_count
+        return len(self.rows)
+
+    def _count(self) -> int:
+        """Count the matching objects in the database. The objects of a
+        slow query are built in batches and not kept.
+        """
+        sql, subvals = self._window_sql
+        return self.db._aggregate(
+            self.model_class, sql, subvals, self.query, {"count": Count()}
+        )["count"]
 
     def __nonzero__(self) -> bool:
         """Does this result contain any objects?"""
@@ -874,17 +1227,44 @@ class Results(Generic[AnyModel]):
 
     def __bool__(self) -> bool:
         """Does this result contain any objects?"""
-        return bool(len(self))
+        # Unlike counting them, this keeps the first object for iterating.
+        return next(iter(self), None) is not None
+
+    @overload
+    def __getitem__(self, n: int) -> AnyModel: ...
+
+    @overload
+    def __getitem__(self, n: slice) -> Results[AnyModel]: ...
 
     def __getitem__(self, n):
-        """Get the nth item in this result set. This is inefficient: all
-        items up to n are materialized and thrown away.
+        """Get the nth item in this result set, or a slice of it as a new
+        result set.
+
+        Without a slow query or sort, this only constructs the requested
+        objects. Otherwise, all items up to the end of the slice are
+        materialized.
         """
-        if not self._rows and not self.sort:
-            # Fully materialized and already in order. Just look up the
-            # object.
+        if isinstance(n, slice):
+            start, stop = self._slice_bounds(n)
+            return self._slice(start, stop)
+
+        if n < 0:
+            n += len(self)
+        if n < 0:
+            raise IndexError(f"result index {n} out of range")
+
+        if n < len(self._objects) and not self.sort:
+            # Already materialized and in order. Just look up the object.
             return self._objects[n]
 
+        if not self.query and not self.sort:
+            # Every row is an object, so build just this one.
+            if n >= len(self.rows):
+                raise IndexError(f"result index {n} out of range")
+            row = self.rows[n]
+            flex_attrs = self._get_indexed_flex_attrs()
+            return self._make_model(row, flex_attrs.get(row["id"], {}))
+
         it = iter(self)
         try:
             for i in range(n):
@@ -893,6 +1273,63 @@ class Results(Generic[AnyModel]):
         except StopIteration:
             raise IndexError(f"result index {n} out of range")
 
+    def limit(self, n: int) -> Results[AnyModel]:
+        """Get a result set with at most the first `n` objects."""
+        return self[:n]
+
+    def offset(self, k: int) -> Results[AnyModel]:
+        """Get a result set without the first `k` objects."""
+        return self[k:]
+
+    def _slice_bounds(self, s: slice) -> tuple[int, int | None]:
+        """Get the non-negative `start` and `stop` offsets of the slice
+        `s`, where a `stop` of None means the end of the results.
+        """
+        if s.step not in (None, 1):
+            raise ValueError("result slices do not support a step")
+
+        start, stop = s.start or 0, s.stop
+        if start < 0 or (stop is not None and stop < 0):
+            # Offsets from the end need the number of objects.
+            start, stop, _ = s.indices(len(self))
+        return start, stop
+
+    def _slice(self, start: int, stop: int | None) -> Results[AnyModel]:
+        """Get the objects from `start` up to `stop` as a new result set.
+
+        If the query and sort are fast and the rows have not been fetched
+        yet, only the rows of the slice will be fetched.
+        """
+        if not self.query and not self.sort and self._rows is None:
+            results: Results[AnyModel] = Results(
+                self.model_class,
+                None,
+                self.db,
+                None,
+                projection=self.projection,
+                sql=self.sql,
+                subvals=self.subvals,
+                order_by=self.order_by,
+            )
+            results._limit, results._offset = self._narrow(start, stop)
+            return results
+
+        if not self.query and not self.sort:
+            # Rows map to objects one to one: leave the rest unmaterialized.
+            results: Results[AnyModel] = Results(
+                self.model_class,
+                self.rows[start:stop],
+                self.db,
+                self.flex_rows,
+                projection=self.projection,
+            )
+            results._flex_attrs = self._flex_attrs
+            return results
+
+        results: Results[AnyModel] = Results(self.model_class, [], self.db, [])
+        results._objects = list(islice(self, start, stop))
+        return results
+
     def get(self) -> AnyModel | None:
         """Return the first matching object, or None if no objects
         match.
@@ -904,9 +1341,340 @@ class Results(Generic[AnyModel]):
             return None
 
 
+class StreamedResults(Results[AnyModel]):
+    """A result set whose rows are fetched in batches as it is iterated.
+
+    Rows are pulled from SQLite in batches of `batch_size` as the results
+    are iterated, and the flexible attributes of each batch are fetched
+    together with it. Objects are not cached once they have been yielded,
+    so memory use stays bounded regardless of the size of the result set.
+    Iterating a second time runs the query again.
+
+    In WAL mode, the rows are read from a live cursor. Otherwise, an open
+    cursor would keep other connections from committing writes, so each
+    page of rows is selected by a statement of its own, starting after
+    the last row of the previous page.
+    """
+
+    batch_size: ClassVar[int] = 500
+    """The number of rows fetched from the cursor at a time. This also
+    bounds the number of bound parameters in the flexible attribute query.
+    """
+
+    page_size: ClassVar[int] = 10000
+    """The largest number of rows selected by one statement without WAL
+    mode. Pages start at `batch_size` rows and grow up to this size, since
+    each statement may have to scan all rows to sort them.
+    """
+
+    def __init__(
+        self,
+        model_class: type[AnyModel],
+        db: D,
+        sql: str,
+        subvals: Sequence[SQLiteType],
+        query: Query | None = None,
+        sort=None,
+        projection: frozenset[str] | None = None,
+        order_by: str | None = None,
+        order_keys: Sequence[tuple[str, bool]] | None = (),
+    ):
+        """Create a streamed result set for the rows returned by `sql`,
+        ordered by the `order_by` clause.
+
+        `sql` selects from a subquery aliased to the model's table and has
+        no WHERE clause, so that the rows after a given one can be
+        selected by adding one. `order_keys` are the `(expression,
+        ascending)` pairs `order_by` orders by, or None if unknown.
+        `query`, `sort` and `projection` are as for `Results`.
+        """
+        super().__init__(
+            model_class,
+            [],
+            db,
+            [],
+            query,
+            sort,
+            projection,
+            sql,
+            subvals,
+            order_by,
+        )
+        self.order_keys = order_keys
+
+    def _page_sql(
+        self,
+        limit: int,
+        offset: int = 0,
+        max_id: int | None = None,
+        after: Sequence[SQLiteType] | None = None,
+    ) -> tuple[str, list[SQLiteType]]:
+        """Get the statement and values that fetch `limit` rows from
+        `offset` on.
+
+        With `max_id`, only the rows up to that id are fetched and, if the
+        `order_keys` are known, they are also ordered by id, so that `after`
+        can give the keys and id of the row to start after.
+        """
+        table = self.model_class._table
+        sql, subvals = self.sql, [*self.subvals]
+        order_by = self.order_by
+        if max_id is not None:
+            conditions = [f"{table}.id <= ?"]
+            subvals.append(max_id)
+            if self.order_keys is not None:
+                keys = [*self.order_keys, (f"{table}.id", True)]
+                order_by = ", ".join(
+                    f"{key} {'ASC' if ascending else 'DESC'}"
+                    for key, ascending in keys
+                )
+                if after is not None:
+                    condition, values = self._after_condition(keys, after)
+                    conditions.append(condition)
+                    subvals += values
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        return f"{sql} LIMIT ? OFFSET ?", [*subvals, limit, offset]
+
+    @staticmethod
+    def _after_condition(
+        keys: Sequence[tuple[str, bool]], after: Sequence[SQLiteType]
+    ) -> tuple[str, list[SQLiteType]]:
+        """Build the condition selecting the rows that sort after the row
+        whose values of the `(expression, ascending)` `keys` are `after`.
+        Null values sort first, like in SQLite.
+        """
+        terms, subvals = [], []
+        for i, ((key, ascending), value) in enumerate(zip(keys, after)):
+            if value is None:
+                if not ascending:
+                    # Nothing sorts after a null value in descending order.
+                    continue
+                term = f"({key}) IS NOT NULL"
+            elif ascending:
+                term = f"({key}) > ?"
+            else:
+                term = f"(({key}) < ? OR ({key}) IS NULL)"
+            equal = [f"({k}) IS ?" for k, _ in keys[:i]]
+            terms.append(f"({' AND '.join([*equal, term])})")
+            subvals += [*after[:i], *(() if value is None else (value,))]
+        return f"({' OR '.join(terms) or '0'})", subvals
+
+    def _iter_pages(self) -> Iterator[list[sqlite3.Row]]:
+        """Generate the rows in the window in batches. The database lock
+        is only held while a batch is fetched.
+        """
+        if self.db._wal:
+            # Readers do not block writers, so keep the cursor open.
+            with self.db.transaction(read_only=True) as tx:
+                cursor = tx.cursor(*self._window_sql)
+            try:
+                while True:
+                    with self.db.transaction(read_only=True):
+                        rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                cursor.close()
+
+        table = self.model_class._table
+        keys = self.order_keys
+        if keys:
+            # Read the keys of the last row of each page, to select the
+            # rows after it.
+            keys_sql = (
+                f"SELECT {', '.join(k for k, _ in keys)} "
+                f"FROM {table} WHERE id = ?"
+            )
+
+        remaining, offset, after = self._limit, self._offset, None
+        max_id = None
+        size = self.batch_size
+        while remaining != 0:
+            limit = size if remaining < 0 else min(size, remaining)
+            with self.db.transaction(read_only=True) as tx:
+                if max_id is None:
+                    # Leave out the rows added while the results are used.
+                    [[max_id]] = tx.query(
+                        f"SELECT COALESCE(MAX(id), 0) FROM {table}"
+                    )
+                rows = tx.query(*self._page_sql(limit, offset, max_id, after))
+                if rows and keys is not None:
+                    after = [rows[-1]["id"]]
+                    if keys:
+                        after[:0] = tx.query(keys_sql, after)[0]
+            if rows:
+                yield rows
+            if len(rows) < limit:
+                return
+
+            if remaining > 0:
+                remaining -= len(rows)
+            # Without the keys, skip the rows of the previous pages.
+            offset = 0 if keys is not None else offset + len(rows)
+            size = min(size * 2, max(self.page_size, self.batch_size))
+
+    def _iter_rows(self) -> Iterator[tuple[sqlite3.Row, FlexAttrs]]:
+        """Generate main table rows paired with their flexible attributes,
+        which are fetched for each batch of rows.
+        """
+        flex_sql = (
+            f"SELECT * FROM {self.model_class._flex_table} "
+            "WHERE entity_id IN ({}) "
+        )
+        flex_keys = self._flex_keys or []
+        if self._flex_keys is not None:
+            flex_sql += f"AND key IN ({', '.join('?' * len(flex_keys))}) "
+        flex_sql += "ORDER BY entity_id"
+
+        for page in self._iter_pages():
+            for start in range(0, len(page), self.batch_size):
+                rows = page[start : start + self.batch_size]
+                flex_rows = []
+                if self._flex_keys != []:
+                    ids = [row["id"] for row in rows]
+                    with self.db.transaction(read_only=True) as tx:
+                        flex_rows = tx.query(
+                            flex_sql.format(", ".join("?" * len(ids))),
+                            [*ids, *flex_keys],
+                        )
+                flex_attrs = self._index_flex_rows(flex_rows)
+                for row in rows:
+                    yield row, flex_attrs.get(row["id"], {})
+
+    def _get_objects(self) -> Iterator[AnyModel]:
+        """Construct and generate Model objects for the query, in the
+        order emitted from the database, without caching them.
+        """
+        row_match, obj_match = self._predicates
+        for row, flex_values in self._iter_rows():
+            if row_match and not row_match(row):
+                continue
+            obj = self._make_model(row, flex_values)
+            if not obj_match or obj_match(obj):
+                yield obj
+
+    def __len__(self) -> int:
+        """Get the number of matching objects."""
+        return self._count()
+
+    def __getitem__(self, n):
+        """Get the nth item in this result set, or a slice of it as a new
+        result set.
+
+        Without a slow query or sort, only the requested rows are fetched.
+        Otherwise, all items up to n are constructed and thrown away.
+        """
+        if isinstance(n, slice):
+            start, stop = self._slice_bounds(n)
+            return self._slice(start, stop)
+
+        if n < 0:
+            n += len(self)
+        if n >= 0:
+            if self.query or self.sort:
+                objs = islice(self, n, None)
+            else:
+                objs = iter(self[n : n + 1])
+            for obj in objs:
+                return obj
+        raise IndexError(f"result index {n} out of range")
+
+    def _slice(self, start: int, stop: int | None) -> Results[AnyModel]:
+        """Get the objects from `start` up to `stop` as a new result set,
+        narrowing the window of fetched rows if the query and sort are
+        fast.
+        """
+        if self.query or self.sort:
+            return super()._slice(start, stop)
+
+        results = StreamedResults(
+            self.model_class,
+            self.db,
+            self.sql,
+            self.subvals,
+            projection=self.projection,
+            order_by=self.order_by,
+            order_keys=self.order_keys,
+        )
+        results._limit, results._offset = self._narrow(start, stop)
+        return results
+
+
+class IdentityMap:
+    """A bounded cache of model objects by table and id, so that repeated
+    lookups of the same row can share one object instead of querying the
+    database and building a new one.
+
+    The cached objects are only valid at the database revision the map
+    was last synchronized to. Transactions drop the rows they write, see
+    :meth:`Transaction.mutate`, and then synchronize the map to the new
+    revision. Any other change to the revision empties the map. When the
+    map is full, the least recently used objects are evicted.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.revision = 0
+        self._objects: OrderedDict[tuple[str, int], Model] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table: str, id_: int, revision: int) -> Model | None:
+        """Get the cached object for a row if it is current at `revision`."""
+        with self._lock:
+            if revision != self.revision:
+                self._objects.clear()
+                self.revision = revision
+                return None
+            if obj := self._objects.get((table, id_)):
+                self._objects.move_to_end((table, id_))
+            return obj
+
+    def add(self, obj: Model, revision: int):
+        """Cache `obj`, which was loaded at `revision`."""
+        with self._lock:
+            if revision != self.revision:
+                return
+            self._objects[obj._table, obj.id] = obj
+            self._objects.move_to_end((obj._table, obj.id))
+            while len(self._objects) > self.size:
+                self._objects.popitem(last=False)
+
+    def discard(self, rows: Iterable[tuple[str, int]] | None):
+        """Drop the objects for the given `(table, id)` rows, or all
+        objects if the changed rows are not known.
+        """
+        with self._lock:
+            if rows is None:
+                self._objects.clear()
+            else:
+                for row in rows:
+                    self._objects.pop(row, None)
+
+    def sync(self, rows: Iterable[tuple[str, int]] | None, revision: int):
+        """Drop the objects for the rows changed by a transaction and keep
+        the remaining ones valid at the new `revision`.
+        """
+        self.discard(rows)
+        with self._lock:
+            self.revision = revision
+
+    def __contains__(self, obj: Model) -> bool:
+        with self._lock:
+            return self._objects.get((obj._table, obj.id)) is obj
+
+
 class Transaction:
     """A context manager for safe, concurrent access to the database.
     All SQL commands should be executed through a transaction.
+
+    A `read_only` transaction must not write to the database, and no
+    writing transaction can be nested in it: they raise RuntimeError. If
+    the database uses WAL mode, such a transaction does not wait for the
+    writing transactions of other threads, unless it is nested in a
+    writing transaction.
     """
 
     _mutated = False
@@ -914,20 +1682,35 @@ class Transaction:
     current transaction.
     """
 
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, read_only: bool = False):
         self.db = db
+        self.read_only = read_only
+        # The `(table, id)` rows written in this transaction, or None if
+        # some statement changed unknown rows.
+        self._rows: set[tuple[str, int]] | None = set()
+        # Whether this is a root transaction holding the database lock.
+        self._locked = False
 
     def __enter__(self) -> Transaction:
         """Begin a transaction. This transaction may be created while
         another is active in a different thread.
         """
         with self.db._tx_stack() as stack:
-            first = not stack
+            root = stack[0] if stack else self
+            if not (root is self or self.read_only or not root.read_only):
+                raise RuntimeError("cannot write in a read-only transaction")
             stack.append(self)
-        if first:
-            # Beginning a "root" transaction, which corresponds to an
-            # SQLite transaction.
+        if root is not self:
+            self._conn = root._conn
+            return self
+
+        # Beginning a "root" transaction, which corresponds to an SQLite
+        # transaction.
+        concurrent = self.read_only and self.db._wal
+        self._locked = not concurrent
+        if self._locked:
             self.db._db_lock.acquire()
+        self._conn = self.db._connection(read_only=concurrent)
         return self
 
     def __exit__(
@@ -940,16 +1723,24 @@ class Transaction:
         entered but not yet exited transaction. If it is the last active
         transaction, the database updates are committed.
         """
-        # Beware of races; currently secured by db._db_lock
-        self.db.revision += self._mutated
         with self.db._tx_stack() as stack:
             assert stack.pop() is self
-            empty = not stack
-        if empty:
+            root = stack[0] if stack else None
+        if root is not None:
+            if self._mutated:
+                # The root synchronizes the identity map again once the
+                # changes are committed and visible to concurrent readers.
+                root._mutated = True
+                root._track_rows(self._rows)
+                self._synchronize()
+        else:
             # Ending a "root" transaction. End the SQLite transaction.
-            self.db._connection().commit()
+            self._conn.commit()
+            if self._mutated:
+                self._synchronize()
             self._mutated = False
-            self.db._db_lock.release()
+            if self._locked:
+                self.db._db_lock.release()
 
         if (
             isinstance(exc_value, sqlite3.OperationalError)
@@ -959,14 +1750,37 @@ class Transaction:
 
         return None
 
+    def _synchronize(self):
+        """Bump the database's revision after a mutation and drop the
+        changed rows from the identity map.
+        """
+        # Beware of races; currently secured by db._db_lock, which is
+        # held by any transaction that mutates.
+        self.db.revision += 1
+        if self.db._identity_map:
+            self.db._identity_map.sync(self._rows, self.db.revision)
+
     def query(
         self, statement: str, subvals: Sequence[SQLiteType] = ()
     ) -> list[sqlite3.Row]:
         """Execute an SQL statement with substitution values and return
         a list of rows from the database.
         """
-        cursor = self.db._connection().execute(statement, subvals)
-        return cursor.fetchall()
+        start = time.perf_counter()
+        rows = self._conn.execute(statement, subvals).fetchall()
+        self._profile(statement, len(subvals), start, len(rows), subvals)
+        return rows
+
+    def cursor(
+        self, statement: str, subvals: Sequence[SQLiteType] = ()
+    ) -> sqlite3.Cursor:
+        """Execute an SQL statement with substitution values and return
+        the live cursor, so rows can be fetched incrementally.
+        """
+        start = time.perf_counter()
+        cursor = self._conn.execute(statement, subvals)
+        self._profile(statement, len(subvals), start, None, subvals)
+        return cursor
 
     @contextmanager
     def _handle_mutate(self) -> Iterator[None]:
@@ -975,6 +1789,8 @@ class Transaction:
         Yield control to mutation execution code. If execution succeeds,
         mark this transaction as mutated.
         """
+        if self.read_only:
+            raise RuntimeError("cannot write in a read-only transaction")
         try:
             yield
         except sqlite3.OperationalError as e:
@@ -996,25 +1812,118 @@ class Transaction:
         else:
             self._mutated = True
 
-    def mutate(self, statement: str, subvals: Sequence[SQLiteType] = ()) -> Any:
-        """Run one write statement with shared mutation/error handling."""
+    def mutate(
+        self,
+        statement: str,
+        subvals: Sequence[SQLiteType] = (),
+        rows: Iterable[tuple[str, int]] | None = None,
+    ) -> Any:
+        """Run one write statement with shared mutation/error handling.
+
+        `rows` are the `(table, id)` pairs of the model rows the statement
+        changes, if known, so that only those are dropped from the
+        database's identity map.
+        """
+        start = time.perf_counter()
         with self._handle_mutate():
-            return self.db._connection().execute(statement, subvals).lastrowid
+            cursor = self._conn.execute(statement, subvals)
+        self._profile(statement, len(subvals), start, cursor.rowcount)
+        self._track(rows)
+        return cursor.lastrowid
 
     def mutate_many(
-        self, statement: str, subvals: Sequence[tuple[SQLiteType, ...]] = ()
+        self,
+        statement: str,
+        subvals: Sequence[tuple[SQLiteType, ...]] = (),
+        rows: Iterable[tuple[str, int]] | None = None,
     ) -> Any:
-        """Run batched writes with shared mutation/error handling."""
+        """Run batched writes with shared mutation/error handling.
+
+        `rows` are the changed model rows, as for :meth:`mutate`.
+        """
+        start = time.perf_counter()
         with self._handle_mutate():
-            return (
-                self.db._connection().executemany(statement, subvals).lastrowid
-            )
+            cursor = self._conn.executemany(statement, subvals)
+        binds = sum(map(len, subvals)) if self.db.profiler else 0
+        self._profile(statement, binds, start, cursor.rowcount)
+        self._track(rows)
+        return cursor.lastrowid
+
+    def _track(self, rows: Iterable[tuple[str, int]] | None):
+        """Record the model rows changed by a statement and drop them
+        from the identity map right away.
+        """
+        if not self.db._identity_map:
+            return
+        if rows is not None:
+            rows = set(rows)
+        self._track_rows(rows)
+        self.db._identity_map.discard(rows)
+
+    def _track_rows(self, rows: set[tuple[str, int]] | None):
+        """Add the changed `rows`, or None if unknown, to those of this
+        transaction.
+        """
+        if rows is None or self._rows is None:
+            self._rows = None
+        else:
+            self._rows |= rows
+
+    def reserve(self):
+        """Take the database's write lock now rather than at the first
+        write, so that what is read afterwards stays valid until the
+        transaction is committed, even for other processes.
+        """
+        with self._handle_mutate():
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        """Undo the statements executed in the block if it raises, and
+        keep the rest of the transaction.
+        """
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        self._conn.execute("SAVEPOINT block")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK TO block")
+            raise
+        finally:
+            self._conn.execute("RELEASE block")
 
     def script(self, statements: str):
         """Execute a string containing multiple SQL statements."""
         # We don't know whether this mutates, but quite likely it does.
         self._mutated = True
-        self.db._connection().executescript(statements)
+        start = time.perf_counter()
+        self._conn.executescript(statements)
+        self._profile(statements, 0, start, None)
+        self._track(None)
+
+    def _profile(
+        self,
+        statement: str,
+        binds: int,
+        start: float,
+        rows: int | None,
+        subvals: Sequence[SQLiteType] = (),
+    ):
+        """Report a statement executed since `start` to the database's
+        profiler, if there is one, and capture its query plan if needed.
+        """
+        profiler = self.db.profiler
+        if profiler is None:
+            return
+
+        profiler.record(statement, binds, time.perf_counter() - start, rows)
+        if profiler.needs_plan(statement):
+            plan = self._conn.execute(
+                f"EXPLAIN QUERY PLAN {statement}", subvals
+            )
+            profiler.plans[statement] = [row["detail"] for row in plan]
 
 
 @dataclass
@@ -1090,7 +1999,26 @@ class Database:
     data is written in a transaction.
     """
 
-    def __init__(self, path, timeout: float = 5.0):
+    profiler: SQLProfiler | None = None
+    """If set, records every SQL statement executed by the database and
+    every query or sort that is evaluated in Python.
+    """
+
+    def __init__(
+        self,
+        path,
+        timeout: float = 5.0,
+        model_cache_size: int = 0,
+        full_text_search: bool = False,
+        record_queries: bool = False,
+        column_store: bool = False,
+        large_field_storage: str = "inline",
+        wal: bool = False,
+        page_cache_size: int = 0,
+        mmap_size: int = 0,
+        write_queue: bool = False,
+        change_journal: bool = False,
+    ):
         if sqlite3.threadsafety == 0:
             raise RuntimeError(
                 "sqlite3 must be compiled with multi-threading support"
@@ -1106,7 +2034,46 @@ class Database:
         self.path = path
         self.timeout = timeout
 
+        # Whether the database is in WAL mode, where all threads write
+        # through one connection and read through their own read-only
+        # connections, concurrently with writes.
+        self._wal = wal and path != ":memory:"
+
+        # The sizes of the page cache and of the memory-mapped part of the
+        # database for each connection, in KiB, or 0 for SQLite's defaults.
+        self.page_cache_size = page_cache_size
+        self.mmap_size = mmap_size
+
+        # Where the large fields of the models are stored: "inline" in
+        # their tables, or in separate tables ("separate"), optionally
+        # compressed ("compressed").
+        self._large_field_storage = large_field_storage
+
+        # The number of objects written by this process, and the number
+        # at which each field was last changed, with None standing for
+        # objects that were added or removed or had any field changed.
+        self.write_count = 0
+        self._field_writes: dict[str | None, int] = {}
+
+        # An optional cache of model objects shared between lookups.
+        self._identity_map: IdentityMap | None = (
+            IdentityMap(model_cache_size) if model_cache_size > 0 else None
+        )
+
+        # The number of fetches by table and indexable columns, if they
+        # are recorded. They are saved to the database when it is closed.
+        self._query_shapes: Counter[tuple[str, tuple[str, ...]]] | None = (
+            Counter() if record_queries else None
+        )
+
         self._connections: dict[int, sqlite3.Connection] = {}
+        self._writer: sqlite3.Connection | None = None
+
+        # An optional thread that runs the writes of all threads, see
+        # `submit`. Threads cannot share an in-memory database.
+        self._write_queue: WriteQueue | None = (
+            WriteQueue(self) if write_queue and path != ":memory:" else None
+        )
         self._tx_stacks: defaultdict[int, list[Transaction]] = defaultdict(list)
         self._extensions: list[str] = []
 
@@ -1124,15 +2091,50 @@ class Database:
         # is active at a time.
         self._db_lock = threading.Lock()
 
+        if self._wal:
+            with self.transaction() as tx:
+                tx.query("PRAGMA journal_mode = WAL")
+
         # Set up database schema.
         self._ensure_migration_state_table()
         for model_cls in self._models:
             self._make_table(model_cls._table, model_cls._fields)
             self._make_attribute_table(model_cls._flex_table)
             self._create_indices(model_cls._table, model_cls._indices)
+            if self._separate_fields(model_cls):
+                self._make_large_table(model_cls._large_table)
+
+        # Once created, the journal is written by every process until it
+        # is removed with `remove_changes`, so that it misses no change.
+        if change_journal:
+            self._make_changes_table()
+        self.change_journal = self._has_changes_table()
+        if self.change_journal:
+            # Keep the journal from growing with every write.
+            self.compact_changes()
 
         self._migrate()
 
+        # The tables of the models whose search fields have a full-text
+        # index. Without the option, an existing index is not used, but its
+        # triggers keep it up to date until it is removed with
+        # `remove_fts_tables`, so it is not rebuilt when enabled again.
+        self._fts_tables: set[str] = set()
+        if full_text_search:
+            self._fts_tables = self._make_fts_tables()
+
+        # An optional columnar cache of the fixed fields, stored next to
+        # the database file.
+        self._column_store: ColumnStore | None = None
+        if column_store and path != ":memory:":
+            store_path = f"{os.fsdecode(path)}.columns"
+            self._make_column_journal(store_path)
+            self._column_store = ColumnStore(self, store_path)
+        # Without the option, the journal and the saved columns are kept,
+        # so that the columns can be brought up to date when it is enabled
+        # again.
+        self._compact_column_journal()
+
     @cached_property
     def db_tables(self) -> dict[str, TableInfo]:
         column_queries = [
@@ -1161,9 +2163,13 @@ class Database:
 
     # Primitive access control: connections and transactions.
 
-    def _connection(self) -> Connection:
+    def _connection(self, read_only: bool = False) -> Connection:
         """Get a SQLite connection object to the underlying database.
-        One connection object is created per thread.
+
+        One connection object is created per thread. In WAL mode, this is
+        only the case for `read_only` connections, and all threads share
+        one connection for writing, which is used by transactions that
+        hold the database lock.
         """
         thread_id = threading.current_thread().ident
         # Help the type checker: ident can only be None if the thread has not
@@ -1172,18 +2178,30 @@ class Database:
         assert thread_id is not None
 
         with self._shared_map_lock:
+            if self._wal and not read_only:
+                if self._writer is None:
+                    self._writer = self._create_connection()
+                return self._writer
+
             if thread_id in self._connections:
                 return self._connections[thread_id]
-            conn = self._create_connection()
+            self._reap_connections()
+            conn = self._create_connection(read_only=self._wal)
             self._connections[thread_id] = conn
             return conn
 
-    def _create_connection(self) -> Connection:
+    def _reap_connections(self):
+        """Close the connections of the threads that have ended."""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for thread_id in self._connections.keys() - alive:
+            self._connections.pop(thread_id).close()
+
+    def _create_connection(self, read_only: bool = False) -> Connection:
         """Create a SQLite connection to the underlying database.
 
         Makes a new connection every time. If you need to configure the
         connection settings (e.g., add custom functions), override this
-        method.
+        method. A `read_only` connection refuses to write.
         """
         # Make a new connection. The `sqlite3` module can't use
         # bytestring paths here on Python 3, so we need to
@@ -1214,6 +2232,13 @@ class Database:
             for path in self._extensions:
                 conn.load_extension(path)
 
+        if self.page_cache_size:
+            conn.execute(f"PRAGMA cache_size = {-int(self.page_cache_size)}")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size) * 1024}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+
         # Access SELECT results like dictionaries.
         conn.row_factory = sqlite3.Row
         return conn
@@ -1247,16 +2272,25 @@ class Database:
         create_function("regexp", 2, regexp)
         create_function("unidecode", 1, unidecode)
         create_function("bytelower", 1, bytelower)
+        create_function("inflate", 1, inflate)
 
     def _close(self):
         """Close the all connections to the underlying SQLite database
         from all threads. This does not render the database object
         unusable; new connections can still be opened on demand.
         """
+        if self._write_queue:
+            self._write_queue.close()
+        if self._query_shapes:
+            self._save_query_shapes()
+
         with self._shared_map_lock:
             while self._connections:
                 _thread_id, conn = self._connections.popitem()
                 conn.close()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
 
     @contextmanager
     def _tx_stack(self) -> Generator[list[Transaction]]:
@@ -1273,11 +2307,46 @@ class Database:
         with self._shared_map_lock:
             yield self._tx_stacks[thread_id]
 
-    def transaction(self) -> Transaction:
+    def submit(self, func: Callable[..., T], *args: Any) -> Future[T]:
+        """Call `func`, which writes to the database, with `args` and get
+        a future for its result.
+
+        If the database has a write queue, the call runs on the writer
+        thread, in a transaction shared with the writes submitted by other
+        threads, and the future is resolved once that transaction is
+        committed. Otherwise, or if the current thread is in a
+        transaction, the call runs right away.
+        """
+        if self._write_queue is None or self._in_transaction():
+            future: Future[T] = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        return self._write_queue.submit(func, *args)
+
+    def _write(self, func: Callable[..., T], *args: Any) -> T:
+        """Call the writing function `func` with `args` through the write
+        queue, if there is one, and wait for its result.
+        """
+        if self._write_queue is None or self._in_transaction():
+            return func(*args)
+        return self._write_queue.submit(func, *args).result()
+
+    def _in_transaction(self) -> bool:
+        """Whether the current thread is in a transaction."""
+        with self._tx_stack() as stack:
+            return bool(stack)
+
+    def transaction(self, read_only: bool = False) -> Transaction:
         """Get a :class:`Transaction` object for interacting directly
         with the underlying SQLite database.
+
+        In WAL mode, a `read_only` transaction runs concurrently with the
+        transactions of other threads.
         """
-        return Transaction(self)
+        return Transaction(self, read_only)
 
     def load_extension(self, path: str):
         """Load an SQLite extension into all open connections."""
@@ -1291,6 +2360,8 @@ class Database:
         # Load the extension into every open connection.
         for conn in self._connections.values():
             conn.load_extension(path)
+        if self._writer is not None:
+            self._writer.load_extension(path)
 
     # Schema setup and migration.
 
@@ -1334,6 +2405,20 @@ class Database:
                     ON {flex_table} (entity_id);
                 """)
 
+    def _make_large_table(self, large_table: str):
+        """Create a table for the separated large fields of a model, if it
+        does not exist yet.
+        """
+        with self.transaction() as tx:
+            tx.script(f"""
+                CREATE TABLE IF NOT EXISTS {large_table} (
+                    entity_id INTEGER,
+                    key TEXT,
+                    value BLOB,
+                    PRIMARY KEY (entity_id, key)
+                ) WITHOUT ROWID;
+                """)
+
     def _create_indices(self, table: str, indices: Sequence[Index]):
         """Create indices for the given table if they don't exist."""
         with self.transaction() as tx:
@@ -1343,6 +2428,441 @@ class Database:
                     f"ON {table} ({', '.join(index.columns)});"
                 )
 
+    # Index suggestions.
+
+    def _save_query_shapes(self):
+        """Add the recorded query shapes to their counts in the database
+        and reset them.
+        """
+        assert self._query_shapes is not None
+        shapes, self._query_shapes = self._query_shapes, Counter()
+        try:
+            with self.transaction() as tx:
+                tx.script("""
+                    CREATE TABLE IF NOT EXISTS query_shapes (
+                        table_name TEXT NOT NULL,
+                        columns TEXT NOT NULL,
+                        count INTEGER NOT NULL,
+                        PRIMARY KEY(table_name, columns)
+                    );
+                """)
+                tx.mutate_many(
+                    "INSERT INTO query_shapes(table_name, columns, count) "
+                    "VALUES (?, ?, ?) ON CONFLICT(table_name, columns) "
+                    "DO UPDATE SET count = count + excluded.count",
+                    [
+                        (table, ",".join(columns), count)
+                        for (table, columns), count in shapes.items()
+                    ],
+                    rows=(),
+                )
+        except DBAccessError:
+            # Recording query shapes must not break read-only libraries.
+            pass
+
+    def _existing_indices(self, table: str) -> list[tuple[str | None, ...]]:
+        """Get the key columns of each index on `table`. Expressions are
+        given as None.
+        """
+        with self.transaction() as tx:
+            names = [
+                row["name"] for row in tx.query(f"PRAGMA index_list('{table}')")
+            ]
+            return [
+                tuple(
+                    row["name"]
+                    for row in tx.query(f"PRAGMA index_xinfo('{name}')")
+                    if row["key"]
+                )
+                for name in names
+            ]
+
+    def suggest_indices(self, min_count: int = 1) -> list[IndexSuggestion]:
+        """Suggest indices for the fast parts of the queries that were
+        fetched at least `min_count` times while query shapes were being
+        recorded, most frequent first.
+
+        Queries that an existing index covers are skipped. An index
+        covers a query if its leading columns are the query's columns.
+        """
+        if self._query_shapes:
+            self._save_query_shapes()
+
+        with self.transaction() as tx:
+            if not tx.query(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'query_shapes'"
+            ):
+                return []
+            rows = tx.query(
+                "SELECT table_name, columns, count FROM query_shapes "
+                "WHERE count >= ? ORDER BY count DESC",
+                (min_count,),
+            )
+
+        tables = {model_cls._table for model_cls in self._models}
+        existing: dict[str, list[tuple[str | None, ...]]] = {}
+        suggestions = []
+        for table, columns_str, count in rows:
+            if table not in tables:
+                continue
+            if table not in existing:
+                existing[table] = self._existing_indices(table)
+
+            columns = tuple(columns_str.split(","))
+            # Expression columns are only known to be indexed by name.
+            key = tuple(None if "(" in c else c for c in columns)
+            if any(index[: len(key)] == key for index in existing[table]):
+                continue
+
+            index = Index(index_name(table, columns), columns)
+            suggestions.append(IndexSuggestion(table, index, count))
+            existing[table].append(key)
+
+        return suggestions
+
+    def create_indices(self, suggestions: Iterable[IndexSuggestion]):
+        """Create the suggested indices, if they don't exist."""
+        for suggestion in suggestions:
+            self._create_indices(suggestion.table, [suggestion.index])
+
+    def analyze(self):
+        """Gather statistics about the tables and indices, which help
+        SQLite choose the best index for a query.
+        """
+        with self.transaction() as tx:
+            tx.script("ANALYZE;")
+
+    # Full-text search.
+
+    def _make_fts_tables(self) -> set[str]:
+        """Create the full-text indexes of the models' search fields and
+        return the tables that have one. If SQLite does not support them,
+        leave all tables without an index.
+
+        Only the search fields stored in the model's table can be indexed,
+        so a model whose large fields are searched and stored separately
+        has no index.
+        """
+        tables = set()
+        try:
+            for model_cls in self._models:
+                if model_cls._search_fields and all(
+                    f in self._table_columns(model_cls)
+                    for f in model_cls._search_fields
+                ):
+                    self._make_fts_table(model_cls)
+                    tables.add(model_cls._table)
+                else:
+                    self._drop_fts_table(model_cls)
+        except sqlite3.OperationalError:
+            # FTS5 or its trigram tokenizer (SQLite 3.34+) are missing.
+            self._drop_fts_tables()
+            return set()
+        return tables
+
+    def _make_fts_table(self, model_cls: type[Model]):
+        """Create an FTS5 index of the search fields of `model_cls`, unless
+        it exists already.
+
+        The index uses the model's table as external content, and triggers
+        keep it up to date whenever rows are written. The trigram tokenizer
+        allows it to look up any substring of at least three characters,
+        ignoring case.
+        """
+        table, fts_table = model_cls._table, model_cls._fts_table
+        fields = list(model_cls._search_fields)
+        columns = ", ".join(fields)
+        new = ", ".join(f"new.{f}" for f in fields)
+        old = ", ".join(f"old.{f}" for f in fields)
+
+        with self.transaction() as tx:
+            current = tx.query(
+                f"SELECT name FROM pragma_table_info('{fts_table}')"
+            )
+            if [row["name"] for row in current] == fields:
+                return
+
+            self._drop_fts_table(model_cls)
+            tx.script(f"""
+                CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                    {columns},
+                    content='{table}',
+                    content_rowid='id',
+                    tokenize='trigram'
+                );
+                CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO {fts_table} (rowid, {columns})
+                        VALUES (new.id, {new});
+                END;
+                CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {columns})
+                        VALUES ('delete', old.id, {old});
+                END;
+                CREATE TRIGGER {fts_table}_update
+                    AFTER UPDATE OF {columns} ON {table}
+                BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {columns})
+                        VALUES ('delete', old.id, {old});
+                    INSERT INTO {fts_table} (rowid, {columns})
+                        VALUES (new.id, {new});
+                END;
+                INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild');
+                """)
+
+    def remove_fts_tables(self):
+        """Remove the full-text indexes of all models and their triggers,
+        so that searches and writes no longer use them.
+        """
+        self._drop_fts_tables()
+        self._fts_tables = set()
+
+    def _drop_fts_tables(self):
+        """Drop the full-text indexes of all models, if they exist."""
+        for model_cls in self._models:
+            self._drop_fts_table(model_cls)
+
+    def _drop_fts_table(self, model_cls: type[Model]):
+        """Drop the full-text index of `model_cls` and its triggers.
+
+        Without FTS5, SQLite cannot drop the index itself, which is left
+        in place. Dropping the triggers is enough for it to no longer be
+        written.
+        """
+        fts_table = model_cls._fts_table
+        with self.transaction() as tx:
+            tx.script(f"""
+                DROP TRIGGER IF EXISTS {fts_table}_insert;
+                DROP TRIGGER IF EXISTS {fts_table}_delete;
+                DROP TRIGGER IF EXISTS {fts_table}_update;
+                """)
+            try:
+                tx.script(f"DROP TABLE IF EXISTS {fts_table};")
+            except sqlite3.OperationalError:
+                # "no such module: fts5"
+                pass
+
+    # Column store.
+
+    def _make_column_journal(self, store_path: str):
+        """Create the triggers that log the rows written to the tables of
+        the models for the column store, unless they exist already.
+
+        If the journal is new, the columns saved at `store_path` may miss
+        changes, so they are removed.
+        """
+        with self.transaction() as tx:
+            if tx.query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (JOURNAL_TABLE,),
+            ):
+                return
+
+            shutil.rmtree(store_path, ignore_errors=True)
+            tx.script(f"""
+                CREATE TABLE {JOURNAL_TABLE} (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    entity_id INTEGER NOT NULL
+                );
+                """)
+            for model_cls in self._models:
+                table = model_cls._table
+                for event, row in [
+                    ("insert", "new"),
+                    ("update", "new"),
+                    ("delete", "old"),
+                ]:
+                    tx.script(f"""
+                        CREATE TRIGGER {table}_columns_{event}
+                            AFTER {event.upper()} ON {table}
+                        BEGIN
+                            INSERT INTO {JOURNAL_TABLE} (table_name, entity_id)
+                                VALUES ('{table}', {row}.id);
+                        END;
+                        """)
+
+    def _compact_column_journal(self):
+        """Keep only the latest entry for each row in the journal of the
+        column store, if there is one, so that it does not grow with every
+        write.
+        """
+        with self.transaction() as tx:
+            if not tx.query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (JOURNAL_TABLE,),
+            ) or not tx.query(
+                f"SELECT 1 FROM {JOURNAL_TABLE} GROUP BY table_name, entity_id "
+                "HAVING COUNT(*) > 1 LIMIT 1"
+            ):
+                return
+            tx.mutate(
+                f"""
+                DELETE FROM {JOURNAL_TABLE} WHERE seq NOT IN (
+                    SELECT MAX(seq) FROM {JOURNAL_TABLE}
+                    GROUP BY table_name, entity_id
+                )
+                """,
+                rows=(),
+            )
+
+    # Change journal.
+
+    def _make_changes_table(self):
+        """Create the journal of the objects written to the database, if
+        it does not exist yet.
+        """
+        with self.transaction() as tx:
+            tx.script(f"""
+                CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+                    revision INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    entity_id INTEGER NOT NULL,
+                    op TEXT NOT NULL,
+                    fields TEXT
+                );
+                """)
+
+    def _has_changes_table(self) -> bool:
+        with self.transaction() as tx:
+            return bool(
+                tx.query(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                    "AND name = ?",
+                    (CHANGES_TABLE,),
+                )
+            )
+
+    def remove_changes(self):
+        """Remove the journal of the changes, so that writes are no longer
+        journaled.
+
+        The revision of the latest change is kept, so the revisions of a
+        journal created later continue from it.
+        """
+        revision = self.change_revision
+        with self.transaction() as tx:
+            tx.script(f"DROP TABLE IF EXISTS {CHANGES_TABLE};")
+            if revision:
+                tx.mutate(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                    (CHANGES_TABLE, revision),
+                    rows=(),
+                )
+        self.change_journal = False
+
+    def _journal(
+        self,
+        tx: Transaction,
+        changes: Sequence[tuple[str, int, str, Sequence[str] | None]],
+    ):
+        """Record the `(table, id, op, fields)` changes written in `tx`,
+        and append them to the journal if it exists.
+        """
+        for _, _, op, fields in changes:
+            self.write_count += 1
+            if op != UPDATE or fields is None:
+                self._field_writes[None] = self.write_count
+            else:
+                for field in fields:
+                    self._field_writes[field] = self.write_count
+
+        if changes and self.change_journal:
+            tx.mutate_many(
+                f"""
+                INSERT INTO {CHANGES_TABLE} (table_name, entity_id, op, fields)
+                VALUES (?, ?, ?, ?)
+                """,
+                [
+                    Change(0, table, id_, op, fields).to_row()[1:]
+                    for table, id_, op, fields in changes
+                ],
+                rows=(),
+            )
+
+    def fields_changed(
+        self, since: int, fields: Iterable[str] | None = None
+    ) -> bool:
+        """Whether this process has added or removed an object, or
+        changed any of `fields` of one (any field if `fields` is None),
+        after its :attr:`write_count` was `since`.
+
+        Unlike :meth:`changes`, this does not read the journal, but does
+        not know about the writes of other processes.
+        """
+        if fields is None:
+            return self.write_count > since
+        return any(
+            self._field_writes.get(field, 0) > since
+            for field in (None, *fields)
+        )
+
+    @property
+    def change_revision(self) -> int:
+        """The revision of the latest change in the journal, or 0 if no
+        object has been written yet.
+
+        Unlike :attr:`revision`, this revision is stored in the database, so
+        that other processes can ask for the changes made since they last
+        read it.
+        """
+        with self.transaction(read_only=True) as tx:
+            rows = tx.query(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?",
+                (CHANGES_TABLE,),
+            )
+        return rows[0][0] if rows else 0
+
+    def changes(self, since: int = 0) -> list[Change]:
+        """Get the changes made after the revision `since`, oldest first.
+        The journal must exist, see :attr:`change_journal`.
+
+        Changes made after `since` may have been merged with older ones by
+        :meth:`compact_changes`, so some of the changes can be older than
+        `since` in fact. Applying them again must be harmless.
+        """
+        with self.transaction(read_only=True) as tx:
+            rows = tx.query(
+                f"""
+                SELECT revision, table_name, entity_id, op, fields
+                FROM {CHANGES_TABLE}
+                WHERE revision > ?
+                ORDER BY revision
+                """,
+                (since,),
+            )
+        return [Change.from_row(row) for row in rows]
+
+    def compact_changes(self) -> int:
+        """Merge the changes of each object in the journal into one and
+        return the number of changes removed.
+        """
+        with self.transaction() as tx:
+            rows = tx.query(
+                f"""
+                SELECT revision, table_name, entity_id, op, fields
+                FROM {CHANGES_TABLE}
+                ORDER BY revision
+                """
+            )
+            compacted = compact(map(Change.from_row, rows))
+            if len(compacted) == len(rows):
+                return 0
+
+            tx.mutate(f"DELETE FROM {CHANGES_TABLE}", rows=())
+            tx.mutate_many(
+                f"""
+                INSERT INTO {CHANGES_TABLE}
+                    (revision, table_name, entity_id, op, fields)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [change.to_row() for change in compacted],
+                rows=(),
+            )
+        return len(rows) - len(compacted)
+
     # Generic migration state handling.
 
     def _ensure_migration_state_table(self) -> None:
@@ -1385,6 +2905,67 @@ class Database:
                 (name, table),
             )
 
+    # Large fields.
+
+    def _separate_fields(self, model_cls: type[Model]) -> Sequence[str]:
+        """Get the large fields of `model_cls` that are stored in its
+        separate table.
+        """
+        if self._large_field_storage == "inline":
+            return ()
+        return model_cls._large_fields
+
+    def _table_columns(self, model_cls: type[Model]) -> list[str]:
+        """Get the fields of `model_cls` that are read from its table."""
+        separate = self._separate_fields(model_cls)
+        return [f for f in model_cls._fields if f not in separate]
+
+    def _large_value(self, value: SQLiteType) -> SQLiteType:
+        """Get the value of a large field to store in the separate table."""
+        if self._large_field_storage == "compressed" and isinstance(value, str):
+            return deflate(value)
+        return value
+
+    def _load_large_fields(self, obj: Model) -> JSONDict:
+        """Fetch the raw values of the separated large fields of `obj`."""
+        if not self._separate_fields(type(obj)):
+            return {}
+        with self.transaction(read_only=True) as tx:
+            rows = tx.query(
+                f"SELECT key, value FROM {obj._large_table} WHERE entity_id=?",
+                (obj.id,),
+            )
+        return {row["key"]: inflate(row["value"]) for row in rows}
+
+    def _write_large_fields(
+        self,
+        tx: Transaction,
+        model_cls: type[Model],
+        values: Sequence[tuple[int, str, SQLiteType]],
+        rows: Iterable[tuple[str, int]] | None,
+    ):
+        """Write the `(id, key, value)` values of separated large fields.
+        Empty values are not stored.
+        """
+        table = model_cls._large_table
+        if deletes := [(id_, key) for id_, key, value in values if not value]:
+            tx.mutate_many(
+                f"DELETE FROM {table} WHERE entity_id=? AND key=?",
+                deletes,
+                rows,
+            )
+        if inserts := [
+            (id_, key, self._large_value(value))
+            for id_, key, value in values
+            if value
+        ]:
+            tx.mutate_many(
+                f"INSERT OR REPLACE INTO {table} (entity_id, key, value) "
+                "VALUES (?, ?, ?)",
+                inserts,
+                rows,
+            )
+
     # Querying.
 
     def _fetch(
@@ -1392,62 +2973,408 @@ class Database:
         model_cls: type[AnyModel],
         query: Query | None = None,
         sort: Sort | None = None,
+        stream: bool = False,
+        fields: Iterable[str] | None = None,
     ) -> Results[AnyModel]:
         """Fetch the objects of type `model_cls` matching the given
         query. The query may be given as a string, string sequence, a
         Query object, or None (to fetch everything). `sort` is an
         `Sort` object.
+
+        The rows are fetched when the results are first used. If `stream`
+        is true, return `StreamedResults` that fetch the rows in batches
+        as they are iterated instead of all at once.
+
+        If `fields` is given, only these fields (and those needed to
+        evaluate the query) are fetched. The other fields of an object
+        are loaded from the database when one of them is first accessed.
+        Until then, the object's formatted mapping only includes the
+        fetched flexible attributes.
         """
         query = query or TrueQuery()  # A null query.
         sort = sort or NullSort()  # Unsorted.
-        where, subvals = query.clause()
+        # Let SQLite narrow down the rows as far as it can, so that only
+        # the remaining predicates are checked in Python.
+        query, slow_query = query.split()
+        sql, subvals = self._select(model_cls, query)
         order_by = sort.order_clause()
+        table = model_cls._table
+
+        if self._query_shapes is not None:
+            columns = query_shape(model_cls, query)
+            # Lookups by id already use the primary key.
+            if columns and "id" not in columns:
+                self._query_shapes[table, columns] += 1
+
+        projection = None
+        if fields is not None:
+            projection = frozenset(
+                {"id", *fields, *(slow_query.field_names if slow_query else ())}
+            )
+
+            # Select the columns in an outer query so that the query and
+            # sort can refer to any column.
+            columns = ", ".join(
+                f"{table}.{key}"
+                for key in self._table_columns(model_cls)
+                if key in projection
+            )
+            sql = f"SELECT {columns} FROM ({sql}) AS {table}"
+        else:
+            # the sort field may exist in both 'items' and 'albums' tables
+            # (when they are joined), causing ambiguous column OperationalError
+            # if we try to order directly.
+            # Since the join is required only for filtering, we can filter in
+            # a subquery and order the result, which returns unique fields.
+            # The subquery keeps the table name so that flexible attribute
+            # sorts can look up their values by entity id.
+            sql = f"SELECT * FROM ({sql}) AS {table}"
+
+        self._log_slow(model_cls, slow_query, sort)
+
+        if stream:
+            return StreamedResults(
+                model_cls,
+                self,
+                sql,
+                subvals,
+                slow_query,  # Slow query component.
+                sort if sort.is_slow() else None,  # Slow sort component.
+                projection,
+                order_by,
+                sort.order_keys(),
+            )
+
+        # The rows and their flexible attributes are fetched when first
+        # needed, so that a slice only fetches its own rows.
+        return Results(
+            model_cls,
+            None,
+            self,
+            None,
+            slow_query,  # Slow query component.
+            sort if sort.is_slow() else None,  # Slow sort component.
+            projection,
+            sql,
+            subvals,
+            order_by,
+        )
+
+    def _select(
+        self, model_cls: type[Model], query: Query
+    ) -> tuple[str, Sequence[SQLiteType]]:
+        """Build the statement selecting the rows of `model_cls` that match
+        the fast `query`, and its substitution values.
+        """
+        where, subvals = query.clause()
 
         table = model_cls._table
         _from = table
+        columns = f"{table}.*"
+        if separate := self._separate_fields(model_cls):
+            # Leave the large fields out, except for those the query needs,
+            # which are looked up in the separate table.
+            columns = ", ".join(
+                f"{table}.{f}" for f in self._table_columns(model_cls)
+            )
+            if queried := [f for f in separate if f in query.field_names]:
+                lookups = ", ".join(
+                    f"(SELECT inflate(value) FROM {model_cls._large_table} "
+                    f"WHERE entity_id = {table}.id AND key = '{f}') AS {f}"
+                    for f in queried
+                )
+                _from = f"(SELECT {columns}, {lookups} FROM {table}) AS {table}"
+                columns += "".join(f", {table}.{f}" for f in queried)
         if query.field_names & model_cls.other_db_fields:
             _from += f" {model_cls.relation_join}"
 
         # group by id to avoid duplicates when joining with the relation
         sql = (
-            f"SELECT {table}.* "
+            f"SELECT {columns} "
             f"FROM ({_from}) "
             f"WHERE {where or 1} "
             f"GROUP BY {table}.id"
         )
-        # Fetch flexible attributes for items matching the main query.
-        # Doing the per-item filtering in python is faster than issuing
-        # one query per item to sqlite.
-        flex_sql = (
-            "SELECT * "
-            f"FROM {model_cls._flex_table} "
-            f"WHERE entity_id IN (SELECT id FROM ({sql}))"
-        )
+        return sql, subvals
 
-        if order_by:
-            # the sort field may exist in both 'items' and 'albums' tables
-            # (when they are joined), causing ambiguous column OperationalError
-            # if we try to order directly.
-            # Since the join is required only for filtering, we can filter in
-            # a subquery and order the result, which returns unique fields.
-            sql = f"SELECT * FROM ({sql}) ORDER BY {order_by}"
+    def _log_slow(
+        self,
+        model_cls: type[Model],
+        slow_query: Query | None,
+        sort: Sort | None,
+    ):
+        """Log the parts of a fetch that are evaluated in Python."""
+        slow_parts = {
+            "query": slow_query,
+            "sort": sort if sort and sort.is_slow() else None,
+        }
+        for kind, part in slow_parts.items():
+            if part is None:
+                continue
+            description = f"{model_cls._table} {kind}: {part!r}"
+            log.debug("evaluating {} in Python", description)
+            if self.profiler:
+                self.profiler.record_slow(description)
+
+    def aggregate(
+        self,
+        model_cls: type[Model],
+        query: Query | None,
+        aggregates: Mapping[str, Aggregate],
+    ) -> dict[str, Any]:
+        """Compute `aggregates` over the objects of type `model_cls`
+        matching `query` and return their values by name.
+
+        If the query is fast and all aggregates can be expressed in SQL,
+        they are computed by the database in a single statement. Otherwise,
+        the matching objects are streamed and the aggregates accumulated in
+        Python.
+
+        If the database has a column store, the aggregates are computed
+        from its columns whenever the query and the aggregates only use
+        stored fields.
+        """
+        if self._column_store:
+            stats = self._column_store.aggregate(
+                model_cls, query or TrueQuery(), aggregates
+            )
+            if stats is not None:
+                return stats
+
+        query, slow_query = (query or TrueQuery()).split()
+        sql, subvals = self._select(model_cls, query)
+        return self._aggregate(model_cls, sql, subvals, slow_query, aggregates)
 
+    def _aggregate(
+        self,
+        model_cls: type[Model],
+        sql: str,
+        subvals: Sequence[SQLiteType],
+        slow_query: Query | None,
+        aggregates: Mapping[str, Aggregate],
+    ) -> dict[str, Any]:
+        """Compute `aggregates` over the rows selected by `sql` that match
+        the `slow_query`, if any.
+        """
+        clauses = {n: a.clause(model_cls) for n, a in aggregates.items()}
+        if not slow_query and None not in clauses.values():
+            columns = ", ".join(f'{c} AS "{n}"' for n, c in clauses.items())
+            with self.transaction(read_only=True) as tx:
+                row = tx.query(f"SELECT {columns} FROM ({sql})", subvals)[0]
+            return dict(row)
+
+        self._log_slow(model_cls, slow_query, None)
+        accs = {n: a.initial() for n, a in aggregates.items()}
+        sql = f"SELECT * FROM ({sql}) AS {model_cls._table}"
+        for obj in StreamedResults(model_cls, self, sql, subvals, slow_query):
+            for name, agg in aggregates.items():
+                accs[name] = agg.step(accs[name], obj)
+        return {n: a.final(accs[n]) for n, a in aggregates.items()}
+
+    # Writing.
+
+    def add_many(self, models: Iterable[Model]) -> list[int]:
+        """Add new objects to the database in a single transaction and
+        return their ids. This is equivalent to calling :meth:`Model.add`
+        on each object, but the rows of all objects are inserted with one
+        `executemany` call per table.
+        """
+        return self._write(self._add_many, list(models))
+
+    def _add_many(self, models: list[Model]) -> list[int]:
+        """Insert the rows of the new `models`."""
+        rows: defaultdict[tuple[str, tuple[str, ...]], list[Any]]
+        rows = defaultdict(list)
+        flex_rows: defaultdict[str, list[Any]] = defaultdict(list)
+        large_rows: defaultdict[type[Model], list[Any]] = defaultdict(list)
+        next_ids: dict[str, int] = {}
+        changes = []
         with self.transaction() as tx:
-            rows = tx.query(sql, subvals)
-            flex_rows = tx.query(flex_sql, subvals)
+            # Hold the write lock while the ids are picked, so no other
+            # connection can insert rows with the same ids meanwhile.
+            tx.reserve()
+            for model in models:
+                table = model._table
+                if table not in next_ids:
+                    # The rowid SQLite would pick for the next insertion.
+                    next_ids[table] = tx.query(
+                        f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}"
+                    )[0][0]
+                model._db = self
+                model.id = next_ids[table]
+                next_ids[table] += 1
+                model.added = time.time()
+                changes.append((table, model.id, ADD, None))
+
+                # Mark every non-null field as dirty and collect the values.
+                for key in model:
+                    if model[key] is not None:
+                        model._dirty.add(key)
+                fixed, flex, _ = model._take_changes()
+                model_cls = type(model)
+                columns = tuple(
+                    k for k in self._table_columns(model_cls) if k != "id"
+                )
+                rows[table, columns].append(
+                    (model.id, *(fixed.get(k) for k in columns))
+                )
+                flex_rows[model._flex_table].extend(
+                    (model.id, key, value) for key, value in flex.items()
+                )
+                large_rows[model_cls].extend(
+                    (model.id, key, fixed[key])
+                    for key in self._separate_fields(model_cls)
+                    if fixed.get(key)
+                )
 
-        return Results(
-            model_cls,
-            rows,
-            self,
-            flex_rows,
-            None if where else query,  # Slow query component.
-            sort if sort.is_slow() else None,  # Slow sort component.
-        )
+            for (table, columns), subvals in rows.items():
+                tx.mutate_many(
+                    f"INSERT INTO {table} (id, {', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                    subvals,
+                    rows=(),
+                )
+            for flex_table, subvals in flex_rows.items():
+                if subvals:
+                    tx.mutate_many(
+                        f"INSERT INTO {flex_table} (entity_id, key, value) "
+                        "VALUES (?, ?, ?);",
+                        subvals,
+                        rows=(),
+                    )
+            for model_cls, subvals in large_rows.items():
+                self._write_large_fields(tx, model_cls, subvals, rows=())
+            self._journal(tx, changes)
+
+        self._mark_current(models)
+        return [model.id for model in models]
+
+    def store_many(
+        self, models: Iterable[Model], fields: Iterable[str] | None = None
+    ):
+        """Save the metadata of many objects into the database in a single
+        transaction. This is equivalent to calling :meth:`Model.store` on
+        each object, but changes to the same columns are batched into one
+        `executemany` call.
+        """
+        self._write(self._store_many, models, fields)
+
+    def _store_many(
+        self, models: Iterable[Model], fields: Iterable[str] | None = None
+    ):
+        """Write the pending changes of `models` with batched statements."""
+        models = list(models)
+        if fields is not None:
+            fields = list(fields)
+
+        updates: defaultdict[tuple[str, tuple[str, ...]], list[Any]]
+        updates = defaultdict(list)
+        flex_updates: defaultdict[str, list[Any]] = defaultdict(list)
+        flex_deletes: defaultdict[str, list[Any]] = defaultdict(list)
+        large_updates: defaultdict[type[Model], list[Any]] = defaultdict(list)
+        rows = []
+        changes = []
+        for model in models:
+            model._check_db()
+            rows.append((model._table, model.id))
+            fixed, flex, deleted = model._take_changes(fields)
+            if changed := (*fixed, *flex, *deleted):
+                changes.append((model._table, model.id, UPDATE, changed))
+            for key in self._separate_fields(type(model)):
+                if key in fixed:
+                    large_updates[type(model)].append(
+                        (model.id, key, fixed.pop(key))
+                    )
+            if fixed:
+                updates[model._table, tuple(fixed)].append(
+                    (*fixed.values(), model.id)
+                )
+            flex_updates[model._flex_table].extend(
+                (model.id, key, value) for key, value in flex.items()
+            )
+            flex_deletes[model._flex_table].extend(
+                (model.id, key) for key in deleted
+            )
+
+        with self.transaction() as tx:
+            # Main table updates, grouped by the set of modified columns.
+            for (table, columns), subvals in updates.items():
+                assignments = ",".join(f"{key}=?" for key in columns)
+                tx.mutate_many(
+                    f"UPDATE {table} SET {assignments} WHERE id=?",
+                    subvals,
+                    rows,
+                )
+
+            # Modified/added flexible attributes.
+            for flex_table, subvals in flex_updates.items():
+                if subvals:
+                    tx.mutate_many(
+                        f"INSERT INTO {flex_table} (entity_id, key, value) "
+                        "VALUES (?, ?, ?);",
+                        subvals,
+                        rows,
+                    )
+
+            # Deleted flexible attributes.
+            for flex_table, subvals in flex_deletes.items():
+                if subvals:
+                    tx.mutate_many(
+                        f"DELETE FROM {flex_table} WHERE entity_id=? AND key=?",
+                        subvals,
+                        rows,
+                    )
+
+            # Separated large fields.
+            for model_cls, subvals in large_updates.items():
+                self._write_large_fields(tx, model_cls, subvals, rows)
+
+            self._journal(tx, changes)
+
+        self._mark_current(models)
+
+    def _mark_current(self, models: Iterable[Model]):
+        """Mark the written `models` as loaded at the current revision.
+
+        They were marked clean before their transaction was committed,
+        which bumps the revision, so that `Model.load` would otherwise
+        fetch them again.
+        """
+        for model in models:
+            model._revision = self.revision
 
     def _get(self, model_cls: type[AnyModel], id_: int) -> AnyModel | None:
-        """Get a Model object by its id or None if the id does not exist."""
-        return self._fetch(model_cls, MatchQuery("id", id_)).get()
+        """Get a Model object by its id or None if the id does not exist.
+
+        If the identity map is enabled, repeated lookups of a row that has
+        not changed return the same object.
+        """
+        if not self._identity_map:
+            return self._fetch(model_cls, MatchQuery("id", id_)).get()
+
+        table = model_cls._table
+        obj = self._identity_map.get(table, id_, self.revision)
+        if obj is not None and not obj._dirty:
+            obj._revision = self.revision
+            return obj  # type: ignore[return-value]
+
+        # The object is only cached if the revision has not changed by
+        # then. Otherwise, or if a write changes its row later, it is
+        # dropped once the write is committed.
+        revision = self.revision
+        with self.transaction(read_only=True):
+            obj = self._fetch(model_cls, MatchQuery("id", id_)).get()
+        if obj is not None:
+            self._identity_map.add(obj, revision)
+        return obj
+
+    def _is_cached(self, obj: Model) -> bool:
+        """Whether `obj` is the current shared object for its row."""
+        return bool(
+            self._identity_map
+            and self._identity_map.revision == self.revision
+            and obj in self._identity_map
+        )
 
 
 class Index(NamedTuple):
@@ -0,0 +1,86 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Index suggestions based on the shapes of the queries run against a
+database, see :meth:`beets.dbcore.Database.suggest_indices`.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, NamedTuple
+
+from .query import (
+    AndQuery,
+    DateQuery,
+    InQuery,
+    MatchQuery,
+    NumericQuery,
+    PathQuery,
+)
+
+if TYPE_CHECKING:
+    from .db import Index, Model
+    from .query import Query
+
+INDEXABLE_QUERIES = (MatchQuery, InQuery, NumericQuery, DateQuery, PathQuery)
+"""The field queries whose SQL clause SQLite can look up in an index."""
+
+
+class IndexSuggestion(NamedTuple):
+    """An index that would speed up queries on `table`, together with the
+    number of times such queries were run.
+    """
+
+    table: str
+    index: Index
+    count: int
+
+
+def query_shape(model_cls: type[Model], query: Query) -> tuple[str, ...]:
+    """Get the expressions that an index on the table of `model_cls`
+    should cover to speed up the fast `query`.
+
+    Only the conjuncts of the query that compare a table column in an
+    indexable way are considered. Equality comparisons come first, so that
+    a range comparison can use the last column of the index.
+    """
+    subqueries = query.subqueries if isinstance(query, AndQuery) else [query]
+    equal: list[str] = []
+    ranges: list[str] = []
+    for subq in subqueries:
+        if not (
+            isinstance(subq, INDEXABLE_QUERIES)
+            and subq.fast
+            and subq.table in ("", model_cls._table)
+            and subq.field_name in model_cls._fields
+        ):
+            continue
+
+        column = subq.field_name
+        if isinstance(subq, PathQuery) and not subq.case_sensitive:
+            column = f"bytelower({column})"
+
+        if isinstance(subq, (MatchQuery, InQuery)) or (
+            isinstance(subq, NumericQuery) and subq.point is not None
+        ):
+            equal.append(column)
+        else:
+            ranges.append(column)
+
+    return tuple(dict.fromkeys([*equal, *ranges]))
+
+
+def index_name(table: str, columns: tuple[str, ...]) -> str:
+    """Get the name of the suggested index on `columns` of `table`."""
+    parts = (re.sub(r"\W+", "_", c).strip("_") for c in columns)
+    return f"{table}_by_{'_'.join(parts)}"
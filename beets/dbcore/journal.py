@@ -0,0 +1,97 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""The persistent journal of the objects written to a database, see
+:meth:`beets.dbcore.Database.changes`.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import sqlite3
+    from collections.abc import Iterable
+
+CHANGES_TABLE = "changes"
+
+ADD = "add"
+UPDATE = "update"
+REMOVE = "remove"
+
+
+class Change(NamedTuple):
+    """A write of an object to the database."""
+
+    revision: int
+    """The position of the change in the journal. Revisions only grow."""
+    table: str
+    id: int
+    op: str
+    """One of ``add``, ``update`` or ``remove``."""
+    fields: tuple[str, ...] | None
+    """The fields that were updated, or None if all fields may have
+    changed.
+    """
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> Change:
+        revision, table, id_, op, fields = row
+        return cls(
+            revision,
+            table,
+            id_,
+            op,
+            None if fields is None else tuple(json.loads(fields)),
+        )
+
+    def to_row(self) -> tuple[int, str, int, str, str | None]:
+        return (
+            self.revision,
+            self.table,
+            self.id,
+            self.op,
+            None if self.fields is None else json.dumps(self.fields),
+        )
+
+
+def merge(old: Change, new: Change) -> Change:
+    """Combine two successive changes of the same object into one change
+    with the revision of the later one.
+    """
+    if new.op != UPDATE or old.op == REMOVE:
+        return new
+
+    if old.fields is None or new.fields is None:
+        fields = None
+    else:
+        fields = tuple(sorted({*old.fields, *new.fields}))
+    return new._replace(op=old.op, fields=fields)
+
+
+def compact(changes: Iterable[Change]) -> list[Change]:
+    """Merge the `changes`, in revision order, into one change per
+    object.
+
+    A consumer that has seen any revision up to the last one of an object
+    still learns about everything that happened to the object since: the
+    merged change has the latest revision and covers the fields of all
+    merged changes.
+    """
+    merged: dict[tuple[str, int], Change] = {}
+    for change in changes:
+        key = change.table, change.id
+        if old := merged.get(key):
+            change = merge(old, change)
+        merged[key] = change
+    return sorted(merged.values())
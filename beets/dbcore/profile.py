@@ -0,0 +1,88 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Instrumentation of the SQL statements run by a database, see
+:attr:`beets.dbcore.Database.profiler`.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+
+@dataclass
+class StatementStats:
+    """The accumulated cost of all executions of an SQL statement."""
+
+    statement: str
+    calls: int = 0
+    binds: int = 0
+    """The number of bound values over all executions."""
+    time: float = 0.0
+    """The wall time spent executing the statement, in seconds."""
+    rows: int | None = 0
+    """The number of rows returned or changed, or None if unknown, e.g.
+    for rows read from a live cursor.
+    """
+
+    @property
+    def mean_time(self) -> float:
+        return self.time / self.calls
+
+
+class SQLProfiler:
+    """Records the SQL statements executed by a database.
+
+    If `explain` is true, the query plan of each SELECT statement is
+    captured the first time it is executed.
+    """
+
+    def __init__(self, explain: bool = False):
+        self.explain = explain
+        self.stats: dict[str, StatementStats] = {}
+        self.plans: dict[str, list[str]] = {}
+        self.slow_queries: Counter[str] = Counter()
+        """The query and sort parts that were evaluated in Python, with the
+        number of times they were.
+        """
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, binds: int, time: float, rows: int | None):
+        """Add an execution of `statement` to its stats."""
+        with self._lock:
+            stats = self.stats.get(statement)
+            if stats is None:
+                stats = self.stats[statement] = StatementStats(statement)
+            stats.calls += 1
+            stats.binds += binds
+            stats.time += time
+            if stats.rows is not None:
+                stats.rows = None if rows is None else stats.rows + rows
+
+    def needs_plan(self, statement: str) -> bool:
+        """Whether the query plan of `statement` should be captured."""
+        return (
+            self.explain
+            and statement not in self.plans
+            and statement.lstrip()[:6].upper() == "SELECT"
+        )
+
+    def record_slow(self, description: str):
+        """Note that a query or sort was evaluated in Python."""
+        with self._lock:
+            self.slow_queries[description] += 1
+
+    def summary(self) -> list[StatementStats]:
+        """Get the stats of all statements, slowest in total first."""
+        return sorted(self.stats.values(), key=lambda s: s.time, reverse=True)
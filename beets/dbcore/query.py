@@ -21,11 +21,12 @@ import re
 import unicodedata
 from abc import ABC, abstractmethod
 from collections.abc import Sequence
+from copy import copy
 from datetime import datetime, timedelta
-from functools import cached_property, reduce
+from functools import cached_property, partial, reduce
 from operator import mul, or_
 from re import Pattern
-from typing import TYPE_CHECKING, Any, ClassVar, Generic, TypeVar
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, NamedTuple, TypeVar
 
 from beets import context, util
 from beets.util.units import raw_seconds_short
@@ -33,7 +34,8 @@ from beets.util.units import raw_seconds_short
 from . import pathutils
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator, MutableSequence
+    import sqlite3
+    from collections.abc import Callable, Iterator, MutableSequence
 
     from beets.dbcore.db import Model
 
@@ -108,6 +110,35 @@ class Query(ABC):
         perform queries on arbitrary sets of Model.
         """
 
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        """Compile the query into a predicate equivalent to `match` for
+        objects of `model_cls`.
+
+        Subclasses can return a specialised function that does the work
+        shared by all objects, such as preparing the pattern, only once.
+        """
+        return self.match
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        """Compile the query into a predicate on the database rows of
+        `model_cls`, which can filter rows before objects are built from
+        them. Return None if the query can only be matched on objects.
+        """
+        return None
+
+    def split(self) -> tuple[Query, Query | None]:
+        """Split the query into a part that SQLite can evaluate and a
+        remainder that must be checked in Python using `match()`.
+
+        Return a ``(fast, slow)`` pair whose conjunction is equivalent to
+        this query. `slow` is None if the whole query can run in SQL.
+        """
+        if self.clause()[0]:
+            return self, None
+        return TrueQuery(), self
+
     def __and__(self, other: Query) -> AndQuery:
         return AndQuery([self, other])
 
@@ -131,12 +162,46 @@ AnySQLiteType = TypeVar("AnySQLiteType", bound=SQLiteType)
 FieldQueryType = type["FieldQuery"]
 
 
+class FlexAttribute(NamedTuple):
+    """The location of a flexible attribute's values in the database,
+    used to evaluate a `FieldQuery` on the attribute in SQL.
+    """
+
+    table: str
+    """The flexible attribute table, e.g. ``item_attributes``."""
+
+    entity_id: str
+    """The column of the queried table holding the id of the entity the
+    attributes belong to, e.g. ``items.id``.
+    """
+
+    sql_type: str
+    """The column type the stored values are cast to before matching."""
+
+    @property
+    def value(self) -> str:
+        """An SQL expression for the attribute's value."""
+        value = f"{self.table}.value"
+        if self.sql_type == "TEXT":
+            return value
+        return f"CAST({value} AS {self.sql_type})"
+
+
 class FieldQuery(Query, Generic[P]):
     """An abstract query that searches in a specific field for a
     pattern. Subclasses must provide a `value_match` class method, which
     determines whether a certain pattern string matches a certain value
     string. Subclasses may also provide `col_clause` to implement the
     same matching functionality in SQLite.
+
+    A query on a flexible attribute cannot use `col_clause` directly. If
+    `flex_attributes` is set, the clause is evaluated against the stored
+    attribute values instead.
+    """
+
+    flex_attributes: Sequence[FlexAttribute] = ()
+    """Where to look up a flexible attribute, in order of precedence. The
+    first table that contains the attribute provides its value.
     """
 
     @property
@@ -161,17 +226,98 @@ class FieldQuery(Query, Generic[P]):
     def clause(self) -> tuple[str | None, Sequence[SQLiteType]]:
         if self.fast:
             return self.col_clause()
-        # Matching a flexattr. This is a slow query.
+        if self.flex_attributes:
+            return self.flex_clause()
+        # Matching a computed field. This is a slow query.
         return None, ()
 
+    def flex_clause(self) -> tuple[str, Sequence[SQLiteType]]:
+        """Generate an SQL clause that matches the values of a flexible
+        attribute stored in the tables given by `flex_attributes`.
+        """
+        clauses: list[str] = []
+        subvals: list[SQLiteType] = []
+        # Conditions (and their subvals) stating that the attribute is
+        # missing from all the tables with higher precedence.
+        missing: list[str] = []
+        missing_subvals: list[SQLiteType] = []
+        for attr in self.flex_attributes:
+            lookup = (
+                f"SELECT 1 FROM {attr.table} "
+                f"WHERE {attr.table}.entity_id = {attr.entity_id} "
+                f"AND {attr.table}.key = ?"
+            )
+            value_query = copy(self)
+            value_query.table, value_query.field_name = "", attr.value
+            value_clause, value_subvals = value_query.col_clause()
+
+            clauses.append(
+                " AND ".join(
+                    [*missing, f"EXISTS ({lookup} AND ({value_clause}))"]
+                )
+            )
+            subvals += [*missing_subvals, self.field_name, *value_subvals]
+            missing.append(f"NOT EXISTS ({lookup})")
+            missing_subvals.append(self.field_name)
+
+        if self.match_missing():
+            clauses.append(" AND ".join(missing))
+            subvals += missing_subvals
+
+        return " OR ".join(f"({c})" for c in clauses), subvals
+
     @classmethod
     def value_match(cls, pattern: P, value: Any):
         """Determine whether the value matches the pattern."""
         raise NotImplementedError
 
+    def value_test(self) -> Callable[[Any], bool]:
+        """Get a function that determines whether a field value matches
+        the query, used by `compile`. Subclasses that override `match`
+        should override this method as well.
+        """
+        return partial(self.value_match, self.pattern)
+
     def match(self, obj: Model) -> bool:
         return self.value_match(self.pattern, obj.get(self.field_name))
 
+    @property
+    def _matches_values(self) -> bool:
+        """Whether the query matches objects by testing the value of the
+        field with `value_test`, i.e. no subclass overrides `match`
+        without overriding `value_test` too.
+        """
+        mro = type(self).__mro__
+        match_cls = next(c for c in mro if "match" in vars(c))
+        test_cls = next(c for c in mro if "value_test" in vars(c))
+        return issubclass(test_cls, match_cls)
+
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        if not self._matches_values:
+            return self.match
+        field, test = self.field_name, self.value_test()
+        return lambda obj: test(obj.get(field))
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        field = self.field_name
+        if (
+            not self._matches_values
+            or field not in model_cls._fields
+            or field in model_cls._getters()
+        ):
+            # Only the values of table columns can be read from the row.
+            return None
+        convert, test = model_cls._type(field).from_sql, self.value_test()
+        return lambda row: test(convert(row[field]))
+
+    def match_missing(self) -> bool:
+        """Determine whether the query matches an object that does not
+        have the field at all.
+        """
+        return self.value_match(self.pattern, None)
+
     def __repr__(self) -> str:
         return (
             f"{self.__class__.__name__}({self.field_name!r}, {self.pattern!r}, "
@@ -214,6 +360,12 @@ class NoneQuery(FieldQuery[None]):
     def match(self, obj: Model) -> bool:
         return obj.get(self.field_name) is None
 
+    def value_test(self) -> Callable[[Any], bool]:
+        return lambda value: value is None
+
+    def match_missing(self) -> bool:
+        return True
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.field_name!r}, {self.fast})"
 
@@ -242,6 +394,23 @@ class StringFieldQuery(FieldQuery[P]):
         """
         raise NotImplementedError
 
+    def string_test(self) -> Callable[[str], bool]:
+        """Get a function that determines whether a string matches the
+        pattern, like `string_match`. Subclasses can override this method
+        to prepare the pattern only once.
+        """
+        return partial(self.string_match, self.pattern)
+
+    def value_test(self) -> Callable[[Any], bool]:
+        string_test, as_string = self.string_test(), util.as_string
+
+        def test(value: Any) -> bool:
+            if isinstance(value, list):
+                return any(string_test(as_string(item)) for item in value)
+            return string_test(as_string(value))
+
+        return test
+
 
 class StringQuery(StringFieldQuery[str]):
     """A query that matches a whole string in a specific Model field."""
@@ -260,6 +429,10 @@ class StringQuery(StringFieldQuery[str]):
     def string_match(cls, pattern: str, value: str) -> bool:
         return pattern.lower() == value.lower()
 
+    def string_test(self) -> Callable[[str], bool]:
+        pattern = self.pattern.lower()
+        return lambda value: pattern == value.lower()
+
 
 class SubstringQuery(StringFieldQuery[str]):
     """A query that matches a substring in a specific Model field."""
@@ -279,6 +452,10 @@ class SubstringQuery(StringFieldQuery[str]):
     def string_match(cls, pattern: str, value: str) -> bool:
         return pattern.lower() in value.lower()
 
+    def string_test(self) -> Callable[[str], bool]:
+        pattern = self.pattern.lower()
+        return lambda value: pattern in value.lower()
+
 
 class PathQuery(FieldQuery[bytes]):
     """A query that matches all items under a given path.
@@ -348,10 +525,20 @@ class PathQuery(FieldQuery[bytes]):
         starts with the given directory path. Case sensitivity depends on the object's
         filesystem as determined during initialization.
         """
-        path = pathutils.normalize_path_for_db(obj.path)
-        if not self.case_sensitive:
-            path = path.lower()
-        return (path == self.pattern) or path.startswith(self.dir_path)
+        return self.value_test()(obj.path)
+
+    def value_test(self) -> Callable[[Any], bool]:
+        pattern, dir_path = self.pattern, self.dir_path
+        normalize = pathutils.normalize_path_for_db
+        case_sensitive = self.case_sensitive
+
+        def test(path: bytes) -> bool:
+            path = normalize(path)
+            if not case_sensitive:
+                path = path.lower()
+            return path == pattern or path.startswith(dir_path)
+
+        return test
 
     def col_clause(self) -> tuple[str, Sequence[SQLiteType]]:
         """Generate an SQL clause that implements path matching in the database.
@@ -359,16 +546,21 @@ class PathQuery(FieldQuery[bytes]):
         Returns a tuple of SQL clause string and parameter values list that matches
         paths either exactly or by directory prefix. Handles case sensitivity
         appropriately using BYTELOWER for case-insensitive matches.
-        """
-        if self.case_sensitive:
-            left, right = self.field, "?"
-        else:
-            left, right = f"BYTELOWER({self.field})", "BYTELOWER(?)"
 
-        return f"({left} = {right}) || (substr({left}, 1, ?) = {right})", [
+        The directory prefix is matched as a range of byte strings, so that
+        SQLite can look paths up in an index on the (lowercased) path.
+        """
+        left = self.field if self.case_sensitive else f"BYTELOWER({self.field})"
+
+        # All paths below the directory sort between the directory path,
+        # which ends with a separator, and that path with its last byte
+        # incremented.
+        dir_path = self.dir_path
+        dir_end = dir_path[:-1] + bytes([dir_path[-1] + 1])
+        return f"{left} = ? OR ({left} >= ? AND {left} < ?)", [
             BLOB_TYPE(self.pattern),
-            len(dir_blob := BLOB_TYPE(self.dir_path)),
-            dir_blob,
+            BLOB_TYPE(dir_path),
+            BLOB_TYPE(dir_end),
         ]
 
     def __repr__(self) -> str:
@@ -411,6 +603,10 @@ class RegexpQuery(StringFieldQuery[Pattern[str]]):
     def string_match(cls, pattern: Pattern[str], value: str) -> bool:
         return pattern.search(cls._normalize(value)) is not None
 
+    def string_test(self) -> Callable[[str], bool]:
+        search, normalize = self.pattern.search, self._normalize
+        return lambda value: search(normalize(value)) is not None
+
 
 class BooleanQuery(MatchQuery[int]):
     """Matches a boolean field. Pattern should either be a boolean or a
@@ -468,19 +664,31 @@ class NumericQuery(FieldQuery[str]):
             self.rangemax = self._convert(parts[1])
 
     def match(self, obj: Model) -> bool:
-        if self.field_name not in obj:
-            return False
-        value = obj[self.field_name]
-        if isinstance(value, str):
-            value = self._convert(value)
-
-        if self.point is not None:
-            return value == self.point
-        if self.rangemin is not None and value < self.rangemin:
-            return False
-        if self.rangemax is not None and value > self.rangemax:
-            return False
-        return True
+        return self.value_test()(obj.get(self.field_name))
+
+    def value_test(self) -> Callable[[Any], bool]:
+        point, rangemin, rangemax = self.point, self.rangemin, self.rangemax
+        convert = self._convert
+
+        def test(value: Any) -> bool:
+            if value is None:
+                # The field is missing.
+                return False
+            if isinstance(value, str):
+                value = convert(value)
+
+            if point is not None:
+                return value == point
+            if rangemin is not None and value < rangemin:
+                return False
+            if rangemax is not None and value > rangemax:
+                return False
+            return True
+
+        return test
+
+    def match_missing(self) -> bool:
+        return False
 
     def col_clause(self) -> tuple[str, Sequence[SQLiteType]]:
         if self.point is not None:
@@ -600,6 +808,35 @@ class AndQuery(MutableCollectionQuery):
     def match(self, obj: Model) -> bool:
         return all(q.match(obj) for q in self.subqueries)
 
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        return _all([q.compile(model_cls) for q in self.subqueries])
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        predicates = [q.compile_row(model_cls) for q in self.subqueries]
+        if None in predicates:
+            return None
+        return _all(predicates)
+
+    def split(self) -> tuple[Query, Query | None]:
+        """Push every conjunct that SQLite can evaluate to the fast part,
+        leaving only the remaining predicates to be checked in Python.
+        """
+        fast: list[Query] = []
+        slow: list[Query] = []
+        for subq in self.subqueries:
+            subq_fast, subq_slow = subq.split()
+            if not isinstance(subq_fast, TrueQuery):
+                fast.append(subq_fast)
+            if subq_slow is not None:
+                slow.append(subq_slow)
+
+        if not slow:
+            return self, None
+        fast_query = AndQuery(fast) if fast else TrueQuery()
+        return fast_query, slow[0] if len(slow) == 1 else AndQuery(slow)
+
 
 class OrQuery(MutableCollectionQuery):
     """A conjunction of a list of other queries."""
@@ -610,6 +847,45 @@ class OrQuery(MutableCollectionQuery):
     def match(self, obj: Model) -> bool:
         return any(q.match(obj) for q in self.subqueries)
 
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        return _any([q.compile(model_cls) for q in self.subqueries])
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        predicates = [q.compile_row(model_cls) for q in self.subqueries]
+        if None in predicates:
+            return None
+        return _any(predicates)
+
+
+def _all(predicates: list[Callable[[Any], bool]]) -> Callable[[Any], bool]:
+    """Combine predicates into one that holds if all of them do."""
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def predicate(value: Any) -> bool:
+        for p in predicates:
+            if not p(value):
+                return False
+        return True
+
+    return predicate
+
+
+def _any(predicates: list[Callable[[Any], bool]]) -> Callable[[Any], bool]:
+    """Combine predicates into one that holds if any of them does."""
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def predicate(value: Any) -> bool:
+        for p in predicates:
+            if p(value):
+                return True
+        return False
+
+    return predicate
+
 
 class NotQuery(Query):
     """A query that matches the negation of its `subquery`, as a shortcut for
@@ -635,6 +911,18 @@ class NotQuery(Query):
     def match(self, obj: Model) -> bool:
         return not self.subquery.match(obj)
 
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        predicate = self.subquery.compile(model_cls)
+        return lambda obj: not predicate(obj)
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        predicate = self.subquery.compile_row(model_cls)
+        if predicate is None:
+            return None
+        return lambda row: not predicate(row)
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.subquery!r})"
 
@@ -645,6 +933,66 @@ class NotQuery(Query):
         return hash(("not", hash(self.subquery)))
 
 
+class FullTextQuery(Query):
+    """A query that matches a substring in any of the search fields of a
+    model using their full-text index, see
+    :meth:`beets.dbcore.Database._make_fts_table`.
+
+    `subquery` is the equivalent query on the individual fields, which is
+    used to match objects in Python.
+    """
+
+    MIN_LENGTH = 3
+    """The shortest pattern the trigram index can look up."""
+
+    @property
+    def field_names(self) -> set[str]:
+        """Return a set with field names that this query operates on."""
+        return self.subquery.field_names
+
+    def __init__(self, table: str, fts_table: str, pattern: str, subquery):
+        self.table = table
+        self.fts_table = fts_table
+        self.pattern = pattern
+        self.subquery = subquery
+
+    def clause(self) -> tuple[str, Sequence[SQLiteType]]:
+        # Look the pattern up as a single phrase.
+        phrase = '"{}"'.format(self.pattern.replace('"', '""'))
+        clause = (
+            f"{self.table}.id IN (SELECT rowid FROM {self.fts_table} "
+            f"WHERE {self.fts_table} MATCH ?)"
+        )
+        return clause, [phrase]
+
+    def match(self, obj: Model) -> bool:
+        return self.subquery.match(obj)
+
+    def compile(self, model_cls: type[Model]) -> Callable[[Model], bool]:
+        return self.subquery.compile(model_cls)
+
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        return self.subquery.compile_row(model_cls)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({self.table!r}, {self.fts_table!r}, "
+            f"{self.pattern!r}, {self.subquery!r})"
+        )
+
+    def __eq__(self, other) -> bool:
+        return (
+            super().__eq__(other)
+            and self.fts_table == other.fts_table
+            and self.subquery == other.subquery
+        )
+
+    def __hash__(self) -> int:
+        return hash(("fts", self.fts_table, hash(self.subquery)))
+
+
 class TrueQuery(Query):
     """A query that always matches."""
 
@@ -654,6 +1002,11 @@ class TrueQuery(Query):
     def match(self, obj: Model) -> bool:
         return True
 
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        return lambda row: True
+
 
 class FalseQuery(Query):
     """A query that never matches."""
@@ -664,6 +1017,11 @@ class FalseQuery(Query):
     def match(self, obj: Model) -> bool:
         return False
 
+    def compile_row(
+        self, model_cls: type[Model]
+    ) -> Callable[[sqlite3.Row], bool] | None:
+        return lambda row: False
+
 
 # Time/date queries.
 
@@ -849,11 +1207,21 @@ class DateQuery(FieldQuery[str]):
         self.interval = DateInterval.from_periods(start, end)
 
     def match(self, obj: Model) -> bool:
-        if self.field_name not in obj:
-            return False
-        timestamp = float(obj[self.field_name])
-        date = datetime.fromtimestamp(timestamp)
-        return self.interval.contains(date)
+        return self.value_test()(obj.get(self.field_name))
+
+    def value_test(self) -> Callable[[Any], bool]:
+        contains = self.interval.contains
+
+        def test(value: Any) -> bool:
+            if value is None:
+                # The field is missing.
+                return False
+            return contains(datetime.fromtimestamp(float(value)))
+
+        return test
+
+    def match_missing(self) -> bool:
+        return False
 
     def col_clause(self) -> tuple[str, Sequence[SQLiteType]]:
         clause_parts = []
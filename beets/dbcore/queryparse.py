@@ -206,7 +206,10 @@ def construct_sort_part(
         # Flexible or computed.
         sort_cls = sort.SlowFieldSort
 
-    return sort_cls(field, is_ascending, case_insensitive)
+    field_sort = sort_cls(field, is_ascending, case_insensitive)
+    if sort_cls is sort.SlowFieldSort and model_cls._is_flex_field(field):
+        field_sort.flex_attributes = model_cls._flex_attributes(field)
+    return field_sort
 
 
 def sort_from_strings(
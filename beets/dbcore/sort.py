@@ -18,7 +18,10 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     from beets.dbcore.db import AnyModel, Model
+    from beets.dbcore.query import FlexAttribute
 
 
 class Sort:
@@ -32,6 +35,13 @@ class Sort:
         """
         return None
 
+    def order_keys(self) -> list[tuple[str, bool]] | None:
+        """Get the `(expression, ascending)` pairs that the clause of
+        `order_clause` orders by, so that the rows sorting after a given
+        one can be selected, or None if they are unknown.
+        """
+        return [] if self.order_clause() is None else None
+
     def sort(self, items: list[AnyModel]) -> list[AnyModel]:
         """Sort the list of objects and return a list."""
         return sorted(items)
@@ -79,6 +89,17 @@ class MultipleSort(Sort):
 
         return ", ".join(order_strings)
 
+    def order_keys(self) -> list[tuple[str, bool]] | None:
+        keys: list[tuple[str, bool]] = []
+        for sort in reversed(self.sorts):
+            if sort.order_clause() is None:
+                break
+            sort_keys = sort.order_keys()
+            if sort_keys is None:
+                return None
+            keys[:0] = sort_keys
+        return keys
+
     def is_slow(self) -> bool:
         for sort in self.sorts:
             if sort.is_slow():
@@ -164,7 +185,9 @@ class FixedFieldSort(FieldSort):
     """Sort object to sort on a fixed field."""
 
     def order_clause(self) -> str:
-        order = "ASC" if self.ascending else "DESC"
+        return _order_clause(self.order_keys())
+
+    def order_keys(self) -> list[tuple[str, bool]]:
         if self.case_insensitive:
             field = (
                 "(CASE "
@@ -174,16 +197,45 @@ class FixedFieldSort(FieldSort):
             )
         else:
             field = self.field
-        return f"{field} {order}"
+        return [(field, self.ascending)]
 
 
 class SlowFieldSort(FieldSort):
     """A sort criterion by some model field other than a fixed field:
     i.e., a computed or flexible field.
+
+    Flexible attributes are sorted in SQL when `flex_attributes` tells
+    where their values are stored. Otherwise, the sort is done in Python.
     """
 
+    flex_attributes: Sequence[FlexAttribute] = ()
+
+    def order_clause(self) -> str | None:
+        if not self.flex_attributes:
+            return None
+        return _order_clause(self.order_keys())
+
+    def order_keys(self) -> list[tuple[str, bool]]:
+        if not self.flex_attributes:
+            return []
+
+        key = self.field.replace("'", "''")
+        values = [
+            f"(SELECT {attr.value} FROM {attr.table} "
+            f"WHERE {attr.table}.entity_id = {attr.entity_id} "
+            f"AND {attr.table}.key = '{key}')"
+            for attr in self.flex_attributes
+        ]
+        # Missing values sort like the type's null value (see `sort`).
+        sql_type = self.flex_attributes[0].sql_type
+        null = "''" if sql_type == "TEXT" else "0"
+        field = f"COALESCE({', '.join(values)}, {null})"
+        if self.case_insensitive and sql_type == "TEXT":
+            field = f"LOWER({field})"
+        return [(field, self.ascending)]
+
     def is_slow(self) -> bool:
-        return True
+        return not self.flex_attributes
 
 
 class NullSort(Sort):
@@ -211,11 +263,18 @@ class SmartArtistSort(FieldSort):
     """
 
     def order_clause(self):
-        order = "ASC" if self.ascending else "DESC"
-        collate = "COLLATE NOCASE" if self.case_insensitive else ""
+        return _order_clause(self.order_keys())
+
+    def order_keys(self) -> list[tuple[str, bool]]:
+        collate = " COLLATE NOCASE" if self.case_insensitive else ""
         field = self.field
 
-        return f"COALESCE(NULLIF({field}_sort, ''), {field}) {collate} {order}"
+        return [
+            (
+                f"COALESCE(NULLIF({field}_sort, ''), {field}){collate}",
+                self.ascending,
+            )
+        ]
 
     def sort(self, objs: list[AnyModel]) -> list[AnyModel]:
         def key(o):
@@ -223,3 +282,10 @@ class SmartArtistSort(FieldSort):
             return val.lower() if self.case_insensitive else val
 
         return sorted(objs, key=key, reverse=not self.ascending)
+
+
+def _order_clause(keys: Sequence[tuple[str, bool]]) -> str:
+    """Build an ORDER BY clause from `(expression, ascending)` pairs."""
+    return ", ".join(
+        f"{field} {'ASC' if ascending else 'DESC'}" for field, ascending in keys
+    )
@@ -0,0 +1,118 @@
+# This file is part of beets.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""A thread that runs the writes of all other threads to a database, see
+:meth:`beets.dbcore.Database.submit`.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from .db import Database
+
+    Job = tuple[Future[Any], Callable[..., Any], tuple[Any, ...]]
+
+
+class WriteQueue:
+    """Runs the writes submitted by any thread on a single writer thread.
+
+    The writes waiting in the queue, up to `batch_size` of them, are run
+    in one transaction, so they share a commit. A write that raises is
+    undone on its own, and the others are still committed.
+    """
+
+    def __init__(self, db: Database, batch_size: int = 100):
+        self.db = db
+        self.batch_size = batch_size
+        self._jobs: queue.SimpleQueue[Job | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future[Any]:
+        """Queue the call of `func` with `args` on the writer thread and
+        get a future for its result, which is set once the write is
+        committed.
+
+        The call runs in a copy of the calling thread's context, so that
+        context variables, such as the music directory that paths are
+        stored relative to, keep their values.
+        """
+        future: Future[Any] = Future()
+        context = contextvars.copy_context()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="dbcore-writer", daemon=True
+                )
+                self._thread.start()
+            self._jobs.put((future, context.run, (func, *args)))
+        return future
+
+    def close(self):
+        """Run the queued writes and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._jobs.put(None)
+        thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._jobs.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._run_batch(jobs)
+            if batch[-1] is None:
+                return
+
+    def _run_batch(self, jobs: list[Job]):
+        """Run `jobs` in one transaction and resolve their futures after
+        the commit.
+        """
+        outcomes = []
+        try:
+            with self.db.transaction() as tx:
+                for future, func, args in jobs:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with tx.savepoint():
+                            outcomes.append((future, func(*args), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # The commit failed, so none of the writes happened.
+            for future, _, _ in jobs:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
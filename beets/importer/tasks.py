@@ -303,8 +303,7 @@ class ImportTask(BaseImportTask):
             for item in items:
                 item.set_parse(field, format(item, value))
         with lib.transaction():
-            for item in items:
-                item.store()
+            lib.store_many(items)
             self.album.store()
 
     def finalize(self, session: ImportSession) -> None:
@@ -498,9 +497,7 @@ class ImportTask(BaseImportTask):
             if write and (self.apply or self.choice_flag == Action.RETAG):
                 item.try_write()
 
-        with session.lib.transaction():
-            for item in self.imported_items():
-                item.store()
+        session.lib.store_many(self.imported_items())
 
         plugins.send("import_task_files", session=session, task=self)
 
@@ -607,8 +604,11 @@ class ImportTask(BaseImportTask):
                     list(album_fields.keys()),
                 )
 
+        reimported_items = []
         for item in self.imported_items():
             dup_items = self.replaced_items[item]
+            if dup_items:
+                reimported_items.append(item)
             for dup_item in dup_items:
                 if dup_item.added and dup_item.added != item.added:
                     item.added = dup_item.added
@@ -627,7 +627,7 @@ class ImportTask(BaseImportTask):
                     item,
                     list(item_fields.keys()),
                 )
-                item.store()
+        lib.store_many(reimported_items)
 
     def remove_replaced(self, lib: library.Library) -> None:
         """Removes all the items from the library that have the same
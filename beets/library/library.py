@@ -1,25 +1,32 @@
 from __future__ import annotations
 
 import re
+from collections import OrderedDict
 from contextlib import contextmanager
 from functools import cached_property
+from itertools import islice
 from typing import TYPE_CHECKING
 
 import platformdirs
 
 import beets
-from beets import config, context, dbcore
+from beets import config, context, dbcore, plugins
+from beets.dbcore.query import InQuery
 from beets.dbcore.sort import NullSort
 from beets.exceptions import UserError
 from beets.util import normpath
-from beets.util.pathformats import get_path_formats
+from beets.util.functemplate import Template, template
+from beets.util.pathformats import PF_KEY_DEFAULT, get_path_formats
 
 from . import migrations
-from .models import Album, Item
+from .models import Album, AlbumFormatCache, FormattedItemMapping, Item
 from .queries import parse_query_parts, parse_query_string
+from .unique import UniqueIndex
 
 if TYPE_CHECKING:
-    from beets.dbcore import Results
+    from collections.abc import Iterable, Iterator, Sequence
+
+    from beets.dbcore import Query, Results
     from beets.util import Replacements
     from beets.util.pathformats import PathFormat
 
@@ -37,6 +44,8 @@ class Library(dbcore.Database):
         (migrations.MultiArrangerFieldMigration, (Item,)),
         (migrations.RelativePathMigration, (Item, Album)),
         (migrations.RemoveInheritedArtpathMigration, (Item,)),
+        (migrations.LargeFieldStorageMigration, (Item,)),
+        (migrations.PromoteFieldsMigration, (Item, Album)),
     )
     replacements: Replacements
 
@@ -44,6 +53,38 @@ class Library(dbcore.Database):
     def path_formats(self) -> list[PathFormat]:
         return get_path_formats(config["paths"])
 
+    def parsed_path_formats(
+        self, path_formats: Sequence[tuple[str, Template | str]] | None = None
+    ) -> list[tuple[Query | None, Template]]:
+        """Get the item queries and templates of `path_formats`, or of the
+        library's path formats, in order of precedence. The default format
+        comes last, with None for its query.
+
+        The library's path formats are only parsed once.
+        """
+        path_formats = path_formats or self.path_formats
+        parsed = self._parsed_path_formats
+        if parsed and parsed[0] is path_formats:
+            return parsed[1]
+
+        formats: list[tuple[Query | None, Template]] = []
+        default = None
+        for query, path_format in path_formats:
+            if not isinstance(path_format, Template):
+                path_format = template(path_format)
+            if query != PF_KEY_DEFAULT:
+                formats.append(
+                    (parse_query_string(query, Item)[0], path_format)
+                )
+            elif default is None:
+                default = path_format
+        if default is not None:
+            formats.append((None, default))
+
+        if path_formats is self.path_formats:
+            self._parsed_path_formats = (path_formats, formats)
+        return formats
+
     @staticmethod
     def get_replacements() -> Replacements:
         """Build regex/string replacement pairs from config."""
@@ -68,12 +109,32 @@ class Library(dbcore.Database):
         if set_music_dir:
             context.set_music_dir(self.directory)
 
-        super().__init__(path, timeout=beets.config["timeout"].as_number())
+        super().__init__(
+            path,
+            timeout=beets.config["timeout"].as_number(),
+            model_cache_size=beets.config["model_cache_size"].get(int),
+            full_text_search=beets.config["full_text_search"].get(bool),
+            record_queries=beets.config["record_queries"].get(bool),
+            column_store=beets.config["column_store"].get(bool),
+            large_field_storage=beets.config["large_field_storage"].as_choice(
+                ["inline", "separate", "compressed"]
+            ),
+            wal=beets.config["wal"].get(bool),
+            page_cache_size=beets.config["page_cache_size"].get(int),
+            mmap_size=beets.config["mmap_size"].get(int),
+            write_queue=beets.config["write_queue"].get(bool),
+            change_journal=beets.config["change_journal"].get(bool),
+        )
 
         self.replacements = self.get_replacements()
 
-        # Used for template substitution performance.
-        self._memotable: dict[tuple[str, ...], str] = {}
+        # The indices of `unique_index`.
+        self._unique_indices: dict[tuple, UniqueIndex] = {}
+
+        # The path formats last parsed by `parsed_path_formats`.
+        self._parsed_path_formats: (
+            tuple[Sequence[tuple[str, Template | str]], list] | None
+        ) = None
 
     @contextmanager
     def music_dir_context(self):
@@ -90,7 +151,6 @@ class Library(dbcore.Database):
         Return the object's new id.
         """
         obj.add(self)
-        self._memotable = {}
         return obj.id
 
     def add_album(self, items):
@@ -111,29 +171,50 @@ class Library(dbcore.Database):
         # Store or add the items.
         with self.transaction():
             album.add(self)
+            new_items = [i for i in items if i.id is None]
+            stored_items = [i for i in items if i.id is not None]
             for item in items:
                 item.album_id = album.id
-                if item.id is None:
-                    item.add(self)
-                else:
-                    item.store()
+            self.add_many(new_items)
+            self.store_many(stored_items)
 
         return album
 
-    # Querying.
+    def add_many(self, objs):
+        """Add many :class:`Item` or :class:`Album` objects to the library
+        database at once, see :meth:`dbcore.Database.add_many`.
 
-    def _fetch(self, model_cls, query, sort=None):
-        """Parse a query and fetch.
+        Return the objects' new ids.
+        """
+        objs = list(objs)
+        ids = super().add_many(objs)
+        for obj in objs:
+            plugins.send("database_change", lib=self, model=obj)
+        return ids
+
+    def store_many(self, models, fields=None):
+        """Save many :class:`Item` or :class:`Album` objects into the
+        database at once, see :meth:`dbcore.Database.store_many`.
+        """
+        models = list(models)
+        super().store_many(models, fields)
+        for model in models:
+            plugins.send("database_change", lib=self, model=model)
 
-        If an order specification is present in the query string
-        the `sort` argument is ignored.
+    # Querying.
+
+    def _parse_query(self, model_cls, query):
+        """Parse a query string or list of query parts, if necessary, into
+        a query and a sort (which may be None).
         """
-        # Parse the query, if necessary.
         try:
             parsed_sort = None
             # Query parsing needs the library root, but keeping it scoped here
             # avoids leaking one Library's directory into another's work.
-            with context.music_dir(self.directory):
+            with (
+                context.music_dir(self.directory),
+                context.fts_tables(self._fts_tables),
+            ):
                 if isinstance(query, str):
                     query, parsed_sort = parse_query_string(query, model_cls)
                 elif isinstance(query, (list, tuple)):
@@ -141,12 +222,29 @@ class Library(dbcore.Database):
         except dbcore.query.InvalidQueryArgumentValueError as exc:
             raise dbcore.InvalidQueryError(query, exc)
 
+        return query, parsed_sort
+
+    def _fetch(self, model_cls, query, sort=None, stream=False, fields=None):
+        """Parse a query and fetch.
+
+        If an order specification is present in the query string
+        the `sort` argument is ignored.
+        """
+        query, parsed_sort = self._parse_query(model_cls, query)
+
         # Any non-null sort specified by the parsed query overrides the
         # provided sort.
         if parsed_sort and not isinstance(parsed_sort, NullSort):
             sort = parsed_sort
 
-        return super()._fetch(model_cls, query, sort)
+        return super()._fetch(model_cls, query, sort, stream, fields)
+
+    def aggregate(self, model_cls, query, aggregates):
+        """Parse a query and compute aggregates over the matching objects,
+        see :meth:`dbcore.Database.aggregate`.
+        """
+        query, _ = self._parse_query(model_cls, query)
+        return super().aggregate(model_cls, query, aggregates)
 
     @staticmethod
     def get_default_album_sort():
@@ -162,13 +260,36 @@ class Library(dbcore.Database):
             Item, beets.config["sort_item"].as_str_seq()
         )
 
-    def albums(self, query=None, sort=None) -> Results[Album]:
-        """Get :class:`Album` objects matching the query."""
-        return self._fetch(Album, query, sort or self.get_default_album_sort())
+    def albums(
+        self, query=None, sort=None, stream=False, fields=None
+    ) -> Results[Album]:
+        """Get :class:`Album` objects matching the query.
 
-    def items(self, query=None, sort=None) -> Results[Item]:
-        """Get :class:`Item` objects matching the query."""
-        return self._fetch(Item, query, sort or self.get_default_item_sort())
+        With `stream`, rows are read from the database in batches while
+        the results are iterated, see :class:`dbcore.db.StreamedResults`.
+        With `fields`, only these fields are fetched up front and the
+        others are loaded on first access, see :meth:`dbcore.Database._fetch`.
+        """
+        return self._fetch(
+            Album, query, sort or self.get_default_album_sort(), stream, fields
+        )
+
+    def items(
+        self, query=None, sort=None, stream=False, fields=None
+    ) -> Results[Item]:
+        """Get :class:`Item` objects matching the query.
+
+        With `stream`, rows are read from the database in batches while
+        the results are iterated, see :class:`dbcore.db.StreamedResults`.
+        With `fields`, only these fields are fetched up front and the
+        others are loaded on first access, see :meth:`dbcore.Database._fetch`.
+        """
+        if fields is not None:
+            # Needed to fall back to the album's fields.
+            fields = {*fields, "album_id"}
+        return self._fetch(
+            Item, query, sort or self.get_default_item_sort(), stream, fields
+        )
 
     # Convenience accessors.
     def get_item(self, id_: int) -> Item | None:
@@ -188,3 +309,74 @@ class Library(dbcore.Database):
             item_or_id if isinstance(item_or_id, int) else item_or_id.album_id
         )
         return self._get(Album, album_id) if album_id else None
+
+    # Paths.
+
+    def destinations(
+        self,
+        items: Iterable[Item],
+        relative_to_libdir: bool = False,
+        basedir: bytes | None = None,
+        path_formats: Sequence[tuple[str, Template | str]] | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[tuple[Item, bytes]]:
+        """Yield each of `items` with its destination, see
+        :meth:`Item.destination`.
+
+        `items` can be streamed results, which are consumed in batches.
+        The path formats are parsed once, the albums of each batch are
+        fetched with one query, and the items of an album share the album
+        object and its formatted values. Only the albums of about the last
+        two batches are kept, so that memory use stays bounded.
+        """
+        formats = self.parsed_path_formats(path_formats)
+        albums: OrderedDict[int, tuple[Album, AlbumFormatCache]]
+        albums = OrderedDict()
+        items = iter(items)
+        while batch := list(islice(items, batch_size)):
+            # Forget the albums that were used longest ago.
+            while len(albums) > batch_size:
+                albums.popitem(last=False)
+            missing = {
+                item.album_id
+                for item in batch
+                if item.album_id and item.album_id not in albums
+            }
+            if missing:
+                for album in self.albums(InQuery("id", sorted(missing))):
+                    albums[album.id] = album, AlbumFormatCache()
+
+            for item in batch:
+                cache = None
+                if entry := albums.get(item.album_id):
+                    albums.move_to_end(item.album_id)
+                    item._cached_album, cache = entry
+                mapping = FormattedItemMapping(
+                    item, for_path=True, album_cache=cache
+                )
+                yield (
+                    item,
+                    item._destination(
+                        formats, mapping, relative_to_libdir, basedir
+                    ),
+                )
+
+    def unique_index(
+        self,
+        model_cls: type[Item | Album],
+        query: Query,
+        keys: tuple[str, ...],
+        disam: tuple[str, ...],
+    ) -> UniqueIndex:
+        """Get the index of the disambiguators of the objects matching
+        `query` that share their `keys` with others, used by the
+        ``%aunique`` and ``%sunique`` template functions.
+
+        There is one index per combination of arguments. It is kept up to
+        date with the library.
+        """
+        key = (model_cls, repr(query), keys, disam)
+        if (index := self._unique_indices.get(key)) is None:
+            index = UniqueIndex(self, model_cls, query, keys, disam)
+            self._unique_indices[key] = index
+        return index
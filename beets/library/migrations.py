@@ -9,7 +9,7 @@ from confuse.exceptions import ConfigError
 
 import beets
 from beets import ui
-from beets.dbcore.db import Migration
+from beets.dbcore.db import Migration, inflate
 from beets.dbcore.pathutils import normalize_path_for_db
 from beets.dbcore.types import MULTI_VALUE_DELIMITER
 from beets.util import chunks, unique_list
@@ -284,3 +284,257 @@ class RemoveInheritedArtpathMigration(Migration):
             tx.mutate(f"DELETE FROM {flex_table} WHERE key == 'artpath'")
 
         ui.print_(f"Migration complete: {total} {table} updated")
+
+
+class LargeFieldStorageMigration(Migration):
+    """Move the large fields of a model between its table and its separate
+    table, according to the configured `large_field_storage`.
+
+    The applied storage is recorded as a migration of its own, named
+    after the storage. The configuration may be changed at any time, so
+    unlike other migrations, this one runs whenever the configured storage
+    differs from the recorded one.
+    """
+
+    def migrate_model(self, model_cls: type[Model], *args, **kwargs) -> None:
+        self._migrate_data(model_cls, *args, **kwargs)
+
+    def _migrate_data(
+        self, model_cls: type[Model], current_fields: set[str]
+    ) -> None:
+        table = model_cls._table
+        prefix = f"{self.name}:"
+        storage = self.db._large_field_storage
+        recorded = {
+            name.removeprefix(prefix)
+            for name in self.db.db_tables[table]["migrations"]
+            if name.startswith(prefix)
+        }
+        if recorded == {storage}:
+            # The values are stored this way already.
+            return
+
+        fields = [f for f in model_cls._large_fields if f in current_fields]
+        if fields and self.db._separate_fields(model_cls):
+            self._separate(model_cls, fields)
+        elif fields:
+            self._inline(model_cls, fields)
+
+        with self.db.transaction() as tx:
+            tx.mutate_many(
+                "DELETE FROM migrations WHERE name = ? AND table_name = ?",
+                [(f"{prefix}{name}", table) for name in recorded],
+            )
+            tx.mutate(
+                "INSERT INTO migrations(name, table_name) VALUES (?, ?)",
+                (f"{prefix}{storage}", table),
+            )
+
+    def _separate(self, model_cls: type[Model], fields: list[str]) -> None:
+        """Move the values of `fields` out of the model's table, and store
+        the values already moved with the configured compression.
+        """
+        table, large_table = model_cls._table, model_cls._large_table
+        stored_type = (
+            "text" if self.db._large_field_storage == "compressed" else "blob"
+        )
+        with self.db.transaction() as tx:
+            rows = tx.query(
+                f"""
+                SELECT id, {", ".join(fields)}
+                FROM {table}
+                WHERE {" OR ".join(f"{f} != ''" for f in fields)}
+                """
+            )
+            recode = tx.query(
+                f"""
+                SELECT entity_id, key, value
+                FROM {large_table}
+                WHERE typeof(value) == ?
+                """,
+                (stored_type,),
+            )
+        if not rows and not recode:
+            return
+
+        self._before_migration_backup(table)
+        if rows:
+            ui.print_(f"Moving {', '.join(fields)} of {len(rows)} {table}...")
+        assignments = ", ".join(f"{f} = NULL" for f in fields)
+        for batch in chunks(rows, self.CHUNK_SIZE):
+            with self.db.transaction() as tx:
+                self.db._write_large_fields(
+                    tx,
+                    model_cls,
+                    [(r["id"], f, r[f]) for r in batch for f in fields],
+                    None,
+                )
+                tx.mutate_many(
+                    f"UPDATE {table} SET {assignments} WHERE id = ?",
+                    [(r["id"],) for r in batch],
+                )
+
+        with self.db.transaction() as tx:
+            self.db._write_large_fields(
+                tx,
+                model_cls,
+                [(r[0], r[1], inflate(r[2])) for r in recode],
+                None,
+            )
+        if rows:
+            ui.print_(f"Migration complete: {len(rows)} {table} updated")
+
+    def _inline(self, model_cls: type[Model], fields: list[str]) -> None:
+        """Move the values of `fields` back into the model's table and drop
+        the separate table.
+        """
+        table, large_table = model_cls._table, model_cls._large_table
+        with self.db.transaction() as tx:
+            if not tx.query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (large_table,),
+            ):
+                return
+            rows = tx.query(f"SELECT entity_id, key, value FROM {large_table}")
+
+        if rows:
+            self._before_migration_backup(table)
+            ui.print_(f"Moving {', '.join(fields)} back into {table}...")
+        with self.db.transaction() as tx:
+            for field in fields:
+                tx.mutate_many(
+                    f"UPDATE {table} SET {field} = ? WHERE id = ?",
+                    [(inflate(r[2]), r[0]) for r in rows if r[1] == field],
+                )
+            tx.script(f"DROP TABLE {large_table};")
+        if rows:
+            ui.print_(f"Migration complete: {len(rows)} values moved")
+
+
+class PromoteFieldsMigration(Migration):
+    """Move the values of the flexible attributes configured in
+    `promote_fields` into the columns added for them, and move the values
+    of fields that are no longer promoted back into flexible attributes.
+
+    Each promoted field is recorded as a migration of its own, named
+    after the field, so that its column is recognized once the field is
+    demoted. The configuration may be changed at any time, so unlike
+    other migrations, this one runs at every startup, and writes only when
+    the promoted fields have changed.
+    """
+
+    def migrate_model(self, model_cls: type[Model], *args, **kwargs) -> None:
+        self._migrate_data(model_cls, *args, **kwargs)
+
+    def _migrate_data(
+        self, model_cls: type[Model], current_fields: set[str]
+    ) -> None:
+        table = model_cls._table
+        prefix = f"{self.name}:"
+        recorded = {
+            name.removeprefix(prefix)
+            for name in self.db.db_tables[table]["migrations"]
+            if name.startswith(prefix)
+        }
+        promoted = getattr(model_cls, "_promoted_fields", {})
+        # Recorded fields have been moved already.
+        new = [f for f in promoted if f not in recorded]
+        stale = recorded - promoted.keys()
+        if not new and not stale:
+            return
+
+        demoted = sorted(
+            f
+            for f in stale
+            if f in current_fields and f not in model_cls._fields
+        )
+
+        if new:
+            self._promote(model_cls, new)
+        if demoted:
+            self._demote(model_cls, demoted)
+
+        with self.db.transaction() as tx:
+            tx.mutate_many(
+                "INSERT INTO migrations(name, table_name) VALUES (?, ?)",
+                [(f"{prefix}{f}", table) for f in new],
+            )
+            tx.mutate_many(
+                "DELETE FROM migrations WHERE name = ? AND table_name = ?",
+                [(f"{prefix}{f}", table) for f in stale],
+            )
+
+    def _promote(self, model_cls: type[Model], fields: list[str]) -> None:
+        """Move the flexible attribute values of `fields` into their
+        columns.
+        """
+        table, flex_table = model_cls._table, model_cls._flex_table
+        placeholders = ", ".join("?" * len(fields))
+        with self.db.transaction() as tx:
+            rows = tx.query(
+                f"""
+                SELECT entity_id, key, value
+                FROM {flex_table}
+                WHERE key IN ({placeholders})
+                """,
+                fields,
+            )
+        if not rows:
+            return
+
+        self._before_migration_backup(table)
+        ui.print_(f"Moving {', '.join(fields)} of {table} into columns...")
+        for batch in chunks(rows, self.CHUNK_SIZE):
+            with self.db.transaction() as tx:
+                for field in fields:
+                    typ = model_cls._fields[field]
+                    tx.mutate_many(
+                        f"UPDATE {table} SET {field} = ? WHERE id = ?",
+                        [
+                            (typ.to_sql(typ.from_sql(r[2])), r[0])
+                            for r in batch
+                            if r[1] == field
+                        ],
+                    )
+        with self.db.transaction() as tx:
+            tx.mutate(
+                f"DELETE FROM {flex_table} WHERE key IN ({placeholders})",
+                fields,
+            )
+        ui.print_(f"Migration complete: {len(rows)} values moved")
+
+    def _demote(self, model_cls: type[Model], fields: list[str]) -> None:
+        """Move the values of `fields` out of their columns into flexible
+        attributes. Null values are dropped.
+        """
+        table, flex_table = model_cls._table, model_cls._flex_table
+        with self.db.transaction() as tx:
+            rows = tx.query(f"SELECT id, {', '.join(fields)} FROM {table}")
+
+        nulls = {}
+        for field in fields:
+            typ = model_cls._type(field)
+            nulls[field] = (None, typ.to_sql(typ.null))
+        values = [
+            (r["id"], f, r[f])
+            for r in rows
+            for f in fields
+            if r[f] not in nulls[f]
+        ]
+        if values:
+            self._before_migration_backup(table)
+            ui.print_(
+                f"Moving {', '.join(fields)} of {table} out of columns..."
+            )
+        assignments = ", ".join(f"{f} = NULL" for f in fields)
+        with self.db.transaction() as tx:
+            tx.mutate_many(
+                f"""
+                INSERT INTO {flex_table} (entity_id, key, value)
+                VALUES (?, ?, ?)
+                """,
+                values,
+            )
+            tx.mutate(f"UPDATE {table} SET {assignments}")
+        if values:
+            ui.print_(f"Migration complete: {len(values)} values moved")
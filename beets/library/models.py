@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import dataclasses
+import inspect
 import os
 import string
 import sys
 import time
 import unicodedata
+from collections.abc import Callable, Mapping
 from contextlib import suppress
 from functools import cached_property
 from pathlib import Path
@@ -13,10 +16,11 @@ from typing import TYPE_CHECKING, ClassVar, TypeVar
 from mediafile import MediaFile, UnreadableFileError
 
 import beets
-from beets import dbcore, logging, plugins, util
+from beets import context, dbcore, logging, plugins, util
 from beets.dbcore import types
 from beets.dbcore.db import FormattedMapping
 from beets.dbcore.pathutils import normalize_path_for_db
+from beets.dbcore.query import FlexAttribute
 from beets.dbcore.sort import SmartArtistSort
 from beets.util import (
     MoveOperation,
@@ -28,14 +32,12 @@ from beets.util import (
 )
 from beets.util.deprecation import maybe_replace_legacy_field
 from beets.util.functemplate import Template, template
-from beets.util.pathformats import PF_KEY_DEFAULT
 
 from .exceptions import FileOperationError, ReadError, WriteError
 from .fields import TYPE_BY_FIELD
-from .queries import parse_query_string
 
 if TYPE_CHECKING:
-    from collections.abc import KeysView
+    from collections.abc import Iterator, KeysView, Sequence
 
     from beets.dbcore.query import FieldQuery, FieldQueryType
     from beets.dbcore.sort import FieldSort
@@ -52,6 +54,11 @@ class LibModel(dbcore.Model["Library"]):
 
     _field_names: ClassVar[set[str]]
 
+    _promoted_fields: ClassVar[dict[str, types.Type]] = {}
+    """Flexible attributes stored in columns of the model's table, which
+    are treated as fixed fields. See :meth:`promote_fields`.
+    """
+
     # Config key that specifies how an instance should be formatted.
     _format_config_key: str
     path: bytes
@@ -59,7 +66,10 @@ class LibModel(dbcore.Model["Library"]):
 
     @cached_classproperty
     def _fields(cls) -> dict[str, types.Type]:
-        return {f: TYPE_BY_FIELD[f] for f in sorted(cls._field_names)}
+        return {
+            **{f: TYPE_BY_FIELD[f] for f in sorted(cls._field_names)},
+            **cls._promoted_fields,
+        }
 
     @cached_classproperty
     def _types(cls) -> dict[str, types.Type]:
@@ -73,6 +83,29 @@ class LibModel(dbcore.Model["Library"]):
     def _queries(cls) -> dict[str, FieldQueryType]:
         return plugins.named_queries(cls)  # type: ignore[arg-type]
 
+    @classmethod
+    def promote_fields(cls, fields: Sequence[str]) -> None:
+        """Store the flexible attributes `fields` in columns of the model's
+        table from now on, with the types declared by plugins.
+
+        Names of fixed or computed fields, and names that are not valid
+        column names, are ignored. Any previously promoted field that is
+        not in `fields` becomes a flexible attribute again.
+        """
+        promoted = {}
+        for field in fields:
+            if field in cls._field_names or field in cls._getters():
+                continue
+            if not field.isidentifier():
+                log.warning("cannot promote field {} to a column", field)
+                continue
+            promoted[field] = cls._types.get(field, types.DEFAULT)
+
+        if promoted != cls._promoted_fields:
+            cls._promoted_fields = promoted
+            # Properties derived from the fields are out of date.
+            cached_classproperty.cache.clear()
+
     @cached_classproperty
     def writable_media_fields(cls) -> set[str]:
         return set(MediaFile.fields()) & cls._fields.keys()
@@ -82,10 +115,18 @@ class LibModel(dbcore.Model["Library"]):
         """The path to the entity as pathlib.Path."""
         return Path(os.fsdecode(self.path))
 
+    @cached_classproperty
+    def _template_func_table(cls) -> dict[str, tuple[Callable[..., str], bool]]:
+        """The default and plugin template functions by name, with whether
+        they need to be bound to the object, see :class:`TemplateFunctions`.
+        """
+        table = dict(DefaultTemplateFunctions.unbound_functions)
+        for name, func in plugins.template_funcs().items():
+            table[name] = (func, False)
+        return table
+
     def _template_funcs(self):
-        funcs = DefaultTemplateFunctions(self, self._db).functions()
-        funcs.update(plugins.template_funcs())
-        return funcs
+        return TemplateFunctions(self._template_func_table, self, self._db)
 
     def store(self, fields=None):
         super().store(fields)
@@ -106,6 +147,16 @@ class LibModel(dbcore.Model["Library"]):
         assert isinstance(spec, str)
         return self.evaluate_template(spec)
 
+    @classmethod
+    def format_fields(cls, spec: str = "") -> set[str]:
+        """Get the fields used by the format template `spec`, or by the
+        configured default format. Fetching only these fields is enough
+        to format objects with it.
+        """
+        if not spec:
+            spec = beets.config[cls._format_config_key].as_str()
+        return template(spec).symbols
+
     def __str__(self):
         return format(self)
 
@@ -139,14 +190,73 @@ class LibModel(dbcore.Model["Library"]):
             # Using an explicit table name resolves this.
             field = f"{cls._table}.{field}"
 
-        return query_cls(field, pattern, fast)
+        query = query_cls(field, pattern, fast)
+        if not fast and cls._is_flex_sql_query(field, query):
+            query.flex_attributes = cls._flex_attributes(field)
+        return query
 
     @classmethod
-    def any_field_query(cls, *args, **kwargs) -> dbcore.OrQuery:
-        return dbcore.OrQuery(
-            [cls.field_query(f, *args, **kwargs) for f in cls._search_fields]
+    def _is_flex_sql_query(cls, field: str, query: dbcore.Query) -> bool:
+        """Determine whether `query` on a field that is not stored in a
+        table column can be evaluated against the flexible attribute
+        tables in SQL.
+
+        Named queries and query types without an SQL implementation must
+        be matched in Python.
+        """
+        return (
+            isinstance(query, dbcore.FieldQuery)
+            and type(query).col_clause is not dbcore.FieldQuery.col_clause
+            and not isinstance(query, dbcore.query.PathQuery)
+            and field not in cls._queries
+            and cls._is_flex_field(field)
+        )
+
+    @classmethod
+    def _is_flex_field(cls, field: str) -> bool:
+        """Determine whether `field` is a flexible attribute whose stored
+        values can be used in SQL as they are.
+
+        Computed fields and types whose values need to be parsed first
+        (such as blobs and delimited lists) must be handled in Python.
+        """
+        typ = cls._type(field)
+        return (
+            field not in cls.all_db_fields
+            and field not in cls._getters()
+            and field not in cls._relation._getters()
+            and typ.sql != "BLOB"
+            and not isinstance(typ, types.DelimitedString)
         )
 
+    @classmethod
+    def _flex_attributes(cls, field: str) -> list[FlexAttribute]:
+        """Return where the values of the flexible attribute `field` are
+        stored, in order of precedence.
+        """
+        return [
+            FlexAttribute(
+                cls._flex_table, f"{cls._table}.id", cls._type(field).sql
+            )
+        ]
+
+    @classmethod
+    def any_field_query(cls, pattern, query_cls) -> dbcore.Query:
+        query = dbcore.OrQuery(
+            [cls.field_query(f, pattern, query_cls) for f in cls._search_fields]
+        )
+        if (
+            query_cls is dbcore.query.SubstringQuery
+            and cls._table in context.get_fts_tables()
+            and len(pattern) >= dbcore.query.FullTextQuery.MIN_LENGTH
+        ):
+            # Look the pattern up in the full-text index instead of
+            # scanning all rows.
+            return dbcore.query.FullTextQuery(
+                cls._table, cls._fts_table, pattern, query
+            )
+        return query
+
     @classmethod
     def any_writable_media_field_query(cls, *args, **kwargs) -> dbcore.OrQuery:
         fields = cls.writable_media_fields
@@ -164,10 +274,24 @@ class LibModel(dbcore.Model["Library"]):
         )
 
 
+@dataclasses.dataclass
+class AlbumFormatCache:
+    """The album keys and formatted album values of the formatted
+    mappings of all items of an album, which share them.
+    """
+
+    keys: list[str] | None = None
+    values: dict[str, str] = dataclasses.field(default_factory=dict)
+
+
 class FormattedItemMapping(dbcore.db.FormattedMapping):
     """Add lookup for album-level fields.
 
     Album-level fields take precedence if `for_path` is true.
+
+    Mappings with all keys and the same `for_path` of the items of one
+    album can share an `album_cache`, so that the album's values are only
+    formatted once.
     """
 
     ALL_KEYS = "*"
@@ -177,6 +301,7 @@ class FormattedItemMapping(dbcore.db.FormattedMapping):
         item: Item,
         included_keys: str | list[str] = ALL_KEYS,
         for_path: bool = False,
+        album_cache: AlbumFormatCache | None = None,
     ) -> None:
         # We treat album and item keys specially here,
         # so exclude transitive album keys from the model's keys.
@@ -184,11 +309,12 @@ class FormattedItemMapping(dbcore.db.FormattedMapping):
         self.included_keys = included_keys
         self.model_keys = set(
             # Performance note: this triggers a database query.
-            item.keys(computed=True, with_album=False)
+            item._loaded_keys(computed=True)
             if included_keys == self.ALL_KEYS
             else included_keys
         )
         self.item = item
+        self.album_cache = album_cache
 
     @cached_property
     def all_keys(self):
@@ -196,6 +322,9 @@ class FormattedItemMapping(dbcore.db.FormattedMapping):
 
     @cached_property
     def album_keys(self):
+        if self.album_cache and self.album_cache.keys is not None:
+            return self.album_cache.keys
+
         album_keys = []
         if self.album:
             if self.included_keys == self.ALL_KEYS:
@@ -205,6 +334,8 @@ class FormattedItemMapping(dbcore.db.FormattedMapping):
                         album_keys.append(key)
             else:
                 album_keys = self.included_keys
+        if self.album_cache:
+            self.album_cache.keys = album_keys
         return album_keys
 
     @property
@@ -217,13 +348,22 @@ class FormattedItemMapping(dbcore.db.FormattedMapping):
         Raise a KeyError for invalid keys.
         """
         if self.for_path and key in self.album_keys:
-            return self._get_formatted(self.album, key)
+            return self._get_album_formatted(key)
         if key in self.model_keys:
             return self._get_formatted(self.model, key)
         if key in self.album_keys:
-            return self._get_formatted(self.album, key)
+            return self._get_album_formatted(key)
         raise KeyError(key)
 
+    def _get_album_formatted(self, key):
+        if self.album_cache is None:
+            return self._get_formatted(self.album, key)
+
+        values = self.album_cache.values
+        if key not in values:
+            values[key] = self._get_formatted(self.album, key)
+        return values[key]
+
     def __getitem__(self, key):
         """Get the value for a key.
 
@@ -312,6 +452,8 @@ class Album(LibModel):
 
     _search_fields = ("album", "albumartist", "genres")
 
+    _column_store_fields = ("album", "albumartist", "albumtype", "mb_albumid")
+
     @cached_classproperty
     def _types(cls) -> dict[str, types.Type]:
         return {**super()._types, "path": TYPE_BY_FIELD["path"]}
@@ -449,11 +591,15 @@ class Album(LibModel):
             assert False, "unknown MoveOperation"
         self.artpath = new_art
 
-    def move(self, operation=MoveOperation.MOVE, basedir=None, store=True):
+    def move(
+        self, operation=MoveOperation.MOVE, basedir=None, store=True, dests=None
+    ):
         """Move, copy, link or hardlink (depending on `operation`)
         all items to their destination. Any album art moves along with them.
 
         `basedir` overrides the library base directory for the destination.
+        `dests` can map item ids to destinations that were already
+        computed, for example with :meth:`Library.destinations`.
 
         `operation` should be an instance of `util.MoveOperation`.
 
@@ -474,7 +620,13 @@ class Album(LibModel):
         moved_item_dir = None
         for item in items:
             old_path = item.path
-            item.move(operation, basedir=basedir, with_album=False, store=store)
+            item.move(
+                operation,
+                basedir=basedir,
+                with_album=False,
+                store=store,
+                dest=dests.get(item.id) if dests else None,
+            )
             if moved_item_dir is None and item.path != old_path:
                 moved_item_dir = os.path.dirname(item.path)
 
@@ -600,17 +752,15 @@ class Album(LibModel):
 
         with self._db.transaction():
             super().store(fields)
-            if track_updates:
-                for item in self.items():
+            if track_updates or track_deletes:
+                items = list(self.items())
+                for item in items:
                     for key, value in track_updates.items():
                         item[key] = value
-                    item.store()
-            if track_deletes:
-                for item in self.items():
                     for key in track_deletes:
                         if key in item:
                             del item[key]
-                    item.store()
+                self._db.store_many(items)
 
     def try_sync(self, write, move, inherit=True):
         """Synchronize the album and its items with the database.
@@ -706,6 +856,17 @@ class Item(LibModel):
         "genres",
     )
 
+    _large_fields = ("lyrics", "comments")
+
+    _column_store_fields = (
+        "artist",
+        "album",
+        "albumartist",
+        "format",
+        "mb_trackid",
+        "mb_albumid",
+    )
+
     # Set of item fields that are backed by `MediaFile` fields.
     # Any kind of field (fixed, flexible, and computed) may be a media
     # field. Only these fields are read from disk in `read` and written in
@@ -781,6 +942,20 @@ class Item(LibModel):
             "album_id"
         )
 
+    @classmethod
+    def _flex_attributes(cls, field: str) -> list[FlexAttribute]:
+        """Items fall back to their album's flexible attributes, see
+        :meth:`get`.
+        """
+        return [
+            *super()._flex_attributes(field),
+            FlexAttribute(
+                Album._flex_table,
+                f"{cls._table}.album_id",
+                Album._type(field).sql,
+            ),
+        ]
+
     @classmethod
     def from_path(cls, path):
         """Create a new item from the media file at the specified path."""
@@ -1106,14 +1281,13 @@ class Item(LibModel):
                 clutter=beets.config["clutter"].as_str_seq(),
             )
 
-        self._db._memotable = {}
-
     def move(
         self,
         operation=MoveOperation.MOVE,
         basedir=None,
         with_album=True,
         store=True,
+        dest=None,
     ):
         """Move the item to its designated location within the library
         directory (provided by destination()).
@@ -1126,6 +1300,8 @@ class Item(LibModel):
         `util.MoveOperation`.
 
         `basedir` overrides the library base directory for the destination.
+        A `dest` that was already computed is used instead of calling
+        destination() again.
 
         If the item is in an album and `with_album` is `True`, the album is
         given an opportunity to move its art.
@@ -1136,7 +1312,8 @@ class Item(LibModel):
         If `store` is `False` however, the item won't be stored and it will
         have to be manually stored after invoking this method.
         """
-        dest = self.destination(basedir=basedir)
+        if dest is None:
+            dest = self.destination(basedir=basedir)
 
         # If the source file is missing, skip the move.
         if not self.filepath.exists():
@@ -1192,33 +1369,35 @@ class Item(LibModel):
         is true, returns just the fragment of the path underneath the library
         base directory.
         """
+        return self._destination(
+            self.db.parsed_path_formats(path_formats),
+            self.formatted(for_path=True),
+            relative_to_libdir,
+            basedir,
+        )
+
+    def _destination(
+        self,
+        path_formats: list[tuple[dbcore.Query | None, Template]],
+        mapping: FormattedMapping,
+        relative_to_libdir: bool,
+        basedir: bytes | None,
+    ) -> bytes:
+        """Get the destination of the item for the parsed `path_formats`,
+        with the template fields taken from the formatted `mapping`.
+        """
         basedir = basedir or self.db.directory
-        path_formats = path_formats or self.db.path_formats
 
-        # Use a path format based on a query, falling back on the
-        # default.
-        for query, path_format in path_formats:
-            if query == PF_KEY_DEFAULT:
-                continue
-            query, _ = parse_query_string(query, type(self))
-            if query.match(self):
-                # The query matches the item! Use the corresponding path
-                # format.
+        # Use the path format of the first query that matches the item;
+        # the default format comes last, without a query.
+        for query, subpath_tmpl in path_formats:
+            if query is None or query.match(self):
                 break
         else:
-            # No query matched; fall back to default.
-            for query, path_format in path_formats:
-                if query == PF_KEY_DEFAULT:
-                    break
-            else:
-                assert False, "no default path format"
-        if isinstance(path_format, Template):
-            subpath_tmpl = path_format
-        else:
-            subpath_tmpl = template(path_format)
+            assert False, "no default path format"
 
         # Evaluate the selected template.
-        subpath = self.evaluate_template(subpath_tmpl, True)
+        subpath = subpath_tmpl.substitute(mapping, self._template_funcs())
 
         # Prepare path for output: normalize Unicode characters.
         if sys.platform == "darwin":
@@ -1260,6 +1439,37 @@ def _int_arg(s):
     return int(s.strip())
 
 
+class TemplateFunctions(Mapping[str, Callable[..., str]]):
+    """The template functions available when evaluating a template for an
+    object.
+
+    The table of functions is shared by all objects of a model. Functions
+    that need the object are only bound to it when a template looks them
+    up.
+    """
+
+    def __init__(
+        self,
+        table: Mapping[str, tuple[Callable[..., str], bool]],
+        item=None,
+        lib=None,
+    ):
+        self._table = table
+        self._defaults = DefaultTemplateFunctions(item, lib)
+
+    def __getitem__(self, name: str) -> Callable[..., str]:
+        func, bind = self._table[name]
+        if bind:
+            return func.__get__(self._defaults)
+        return func
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
 class DefaultTemplateFunctions:
     """A container class for the default functions provided to path
     templates.
@@ -1297,6 +1507,19 @@ class DefaultTemplateFunctions:
             out[key[len(self._prefix) :]] = getattr(self, key)
         return out
 
+    @cached_classproperty
+    def unbound_functions(cls) -> dict[str, tuple[Callable[..., str], bool]]:
+        """The functions defined in this class by their names in templates,
+        with whether they need to be bound to an instance.
+        """
+        return {
+            key[len(cls._prefix) :]: (
+                getattr(cls, key),
+                not isinstance(inspect.getattr_static(cls, key), staticmethod),
+            )
+            for key in cls._func_names
+        }
+
     @staticmethod
     def tmpl_lower(s):
         """Convert a string to lower case."""
@@ -1366,7 +1589,6 @@ class DefaultTemplateFunctions:
         pair of characters to be used as brackets surrounding the
         disambiguator or empty to have no brackets.
         """
-        # Fast paths: no album, no item or library, or memoized value.
         if not self.item or not self.lib:
             return ""
 
@@ -1378,23 +1600,14 @@ class DefaultTemplateFunctions:
         if album_id is None:
             return ""
 
-        memokey = self._tmpl_unique_memokey("aunique", keys, disam, album_id)
-        memoval = self.lib._memotable.get(memokey)
-        if memoval is not None:
-            return memoval
-
-        album = self.lib.get_album(album_id)
-
         return self._tmpl_unique(
             "aunique",
             keys,
             disam,
             bracket,
             album_id,
-            album,
-            album.item_keys,
-            # Do nothing for singletons.
-            lambda a: a is None,
+            Album,
+            dbcore.query.TrueQuery(),
         )
 
     def tmpl_sunique(self, keys=None, disam=None, bracket=None):
@@ -1408,7 +1621,6 @@ class DefaultTemplateFunctions:
         pair of characters to be used as brackets surrounding the
         disambiguator or empty to have no brackets.
         """
-        # Fast paths: no album, no item or library, or memoized value.
         if not self.item or not self.lib:
             return ""
 
@@ -1417,7 +1629,8 @@ class DefaultTemplateFunctions:
         else:
             raise NotImplementedError("sunique is only implemented for items")
 
-        if item_id is None:
+        # Do nothing for non singletons.
+        if item_id is None or self.item.album_id is not None:
             return ""
 
         return self._tmpl_unique(
@@ -1426,26 +1639,19 @@ class DefaultTemplateFunctions:
             disam,
             bracket,
             item_id,
-            self.item,
-            Item.all_keys(),
-            # Do nothing for non singletons.
-            lambda i: i.album_id is not None,
+            Item,
+            dbcore.query.NoneQuery("album_id"),
         )
 
-    def _tmpl_unique_memokey(self, name, keys, disam, item_id):
-        """Get the memokey for the unique template named "name" for the
-        specific parameters.
-        """
-        return (name, keys, disam, item_id)
-
     def _tmpl_unique(
-        self, name, keys, disam, bracket, item_id, db_item, item_keys, skip_item
+        self, name, keys, disam, bracket, obj_id, model_cls, query
     ):
-        """Generate a string that is guaranteed to be unique among all items of
-        the same type as "db_item" who share the same set of keys.
+        """Generate a string that is guaranteed to be unique among all
+        objects of `model_cls` matching `query` who share the same set of
+        keys.
 
         A field from "disam" is used in the string if one is sufficient to
-        disambiguate the items. Otherwise, a fallback opaque value is
+        disambiguate the objects. Otherwise, a fallback opaque value is
         used. Both "keys" and "disam" should be given as
         whitespace-separated lists of field names, while "bracket" is a
         pair of characters to be used as brackets surrounding the
@@ -1455,27 +1661,13 @@ class DefaultTemplateFunctions:
         configuration section where the default values of the parameters
         are stored.
 
-        "skip_item" is a function that must return True when the template
-        should return an empty string.
-
-        "initial_subqueries" is a list of subqueries that should be included
-        in the query to find the ambiguous items.
+        The disambiguators are looked up in an index of the library, see
+        :meth:`Library.unique_index`.
         """
-        memokey = self._tmpl_unique_memokey(name, keys, disam, item_id)
-        memoval = self.lib._memotable.get(memokey)
-        if memoval is not None:
-            return memoval
-
-        if skip_item(db_item):
-            self.lib._memotable[memokey] = ""
-            return ""
-
         keys = keys or beets.config[name]["keys"].as_str()
         disam = disam or beets.config[name]["disambiguators"].as_str()
         if bracket is None:
             bracket = beets.config[name]["bracket"].as_str()
-        keys = keys.split()
-        disam = disam.split()
 
         # Assign a left and right bracket or leave blank if argument is empty.
         if len(bracket) == 2:
@@ -1485,47 +1677,18 @@ class DefaultTemplateFunctions:
             bracket_l = ""
             bracket_r = ""
 
-        # Find matching items to disambiguate with.
-        query = db_item.duplicates_query(keys)
-        ambigous_items = (
-            self.lib.items(query)
-            if isinstance(db_item, Item)
-            else self.lib.albums(query)
+        index = self.lib.unique_index(
+            model_cls, query, tuple(keys.split()), tuple(disam.split())
         )
-
-        # If there's only one item to matching these details, then do
-        # nothing.
-        if len(ambigous_items) == 1:
-            self.lib._memotable[memokey] = ""
-            return ""
-
-        # Find the first disambiguator that distinguishes the items.
-        for disambiguator in disam:
-            # Get the value for each item for the current field.
-            disam_values = {s.get(disambiguator, "") for s in ambigous_items}
-
-            # If the set of unique values is equal to the number of
-            # items in the disambiguation set, we're done -- this is
-            # sufficient disambiguation.
-            if len(disam_values) == len(ambigous_items):
-                break
-        else:
+        disam_value = index.get(obj_id)
+        if disam_value is None:
             # No disambiguator distinguished all fields.
-            res = f" {bracket_l}{item_id}{bracket_r}"
-            self.lib._memotable[memokey] = res
-            return res
-
-        # Flatten disambiguation value into a string.
-        disam_value = db_item.formatted(for_path=True).get(disambiguator)
+            return f" {bracket_l}{obj_id}{bracket_r}"
 
         # Return empty string if disambiguator is empty.
         if disam_value:
-            res = f" {bracket_l}{disam_value}{bracket_r}"
-        else:
-            res = ""
-
-        self.lib._memotable[memokey] = res
-        return res
+            return f" {bracket_l}{disam_value}{bracket_r}"
+        return ""
 
     @staticmethod
     def tmpl_first(s, count=1, skip=0, sep="; ", join_str="; "):
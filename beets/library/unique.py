@@ -0,0 +1,176 @@
+"""Precomputed disambiguators for the ``%aunique`` and ``%sunique``
+template functions.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import islice
+from typing import TYPE_CHECKING, Any
+
+from beets.dbcore.query import InQuery
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from beets.dbcore import Query
+
+    from .library import Library
+    from .models import LibModel
+
+
+def _hashable(value: Any) -> Any:
+    """Make a field value usable as a dictionary key."""
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class UniqueIndex:
+    """The disambiguators of all objects of `model_cls` that match
+    `query` and share the values of the `keys` fields with another such
+    object.
+
+    The index is built with one grouping query over the whole table, so
+    that looking up an object takes no queries at all. It is rebuilt when
+    objects have been added or removed or any of the `keys` and `disam`
+    fields have changed since.
+    """
+
+    batch_size = 500
+
+    def __init__(
+        self,
+        lib: Library,
+        model_cls: type[LibModel],
+        query: Query,
+        keys: Sequence[str],
+        disam: Sequence[str],
+    ):
+        self.lib = lib
+        self.model_cls = model_cls
+        self.query = query
+        self.keys = list(keys)
+        self.disam = list(disam)
+        self._fields = {*self.keys, *self.disam}
+        self._computed = not self._fields.isdisjoint(model_cls._getters())
+        self._revision: int | None = None
+        self._write_count = 0
+        self._values: dict[int, str | None] = {}
+
+    def get(self, id_: int) -> str | None:
+        """Get the formatted value of the disambiguator of the object
+        with `id_`, an empty string if it needs none, or None if none of
+        the `disam` fields tells it apart from its duplicates.
+        """
+        self._validate()
+        return self._values.get(id_, "")
+
+    def _validate(self):
+        """Rebuild the index if the database has changed in a way that
+        may affect it.
+        """
+        revision = self.lib.revision
+        if revision == self._revision:
+            return
+
+        write_count = self.lib.write_count
+        # The fields a computed field depends on are unknown.
+        fields = None if self._computed else self._fields
+        if self._revision is None or self.lib.fields_changed(
+            self._write_count, fields
+        ):
+            self._values = self._build()
+        self._revision = revision
+        self._write_count = write_count
+
+    def _build(self) -> dict[int, str | None]:
+        values: dict[int, str | None] = {}
+        groups = self._sql_groups()
+        if groups is None:
+            groups = self._python_groups()
+        for group in groups:
+            for obj, value in self._disambiguate(group):
+                values[obj.id] = value
+        return values
+
+    def _key_expression(self, key: str) -> str | None:
+        """Get an SQL expression for the value of `key`, or None if it
+        can only be computed in Python.
+        """
+        model_cls = self.model_cls
+        table = model_cls._table
+        if key in self.lib._table_columns(model_cls):
+            return f"{table}.{key}"
+        if model_cls._is_flex_field(key):
+            name = key.replace("'", "''")
+            values = [
+                f"(SELECT {attr.value} FROM {attr.table} "
+                f"WHERE {attr.table}.entity_id = {attr.entity_id} "
+                f"AND {attr.table}.key = '{name}')"
+                for attr in model_cls._flex_attributes(key)
+            ]
+            if len(values) == 1:
+                return values[0]
+            return f"COALESCE({', '.join(values)})"
+        return None
+
+    def _sql_groups(self) -> list[list[LibModel]] | None:
+        """Find the groups of duplicates with a single grouping query, or
+        return None if a key cannot be evaluated in SQL.
+        """
+        expressions = [self._key_expression(key) for key in self.keys]
+        where, subvals = self.query.clause()
+        if None in expressions or where is None:
+            return None
+
+        table = self.model_cls._table
+        columns = "".join(
+            f", {expr} AS k{i}" for i, expr in enumerate(expressions)
+        )
+        group_by = ", ".join(f"k{i}" for i in range(len(expressions)))
+        with self.lib.transaction(read_only=True) as tx:
+            rows = tx.query(
+                f"""
+                SELECT group_concat(id)
+                FROM (SELECT {table}.id AS id{columns} FROM {table}
+                      WHERE {where})
+                GROUP BY {group_by or "NULL"}
+                HAVING COUNT(*) > 1
+                """,
+                subvals,
+            )
+        id_groups = [[int(i) for i in row[0].split(",")] for row in rows]
+
+        objs: dict[int, LibModel] = {}
+        ids = iter(sorted(i for group in id_groups for i in group))
+        while batch := list(islice(ids, self.batch_size)):
+            for obj in self.lib._fetch(self.model_cls, InQuery("id", batch)):
+                objs[obj.id] = obj
+        return [[objs[i] for i in group] for group in id_groups]
+
+    def _python_groups(self) -> list[list[LibModel]]:
+        """Find the groups of duplicates by reading all objects."""
+        groups: defaultdict[tuple, list[LibModel]] = defaultdict(list)
+        for obj in self.lib._fetch(self.model_cls, self.query, stream=True):
+            key = tuple(_hashable(obj.get(k)) for k in self.keys)
+            groups[key].append(obj)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def _disambiguate(
+        self, group: list[LibModel]
+    ) -> Iterable[tuple[LibModel, str | None]]:
+        """Find the first disambiguator that tells all objects of `group`
+        apart and get its formatted value for each of them.
+        """
+        for disambiguator in self.disam:
+            values = {_hashable(obj.get(disambiguator, "")) for obj in group}
+            if len(values) == len(group):
+                break
+        else:
+            return ((obj, None) for obj in group)
+
+        return (
+            (obj, obj.formatted(for_path=True).get(disambiguator))
+            for obj in group
+        )
@@ -31,7 +31,7 @@ from typing_extensions import ParamSpec
 
 import beets
 from beets import logging
-from beets.util import unique_list
+from beets.util import cached_classproperty, unique_list
 from beets.util.deprecation import deprecate_for_maintainers, deprecate_for_user
 
 if TYPE_CHECKING:
@@ -471,6 +471,9 @@ def load_plugins() -> None:
         names = get_plugin_names()
         log.debug("Loading plugins: {}", ", ".join(sorted(names)))
         _instances.extend(filter(None, map(_get_plugin, names)))
+        # Forget what was derived from the plugins loaded so far, such as
+        # the field types and template functions of the models.
+        cached_classproperty.cache.clear()
 
         send("pluginload")
 
@@ -35,8 +35,9 @@ import confuse
 from beets import config, library, logging, plugins, util
 from beets.dbcore import db
 from beets.dbcore import query as db_query
+from beets.dbcore.profile import SQLProfiler
 from beets.exceptions import UserError
-from beets.util import as_string
+from beets.util import as_string, functemplate
 from beets.util.color import colorize
 from beets.util.deprecation import deprecate_for_maintainers
 from beets.util.diff import get_model_changes
@@ -775,9 +776,17 @@ def _setup(
     Returns a list of subcommands, a list of plugins, and a library instance.
     """
     config = _configure(options)
+    _configure_template_cache(config)
 
     plugins.load_plugins()
 
+    # Promote the configured fields once the plugins have declared their
+    # types, and before the library creates their columns.
+    for model_cls in (library.Item, library.Album):
+        model_cls.promote_fields(
+            config["promote_fields"][model_cls._table].as_str_seq()
+        )
+
     # Get the default subcommands.
     from beets.ui.commands import default_commands
 
@@ -827,6 +836,15 @@ def _configure(options):
     return config
 
 
+def _configure_template_cache(config: confuse.LazyConfig):
+    """Set up the caching of compiled templates from the configuration."""
+    cache_config = config["template_cache"]
+    directory = None
+    if cache_config["directory"].get():
+        directory = cache_config["directory"].as_filename()
+    functemplate.configure_cache(cache_config["size"].get(int), directory)
+
+
 def _ensure_db_directory_exists(path):
     if path == b":memory:":  # in memory db
         return
@@ -860,6 +878,47 @@ def _open_library(config: confuse.LazyConfig) -> library.Library:
     return lib
 
 
+def _show_sql_profile(profiler: SQLProfiler, limit: int = 20) -> None:
+    """Log a summary of the SQL statements recorded by `profiler`, the
+    slowest first, and of the queries that were evaluated in Python.
+    """
+    summary = profiler.summary()
+    lines = [
+        (
+            f"SQL profile: {len(summary)} statements, "
+            f"{sum(s.calls for s in summary)} executions, "
+            f"{sum(s.time for s in summary):.3f} seconds"
+        ),
+        (
+            f"{'calls':>7} {'total ms':>9} {'mean ms':>8} {'binds':>7} "
+            f"{'rows':>7}  statement"
+        ),
+    ]
+    for stats in summary[:limit]:
+        rows = "-" if stats.rows is None else stats.rows
+        statement = " ".join(stats.statement.split())
+        lines.append(
+            f"{stats.calls:>7} {stats.time * 1000:>9.2f} "
+            f"{stats.mean_time * 1000:>8.3f} {stats.binds:>7} {rows:>7}  "
+            f"{textwrap.shorten(statement, 100, placeholder=' ...')}"
+        )
+        lines.extend(
+            f"{'':>44}plan: {detail}"
+            for detail in profiler.plans.get(stats.statement, ())
+        )
+    if len(summary) > limit:
+        lines.append(f"... and {len(summary) - limit} more statements")
+
+    if profiler.slow_queries:
+        lines.append("Evaluated in Python:")
+        lines.extend(
+            f"{count:>7}  {description}"
+            for description, count in profiler.slow_queries.most_common()
+        )
+
+    log.info("{}", "\n".join(lines))
+
+
 def _raw_main(args: list[str] | None) -> None:
     """A helper function for `main` without top-level exception
     handling.
@@ -913,6 +972,18 @@ def _raw_main(args: list[str] | None) -> None:
         callback=parse_csl_callback,
         help="a comma-separated list of plugins to disable",
     )
+    parser.add_option(
+        "--sql-profile",
+        dest="sql_profile",
+        action="store_true",
+        help="show a summary of the SQL statements run by the command",
+    )
+    parser.add_option(
+        "--sql-explain",
+        dest="sql_explain",
+        action="store_true",
+        help="like --sql-profile, and show the query plan of each SELECT",
+    )
     parser.add_option(
         "-h",
         "--help",
@@ -943,12 +1014,16 @@ def _raw_main(args: list[str] | None) -> None:
 
     subcommands, lib = _setup(options)
     parser.add_subcommand(*subcommands)
+    if options.sql_profile or options.sql_explain:
+        lib.profiler = SQLProfiler(explain=bool(options.sql_explain))
 
     subcommand, suboptions, subargs = parser.parse_subcommand(subargs)
     subcommand.func(lib, suboptions, subargs)
 
     plugins.send("cli_exit", lib=lib)
     lib._close()
+    if lib.profiler:
+        _show_sql_profile(lib.profiler)
     return None
 
 
@@ -18,8 +18,10 @@ interface.
 
 from beets.util.deprecation import deprecate_imports
 
+from .changes import changes_cmd
 from .completion import completion_cmd
 from .config import config_cmd
+from .db import db_cmd
 from .fields import fields_cmd
 from .help import HelpCommand
 from .import_ import import_cmd
@@ -61,6 +63,8 @@ default_commands = [
     write_cmd,
     config_cmd,
     completion_cmd,
+    db_cmd,
+    changes_cmd,
 ]
 
 
@@ -0,0 +1,52 @@
+"""The `changes` command: show the journal of library changes."""
+
+from beets import ui
+
+
+def changes_func(lib, opts, args):
+    if not lib.change_journal:
+        raise ui.UserError(
+            "there is no change journal, enable the change_journal option"
+        )
+
+    if opts.remove:
+        lib.remove_changes()
+        ui.print_("Removed the change journal.")
+        return
+
+    if opts.compact:
+        removed = lib.compact_changes()
+        ui.print_(f"Removed {removed} merged changes.")
+        return
+
+    for change in lib.changes(opts.since):
+        line = f"{change.revision} {change.op} {change.table} {change.id}"
+        if change.fields is not None:
+            line += f" {' '.join(change.fields)}"
+        ui.print_(line)
+
+
+changes_cmd = ui.Subcommand(
+    "changes", help="show the items and albums changed since a revision"
+)
+changes_cmd.parser.add_option(
+    "-s",
+    "--since",
+    type="int",
+    default=0,
+    metavar="REV",
+    help="only show the changes made after revision REV",
+)
+changes_cmd.parser.add_option(
+    "-c",
+    "--compact",
+    action="store_true",
+    help="merge the changes of each item or album into one",
+)
+changes_cmd.parser.add_option(
+    "-r",
+    "--remove",
+    action="store_true",
+    help="remove the journal, until change_journal is enabled again",
+)
+changes_cmd.func = changes_func
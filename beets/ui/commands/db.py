@@ -0,0 +1,53 @@
+"""The `db` command: tune the library database."""
+
+from beets import ui
+from beets.exceptions import UserError
+
+
+def show_indices(lib, create, min_count):
+    """Show the indices suggested for the recorded queries and optionally
+    create them.
+    """
+    suggestions = lib.suggest_indices(min_count)
+    if not suggestions:
+        ui.print_("No indices to suggest.")
+        return
+
+    for table, index, count in suggestions:
+        columns = ", ".join(index.columns)
+        ui.print_(f"{index.name}: {table} ({columns}), {count} queries")
+
+    if create:
+        lib.create_indices(suggestions)
+        lib.analyze()
+        ui.print_(f"Created {len(suggestions)} indices.")
+
+
+def db_func(lib, opts, args):
+    if args == ["index"]:
+        show_indices(lib, opts.create, opts.min_count)
+    elif args == ["analyze"]:
+        lib.analyze()
+    elif args == ["remove-search-index"]:
+        lib.remove_fts_tables()
+    else:
+        raise UserError(
+            "expected one of the actions: index, analyze, remove-search-index"
+        )
+
+
+db_cmd = ui.Subcommand(
+    "db", help="suggest indices and gather statistics for the database"
+)
+db_cmd.parser.usage += " (index | analyze | remove-search-index)"
+db_cmd.parser.add_option(
+    "-c", "--create", action="store_true", help="create the suggested indices"
+)
+db_cmd.parser.add_option(
+    "-m",
+    "--min-count",
+    type="int",
+    default=1,
+    help="only suggest indices for queries run at least COUNT times",
+)
+db_cmd.func = db_func
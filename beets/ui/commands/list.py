@@ -1,6 +1,6 @@
 """The 'list' command: query and show library contents."""
 
-from beets import ui
+from beets import library, ui
 
 
 def list_items(lib, query, album, fmt=""):
@@ -8,10 +8,12 @@ def list_items(lib, query, album, fmt=""):
     albums instead of single items.
     """
     if album:
-        for album in lib.albums(query):
+        fields = library.Album.format_fields(fmt)
+        for album in lib.albums(query, stream=True, fields=fields):
             ui.print_(format(album, fmt))
     else:
-        for item in lib.items(query):
+        fields = library.Item.format_fields(fmt)
+        for item in lib.items(query, stream=True, fields=fields):
             ui.print_(format(item, fmt))
 
 
@@ -61,8 +61,15 @@ def modify_items(lib, mods, dels, query, write, move, album, confirm, inherit):
 
     # Apply changes to database and files
     with lib.transaction():
-        for obj in changed:
-            obj.try_sync(write, move, inherit)
+        if album or move:
+            for obj in changed:
+                obj.try_sync(write, move, inherit)
+        else:
+            # Items that stay in place can be stored all at once.
+            if write:
+                for obj in changed:
+                    obj.try_write()
+            lib.store_many(changed)
 
 
 def print_and_modify(obj, mods, dels):
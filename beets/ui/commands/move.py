@@ -79,14 +79,24 @@ def move_items(
     objs = albums if album else items
     num_objs = len(objs)
 
-    # Filter out files that don't need to be moved.
-    def isitemmoved(item):
-        return item.path != item.destination(basedir=dest)
-
-    def isalbummoved(album):
-        return any(isitemmoved(i) for i in album.items())
-
-    objs = [o for o in objs if (isalbummoved if album else isitemmoved)(o)]
+    # Filter out files that don't need to be moved. The destinations are
+    # kept so that the files are moved without computing them again.
+    if album:
+        pairs = {
+            a.id: list(lib.destinations(a.items(), basedir=dest)) for a in objs
+        }
+        dests = {a.id: {i.id: p for i, p in pairs[a.id]} for a in objs}
+    else:
+        pairs = {
+            i.id: [(i, p)] for i, p in lib.destinations(objs, basedir=dest)
+        }
+        dests = {i.id: p for [(i, p)] in pairs.values()}
+    changes = {
+        obj_id: [(i.path, p) for i, p in obj_pairs if i.path != p]
+        for obj_id, obj_pairs in pairs.items()
+    }
+    objs = [o for o in objs if changes[o.id]]
+    path_changes = [change for o in objs for change in changes[o.id]]
     num_unmoved = num_objs - len(objs)
     # Report unmoved files that match the query.
     unmoved_msg = ""
@@ -109,42 +119,37 @@ def move_items(
         return
 
     if pretend:
-        if album:
-            show_path_changes(
-                [
-                    (item.path, item.destination(basedir=dest))
-                    for obj in objs
-                    for item in obj.items()
-                ]
-            )
-        else:
-            show_path_changes(
-                [(obj.path, obj.destination(basedir=dest)) for obj in objs]
-            )
+        show_path_changes(path_changes)
     else:
         if confirm:
             objs = ui.input_select_objects(
                 f"Really {act}",
                 objs,
-                lambda o: show_path_changes(
-                    [(o.path, o.destination(basedir=dest))]
-                ),
+                lambda o: show_path_changes(changes[o.id]),
             )
 
         for obj in objs:
             log.debug("moving: {.filepath}", obj)
 
+            kwargs = {"dests" if album else "dest": dests[obj.id]}
             if export:
                 # Copy without affecting the database.
                 obj.move(
-                    operation=MoveOperation.COPY, basedir=dest, store=False
+                    operation=MoveOperation.COPY,
+                    basedir=dest,
+                    store=False,
+                    **kwargs,
                 )
             else:
                 # Ordinary move/copy: store the new path.
                 if copy:
-                    obj.move(operation=MoveOperation.COPY, basedir=dest)
+                    obj.move(
+                        operation=MoveOperation.COPY, basedir=dest, **kwargs
+                    )
                 else:
-                    obj.move(operation=MoveOperation.MOVE, basedir=dest)
+                    obj.move(
+                        operation=MoveOperation.MOVE, basedir=dest, **kwargs
+                    )
 
 
 def move_func(lib, opts, args):
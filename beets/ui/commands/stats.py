@@ -2,7 +2,8 @@
 
 import os
 
-from beets import logging, ui
+from beets import library, logging, ui
+from beets.dbcore.aggregate import Count, CountDistinct, Sum
 from beets.util import syspath
 from beets.util.units import human_bytes, human_seconds
 
@@ -10,31 +11,47 @@ from beets.util.units import human_bytes, human_seconds
 log = logging.getLogger("beets")
 
 
+class ApproximateSize(Sum):
+    """The total size of items, estimated from their length and bitrate."""
+
+    def operand(self, model_cls):
+        return "CAST(length * bitrate / 8 AS INTEGER)"
+
+    def value(self, item):
+        return int(item.length * item.bitrate / 8)
+
+    def array(self, columns):
+        length, bitrate = columns.get("length"), columns.get("bitrate")
+        if length is None or bitrate is None:
+            return None
+        return (length * bitrate / 8).astype(int)
+
+
 def show_stats(lib, query, exact):
     """Shows some statistics about the matched items."""
-    items = lib.items(query)
-
-    total_size = 0
-    total_time = 0.0
-    total_items = 0
-    artists = set()
-    albums = set()
-    album_artists = set()
+    aggregates = {
+        "items": Count(),
+        "time": Sum("length"),
+        "artists": CountDistinct("artist"),
+        "albums": CountDistinct("album_id"),
+        "album_artists": CountDistinct("albumartist"),
+    }
+    if not exact:
+        aggregates["size"] = ApproximateSize()
+    stats = lib.aggregate(library.Item, query, aggregates)
 
-    for item in items:
-        if exact:
+    if exact:
+        # File sizes are only known to the file system.
+        total_size = 0
+        for item in lib.items(query, stream=True):
             try:
                 total_size += os.path.getsize(syspath(item.path))
             except OSError as exc:
                 log.info("could not get size of {.path}: {}", item, exc)
-        else:
-            total_size += int(item.length * item.bitrate / 8)
-        total_time += item.length
-        total_items += 1
-        artists.add(item.artist)
-        album_artists.add(item.albumartist)
-        if item.album_id:
-            albums.add(item.album_id)
+    else:
+        total_size = stats["size"]
+    total_time = stats["time"]
+    total_items = stats["items"]
 
     size_str = human_bytes(total_size)
     if exact:
@@ -44,9 +61,9 @@ def show_stats(lib, query, exact):
 Total time: {human_seconds(total_time)}
 {f" ({total_time:.2f} seconds)" if exact else ""}
 {"Total size" if exact else "Approximate total size"}: {size_str}
-Artists: {len(artists)}
-Albums: {len(albums)}
-Album artists: {len(album_artists)}""")
+Artists: {stats["artists"]}
+Albums: {stats["albums"]}
+Album artists: {stats["album_artists"]}""")
 
 
 def stats_func(lib, opts, args):
@@ -11,6 +11,9 @@ from .utils import do_query
 # Global logger.
 log = logging.getLogger("beets")
 
+# The number of updated items saved together.
+STORE_BATCH_SIZE = 100
+
 
 def update_items(lib, query, album, move, pretend, fields, exclude_fields=None):
     """For all the items matched by the query, update the library to
@@ -45,58 +48,69 @@ def update_items(lib, query, album, move, pretend, fields, exclude_fields=None):
 
         # Walk through the items and pick up their changes.
         affected_albums = set()
-        for item in items:
-            # Item deleted?
-            if not item.path or not os.path.exists(syspath(item.path)):
-                ui.print_(format(item))
-                ui.print_(colorize("text_error", "  deleted"))
-                if not pretend:
-                    item.remove(True)
-                affected_albums.add(item.album_id)
-                continue
-
-            # Did the item change since last checked?
-            if item.current_mtime() <= item.mtime:
-                log.debug(
-                    "skipping {0.filepath} because mtime is up to date ({0.mtime})",
-                    item,
-                )
-                continue
-
-            # Read new data.
-            try:
-                item.read()
-            except library.ReadError as exc:
-                log.error("error reading {.filepath}: {}", item, exc)
-                continue
-
-            # Special-case album artist when it matches track artist. (Hacky
-            # but necessary for preserving album-level metadata for non-
-            # autotagged imports.)
-            if not item.albumartist:
-                old_item = lib.get_item(item.id)
-                if old_item.albumartist == old_item.artist == item.artist:
-                    item.albumartist = old_item.albumartist
-                    item._dirty.discard("albumartist")
-
-            # Check for and display changes.
-            changed = ui.show_model_changes(item, fields=item_fields)
-
-            # Save changes.
-            if not pretend:
-                if changed:
-                    # Move the item if it's in the library.
-                    if move and lib.directory in ancestry(item.path):
-                        item.move(store=False)
-
-                    item.store(fields=item_fields)
+        pending = []
+
+        def flush():
+            if pending:
+                lib.store_many(pending, fields=item_fields)
+                pending.clear()
+
+        try:
+            for item in items:
+                # Item deleted?
+                if not item.path or not os.path.exists(syspath(item.path)):
+                    ui.print_(format(item))
+                    ui.print_(colorize("text_error", "  deleted"))
+                    if not pretend:
+                        item.remove(True)
                     affected_albums.add(item.album_id)
-                else:
-                    # The file's mtime was different, but there were no
-                    # changes to the metadata. Store the new mtime,
-                    # which is set in the call to read(), so we don't
-                    # check this again in the future.
-                    item.store(fields=item_fields)
+                    continue
+
+                # Did the item change since last checked?
+                if item.current_mtime() <= item.mtime:
+                    log.debug(
+                        "skipping {0.filepath} because mtime is up to date ({0.mtime})",
+                        item,
+                    )
+                    continue
+
+                # Read new data.
+                try:
+                    item.read()
+                except library.ReadError as exc:
+                    log.error("error reading {.filepath}: {}", item, exc)
+                    continue
+
+                # Special-case album artist when it matches track artist. (Hacky
+                # but necessary for preserving album-level metadata for non-
+                # autotagged imports.)
+                if not item.albumartist:
+                    old_item = lib.get_item(item.id)
+                    if old_item.albumartist == old_item.artist == item.artist:
+                        item.albumartist = old_item.albumartist
+                        item._dirty.discard("albumartist")
+
+                # Check for and display changes.
+                changed = ui.show_model_changes(item, fields=item_fields)
+
+                # Save changes.
+                if not pretend:
+                    if changed:
+                        # Move the item if it's in the library.
+                        if move and lib.directory in ancestry(item.path):
+                            item.move(store=False)
+
+                        affected_albums.add(item.album_id)
+                    # If there were no changes to the metadata, storing still
+                    # saves the new mtime, which is set in the call to read(), so
+                    # we don't check this again in the future.
+                    pending.append(item)
+                    if len(pending) >= STORE_BATCH_SIZE:
+                        flush()
+        finally:
+            # Save the items that have been read or moved so far, even if
+            # the update is interrupted.
+            flush()
 
         # Skip album changes while pretending.
         if pretend:
@@ -125,7 +139,7 @@ def update_items(lib, query, album, move, pretend, fields, exclude_fields=None):
                 items = list(album.items())
                 for item in items:
                     item.move(store=False, with_album=False)
-                    item.store(fields=item_fields)
+                lib.store_many(items, fields=item_fields)
                 album.move(store=False)
                 album.store(fields=album_fields)
 
@@ -29,9 +29,16 @@ engine like Jinja2 or Mustache.
 import ast
 import dis
 import functools
+import hashlib
+import marshal
+import os
 import re
+import sys
+import tempfile
 import types
 
+import beets
+
 SYMBOL_DELIM = "$"
 FUNC_DELIM = "%"
 GROUP_OPEN = "{"
@@ -89,6 +96,13 @@ def compile_func(arg_names, statements, name="_the_func", debug=False):
     the resulting Python function. If `debug`, then print out the
     bytecode of the compiled function.
     """
+    return load_func(compile_module(arg_names, statements, name, debug), name)
+
+
+def compile_module(arg_names, statements, name="_the_func", debug=False):
+    """Compile a list of statements as the body of a function and return
+    the code of a module defining the function as `name`.
+    """
     args_fields = {
         "args": [ast.arg(arg=n, annotation=None) for n in arg_names],
         "kwonlyargs": [],
@@ -115,6 +129,13 @@ def compile_func(arg_names, statements, name="_the_func", debug=False):
             if isinstance(const, types.CodeType):
                 dis.dis(const)
 
+    return prog
+
+
+def load_func(prog, name="_the_func"):
+    """Run the module code `prog` and return the function it defines as
+    `name`.
+    """
     the_locals = {}
     exec(prog, {}, the_locals)
     return the_locals[name]
@@ -508,9 +529,81 @@ def _parse(template):
     return Expression(parts)
 
 
-@functools.lru_cache(maxsize=128)
+# Caching of compiled templates.
+
+_cache_dir = None
+
+
+def _cache_path(template):
+    """Get the path of the file holding the compiled `template` in the
+    persistent cache, or None if there is no persistent cache.
+    """
+    if _cache_dir is None:
+        return None
+    key = "\0".join([beets.__version__, sys.implementation.cache_tag, template])
+    digest = hashlib.sha256(key.encode("utf-8", "surrogatepass")).hexdigest()
+    return os.path.join(_cache_dir, f"{digest}.bin")
+
+
+def _load_compiled(template):
+    """Get the module code, variable names and function names of the
+    compiled `template` from the persistent cache, or None if it is not
+    cached.
+    """
+    path = _cache_path(template)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            compiled = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (
+        isinstance(compiled, tuple)
+        and len(compiled) == 3
+        and isinstance(compiled[0], types.CodeType)
+    ):
+        return compiled
+    return None
+
+
+def _store_compiled(template, compiled):
+    """Write the compiled `template` to the persistent cache, if any.
+    Failures are ignored: the template is just compiled again next time.
+    """
+    path = _cache_path(template)
+    if path is None:
+        return
+    try:
+        os.makedirs(_cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=_cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump(compiled, f)
+        # Replace atomically so that concurrent readers never see a
+        # partially written file.
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        pass
+
+
+_template = functools.lru_cache(maxsize=128)(lambda fmt: Template(fmt))
+
+
+def configure_cache(size=128, directory=None):
+    """Keep up to `size` templates returned by `template` in memory and,
+    if `directory` is given, store the compiled templates in it so that
+    other processes do not need to compile them again.
+    """
+    global _template, _cache_dir
+    _template = functools.lru_cache(maxsize=size)(lambda fmt: Template(fmt))
+    _cache_dir = directory
+
+
 def template(fmt):
-    return Template(fmt)
+    """Get a :class:`Template` for the format string `fmt`, reusing
+    recently created ones.
+    """
+    return _template(fmt)
 
 
 # External interface.
@@ -520,11 +613,23 @@ class Template:
     def __init__(self, template):
         self.expr = _parse(template)
         self.original = template
-        self.compiled = self.translate()
+        try:
+            self.compiled = self.translate()
+        except Exception:
+            # Some templates cannot be compiled, e.g. because they are
+            # nested too deeply. The interpreter can still evaluate them.
+            self.compiled = self.interpret
 
     def __eq__(self, other):
         return self.original == other.original
 
+    @functools.cached_property
+    def symbols(self):
+        """The names of the variables used by the template, including
+        those in function arguments.
+        """
+        return self.expr.translate()[1]
+
     def interpret(self, values={}, functions={}):
         """Like `substitute`, but forces the interpreter (rather than
         the compiled version) to be used. The interpreter includes
@@ -543,25 +648,39 @@ class Template:
         return res
 
     def translate(self):
-        """Compile the template to a Python function."""
-        expressions, varnames, funcnames = self.expr.translate()
+        """Compile the template to a Python function.
 
-        argnames = []
-        for varname in varnames:
-            argnames.append(f"{VARIABLE_PREFIX}{varname}")
-        for funcname in funcnames:
-            argnames.append(f"{FUNCTION_PREFIX}{funcname}")
+        The compiled code is read from the persistent cache if it is
+        there, see :func:`configure_cache`.
+        """
+        if (compiled := _load_compiled(self.original)) is None:
+            expressions, varnames, funcnames = self.expr.translate()
 
-        func = compile_func(
-            argnames, [ast.Return(ast.List(expressions, ast.Load()))]
-        )
+            argnames = []
+            for varname in varnames:
+                argnames.append(f"{VARIABLE_PREFIX}{varname}")
+            for funcname in funcnames:
+                argnames.append(f"{FUNCTION_PREFIX}{funcname}")
+
+            prog = compile_module(
+                argnames, [ast.Return(ast.List(expressions, ast.Load()))]
+            )
+            compiled = (prog, varnames, funcnames)
+            _store_compiled(self.original, compiled)
+
+        prog, varnames, funcnames = compiled
+        func = load_func(prog)
+
+        # Resolve the argument names of the compiled function once.
+        var_args = [(f"{VARIABLE_PREFIX}{n}", n) for n in varnames]
+        func_args = [(f"{FUNCTION_PREFIX}{n}", n) for n in funcnames]
 
         def wrapper_func(values={}, functions={}):
             args = {}
-            for varname in varnames:
-                args[f"{VARIABLE_PREFIX}{varname}"] = values[varname]
-            for funcname in funcnames:
-                args[f"{FUNCTION_PREFIX}{funcname}"] = functions[funcname]
+            for argname, varname in var_args:
+                args[argname] = values[varname]
+            for argname, funcname in func_args:
+                args[argname] = functions[funcname]
             parts = func(**args)
             return "".join(parts)
 
@@ -56,8 +56,7 @@ def libtree(lib: Library) -> Node:
     child node tuples.
     """
     root = Node({}, {})
-    for item in lib.items():
-        dest = item.destination(relative_to_libdir=True)
+    for item, dest in lib.destinations(lib.items(), relative_to_libdir=True):
         parts = util.components(util.as_string(dest))
         _insert(root, parts, item.id)
     return root
@@ -218,8 +218,8 @@ class AURADocument:
 
         Args:
             collection: The raw data from which resource objects can be
-                built. Could be an sqlite3.Cursor object (tracks and
-                albums) or a list of strings (artists).
+                built. Could be a beets Results object (tracks and albums)
+                or a list of strings (artists).
         """
         # Pages start from zero
         page = self.args.get("page", 0, int)
@@ -248,8 +248,8 @@ class AURADocument:
                 )
         # Get only the items in the page range
         data = [
-            self.get_resource_object(self.lib, collection[i])
-            for i in range(start, end)
+            self.get_resource_object(self.lib, obj)
+            for obj in collection[start:end]
         ]
         return data, next_url
 
@@ -369,7 +369,7 @@ class TrackDocument(AURADocument):
             query: A beets Query object or a beets query string.
             sort: A beets Sort object.
         """
-        return self.lib.items(query, sort)
+        return self.lib.items(query, sort, stream=True)
 
     @classmethod
     def get_attribute_converter(cls, beets_attr: str) -> type[SQLiteType]:
@@ -449,7 +449,7 @@ class AlbumDocument(AURADocument):
             query: A beets Query object or a beets query string.
             sort: A beets Sort object.
         """
-        return self.lib.albums(query, sort)
+        return self.lib.albums(query, sort, stream=True)
 
     @staticmethod
     def get_resource_object(lib: Library, album):
@@ -43,6 +43,13 @@ class BareascQuery(StringFieldQuery[str]):
         val = unidecode(val)
         return pattern in val
 
+    def string_test(self):
+        smartcase = self.pattern.islower()
+        pattern = unidecode(self.pattern)
+        return lambda val: (
+            pattern in unidecode(val.lower() if smartcase else val)
+        )
+
     def col_clause(self):
         """Compare ascii version of the pattern."""
         clause = f"unidecode({self.field})"
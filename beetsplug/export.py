@@ -18,6 +18,7 @@ import csv
 import json
 import sys
 from datetime import date, datetime
+from functools import partial
 from xml.etree import ElementTree
 
 import mediafile
@@ -131,15 +132,15 @@ class ExportPlugin(BeetsPlugin):
             file_type=file_format, file_path=file_path, file_mode=file_mode
         )
 
-        if opts.library or opts.album:
-            data_collector = library_data
-        else:
-            data_collector = tag_data
-
         included_keys = []
         for keys in opts.included_keys:
             included_keys.extend(keys.split(","))
 
+        if opts.library or opts.album:
+            data_collector = partial(library_data, fields=included_keys or None)
+        else:
+            data_collector = tag_data
+
         items = []
         for data_emitter in data_collector(lib, args, album=opts.album):
             try:
@@ -14,12 +14,18 @@
 
 """Provides a fuzzy matching query."""
 
+from __future__ import annotations
+
 import difflib
+from typing import TYPE_CHECKING
 
 from beets import config
 from beets.dbcore.query import StringFieldQuery
 from beets.plugins import BeetsPlugin
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
 
 class FuzzyQuery(StringFieldQuery[str]):
     def __init__(self, field_name: str, pattern: str, *_) -> None:
@@ -28,11 +34,20 @@ class FuzzyQuery(StringFieldQuery[str]):
 
     @classmethod
     def string_match(cls, pattern: str, val: str) -> bool:
+        threshold = config["fuzzy"]["threshold"].as_number()
+        return cls._fuzzy_match(pattern, val, threshold)
+
+    def string_test(self) -> Callable[[str], bool]:
+        pattern = self.pattern
+        threshold = config["fuzzy"]["threshold"].as_number()
+        return lambda val: self._fuzzy_match(pattern, val, threshold)
+
+    @staticmethod
+    def _fuzzy_match(pattern: str, val: str, threshold: float) -> bool:
         # smartcase
         if pattern.islower():
             val = val.lower()
         query_matcher = difflib.SequenceMatcher(None, pattern, val)
-        threshold = config["fuzzy"]["threshold"].as_number()
         # Adjust match threshold for the case that the pattern is shorter
         # than the value being matched. This allows the pattern to match
         # substrings of the value, not just the entire value.
@@ -69,8 +69,16 @@ def tag_data_emitter(path):
     return emitter
 
 
-def library_data(lib, args, album=False):
-    for item in lib.albums(args) if album else lib.items(args):
+def library_data(lib, args, album=False, fields=None):
+    """Generate emitters for the library objects matching `args`. If the
+    emitted keys are known, pass them as `fields` to fetch only those.
+    """
+    objs = (
+        lib.albums(args, fields=fields)
+        if album
+        else lib.items(args, fields=fields)
+    )
+    for item in objs:
         yield library_data_emitter(item)
 
 
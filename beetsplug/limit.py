@@ -20,9 +20,6 @@
    query language).
 """
 
-from collections import deque
-from itertools import islice
-
 from beets.dbcore import FieldQuery
 from beets.plugins import BeetsPlugin
 from beets.ui import Subcommand, print_
@@ -37,14 +34,14 @@ def lslimit(lib, opts, args):
         raise ValueError("Limit value must be non-negative")
 
     if opts.album:
-        objs = lib.albums(args)
+        objs = lib.albums(args, stream=True)
     else:
-        objs = lib.items(args)
+        objs = lib.items(args, stream=True)
 
     if opts.head is not None:
-        objs = islice(objs, opts.head)
+        objs = objs.limit(opts.head)
     elif opts.tail is not None:
-        objs = deque(objs, opts.tail)
+        objs = objs.offset(max(len(objs) - opts.tail, 0))
 
     for obj in objs:
         print_(format(obj))
@@ -26,6 +26,7 @@ from werkzeug.routing import BaseConverter, PathConverter
 
 import beets.library
 from beets import ui, util
+from beets.dbcore.aggregate import Count
 from beets.dbcore.query import PathQuery
 from beets.plugins import BeetsPlugin
 
@@ -115,6 +116,19 @@ def is_delete():
     return flask.request.args.get("delete") is not None
 
 
+def paginate(entities):
+    """Restrict a result set to the window given by the ``offset`` and
+    ``limit`` request arguments.
+    """
+    offset = flask.request.args.get("offset", 0, int)
+    limit = flask.request.args.get("limit", None, int)
+
+    entities = entities.offset(max(offset, 0))
+    if limit is not None:
+        entities = entities.limit(max(limit, 0))
+    return entities
+
+
 def get_method():
     """Returns the HTTP method of the current request."""
     return flask.request.method
@@ -204,7 +218,7 @@ def resource_query(name, patchable=False):
             if get_method() == "GET":
                 return app.response_class(
                     json_generator(
-                        entities, root="results", expand=is_expand()
+                        paginate(entities), root="results", expand=is_expand()
                     ),
                     mimetype="application/json",
                 )
@@ -226,7 +240,9 @@ def resource_list(name):
     def make_responder(list_all):
         def responder():
             return app.response_class(
-                json_generator(list_all(), root=name, expand=is_expand()),
+                json_generator(
+                    paginate(list_all()), root=name, expand=is_expand()
+                ),
                 mimetype="application/json",
             )
 
@@ -309,7 +325,7 @@ def get_item(id_):
 @app.route("/item/query/")
 @resource_list("items")
 def all_items():
-    return g.lib.items()
+    return g.lib.items(stream=True)
 
 
 @app.route("/item/<int:item_id>/file")
@@ -372,7 +388,7 @@ def get_album(id_):
 @app.route("/album/query/")
 @resource_list("albums")
 def all_albums():
-    return g.lib.albums()
+    return g.lib.albums(stream=True)
 
 
 @app.route("/album/query/<query:queries>", methods=["GET", "DELETE"])
@@ -417,10 +433,10 @@ def all_artists():
 
 @app.route("/stats")
 def stats():
-    with g.lib.transaction() as tx:
-        item_rows = tx.query("SELECT COUNT(*) FROM items")
-        album_rows = tx.query("SELECT COUNT(*) FROM albums")
-    return flask.jsonify({"items": item_rows[0][0], "albums": album_rows[0][0]})
+    count = {"count": Count()}
+    items = g.lib.aggregate(beets.library.Item, None, count)["count"]
+    albums = g.lib.aggregate(beets.library.Album, None, count)["count"]
+    return flask.jsonify({"items": items, "albums": albums})
 
 
 # UI.
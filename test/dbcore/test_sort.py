@@ -19,7 +19,7 @@ import os
 import pytest
 
 import beets.library
-from beets import util
+from beets import dbcore, util
 from beets.dbcore import types
 from beets.dbcore.query import TrueQuery
 from beets.dbcore.sort import FixedFieldSort, SlowFieldSort
@@ -139,6 +139,23 @@ class TestSort:
         results = self.lib._fetch(model, query, None)
         assert [r.id for r in results] == expected_ids
 
+    @pytest.mark.parametrize(
+        "model,query",
+        [
+            _p(Album, "flex1- flex2+", id="album"),
+            _p(Item, "flex2- flex1+", id="item"),
+        ],
+    )
+    def test_flex_sort_in_sql(self, model, query):
+        sort = dbcore.sort_from_strings(model, query.split())
+
+        assert not sort.is_slow()
+        results = self.lib._fetch(model, TrueQuery(), sort)
+        objs = list(self.lib._fetch(model, TrueQuery()))
+        for field_sort in reversed(sort.sorts):
+            objs = field_sort.sort(objs)
+        assert [r.id for r in results] == [o.id for o in objs]
+
     def test_sort_path_field(self):
         results = self.lib.items("", FixedFieldSort("path", True))
         expected_paths = [
@@ -272,6 +289,17 @@ class TestNonExistingField:
         assert ids_asc == [*null_values_ids, lower_item.id, higher_item.id]
         assert ids_desc == [higher_item.id, lower_item.id, *null_values_ids]
 
+    def test_field_from_album(self):
+        """Items without a flexible attribute are sorted by their album's."""
+        for album, value in zip(self.lib.albums("id+"), ("c", "a", "b")):
+            album.albumflex = value
+            album.store()
+        item = self.lib.get_item(1)
+        item.albumflex = "d"
+        item.store()
+
+        assert [i.id for i in self.lib.items("albumflex+ id+")] == [3, 4, 2, 1]
+
     def test_negation_interaction(self):
         """Test the handling of negation and sorting together.
 
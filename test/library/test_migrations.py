@@ -1,11 +1,13 @@
 import os
 import textwrap
 from typing import ClassVar
+from unittest.mock import patch
 
 import pytest
 
 from beets.dbcore import types
-from beets.library import migrations
+from beets.dbcore.db import Transaction
+from beets.library import Library, migrations
 from beets.library.models import Album, Item
 from beets.test.helper import TestHelper
 from beets.util import cached_classproperty, path_as_posix
@@ -317,6 +319,137 @@ class TestRelativePathMigration(MigrationTestHelper):
         assert str_item.path == abs_bytes_path
 
 
+class TestLargeFieldStorageMigration(MigrationTestHelper):
+    """Verify large fields move between the items table and its separate
+    table when the storage changes.
+    """
+
+    migration = (migrations.LargeFieldStorageMigration, (Item,))
+
+    def stored(self, query):
+        return [tuple(row) for row in self.lib._connection().execute(query)]
+
+    def migrate(self, storage):
+        self.lib._large_field_storage = storage
+        if storage != "inline":
+            self.lib._make_large_table(Item._large_table)
+        # Read the schema and recorded migrations again, like at startup.
+        del self.lib.db_tables
+        self.lib._migrate()
+
+    def test_migrate(self):
+        item = self.add_item(lyrics="Some lyrics", comments="A comment")
+        self.add_item(lyrics="", comments="Other")
+
+        self.migrate("compressed")
+
+        assert self.stored("SELECT lyrics, comments FROM items") == [
+            (None, None),
+            (None, None),
+        ]
+        assert {
+            (key, type(value))
+            for key, value in self.stored("SELECT key, value FROM items_large")
+        } == {("lyrics", bytes), ("comments", bytes)}
+        [fetched] = self.lib.items("lyrics:lyrics")
+        assert fetched.id == item.id
+        assert self.lib.get_item(item.id).comments == "A comment"
+
+        self.migrate("inline")
+
+        assert self.stored("SELECT lyrics, comments FROM items") == [
+            ("Some lyrics", "A comment"),
+            (None, "Other"),
+        ]
+        assert not self.stored(
+            "SELECT name FROM sqlite_master WHERE name = 'items_large'"
+        )
+
+    def test_migrate_only_when_storage_changes(self, monkeypatch):
+        self.add_item(lyrics="Some lyrics")
+        self.migrate("separate")
+        moved = []
+        monkeypatch.setattr(
+            migrations.LargeFieldStorageMigration,
+            "_separate",
+            lambda _, model_cls, fields: moved.append(fields),
+        )
+
+        self.migrate("separate")
+        assert not moved
+
+        self.migrate("compressed")
+        assert moved == [["lyrics", "comments"]]
+        assert self.stored(
+            "SELECT name FROM migrations WHERE name LIKE 'large%'"
+        ) == [("large_field_storage:compressed",)]
+
+
+class TestPromoteFieldsMigration(MigrationTestHelper):
+    """Verify flexible attributes move into columns when promoted and back
+    into flexible attributes when no longer promoted.
+    """
+
+    migration = (migrations.PromoteFieldsMigration, (Item,))
+
+    def stored(self, query):
+        return [tuple(row) for row in self.lib._connection().execute(query)]
+
+    def promote(self, fields):
+        Item.promote_fields(fields)
+        self.lib._make_table(Item._table, Item._fields)
+        # Read the schema and recorded migrations again, like at startup.
+        del self.lib.db_tables
+        self.lib._migrate()
+
+    def test_migrate(self):
+        item = self.add_item(mood="happy")
+        self.add_item()
+
+        self.promote(["mood"])
+
+        assert "mood" in Item._fields
+        assert self.stored("SELECT mood FROM items") == [("happy",), (None,)]
+        assert not self.stored("SELECT * FROM item_attributes")
+        [fetched] = self.lib.items("mood:happy")
+        assert fetched.id == item.id
+
+        self.promote([])
+
+        assert "mood" not in Item._fields
+        assert self.stored("SELECT mood FROM items") == [(None,), (None,)]
+        assert self.stored("SELECT key, value FROM item_attributes") == [
+            ("mood", "happy")
+        ]
+        assert self.lib.get_item(item.id).mood == "happy"
+
+    def test_unchanged_fields_are_not_written(self):
+        self.add_item(mood="happy")
+        self.promote(["mood"])
+
+        with (
+            patch.object(Transaction, "mutate") as mutate,
+            patch.object(Transaction, "mutate_many") as mutate_many,
+        ):
+            self.promote(["mood"])
+        self.promote([])
+
+        mutate.assert_not_called()
+        mutate_many.assert_not_called()
+
+    def test_library_keeps_promoted_fields(self):
+        self.config["promote_fields"]["items"] = ["mood"]
+
+        Library(":memory:")._close()
+
+        assert "mood" not in Item._fields
+
+    def test_ignore_fixed_and_invalid_fields(self):
+        Item.promote_fields(["title", "singleton", "bad name"])
+
+        assert not Item._promoted_fields
+
+
 class TestMigrationBackup(MigrationTestHelper):
     """Tests for the backup-before-migration feature."""
 
@@ -86,9 +86,10 @@ class LimitPluginTest(IOMixin, PluginTestCase):
         result = self.lib.items(correct_order)
         assert len(result) == self.num_limit
 
-    def test_prefix_when_incorrectly_ordred(self):
-        """Returns no results with the query prefix and filter when the prefix
-        portion (incorrectly) appears first."""
-        incorrect_order = f"{self.num_limit_prefix} {self.track_tail_range}"
-        result = self.lib.items(incorrect_order)
-        assert len(result) == 0
+    def test_prefix_before_fast_filter(self):
+        """Returns the expected number with the query prefix and a filter
+        that is evaluated by the database, even when the prefix appears
+        first."""
+        prefix_first = f"{self.num_limit_prefix} {self.track_tail_range}"
+        result = self.lib.items(prefix_first)
+        assert len(result) == self.num_limit
@@ -136,6 +136,15 @@ class TestWebPlugin(WebPluginMixin, PytestTestHelper):
         assert response.status_code == 200
         assert len(res_json["items"]) == 3
 
+    def test_get_all_items_page(self):
+        ids = [i.id for i in self.lib.items()]
+
+        response = self.client.get("/item/?offset=1&limit=1")
+        res_json = json.loads(response.data.decode("utf-8"))
+
+        assert response.status_code == 200
+        assert [i["id"] for i in res_json["items"]] == ids[1:2]
+
     def test_get_unique_item_artist(self):
         response = self.client.get("/item/values/artist")
         res_json = json.loads(response.data.decode("utf-8"))
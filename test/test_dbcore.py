@@ -14,18 +14,31 @@
 
 """Tests for the DBCore database abstraction."""
 
+import json
 import os
 import shutil
 import sqlite3
+import threading
 import unittest
 from tempfile import mkstemp
 from typing import ClassVar
+from unittest.mock import patch
 
+import confuse
 import pytest
 
+import beets
 from beets import dbcore
 from beets.dbcore import query, sort, types
-from beets.dbcore.db import DBCustomFunctionError, FormattedMapping, Index
+from beets.dbcore.aggregate import Count, CountDistinct, Sum
+from beets.dbcore.db import (
+    DBCustomFunctionError,
+    FormattedMapping,
+    Index,
+    Results,
+    StreamedResults,
+)
+from beets.dbcore.profile import SQLProfiler
 from beets.library import Album, Item, LibModel
 from beets.util import cached_classproperty
 
@@ -68,6 +81,7 @@ class ModelFixture1(LibModel):
         "some_sort": SortFixture
     }
     _indices = (Index("field_one_index", ("field_one",)),)
+    _column_store_fields = ("field_two",)
     _formatter = FormattedMapping
 
     @cached_classproperty
@@ -264,6 +278,14 @@ class TransactionTest(unittest.TestCase):
             tx.query(f"PRAGMA table_info({ModelFixture1._table})")
         assert self.db.revision == old_rev
 
+    def test_no_writes_nested_in_read_only_transaction(self):
+        with self.db.transaction(read_only=True):
+            with pytest.raises(RuntimeError):
+                with self.db.transaction():
+                    pass
+            with self.db.transaction(read_only=True):
+                pass
+
 
 class ModelTest(unittest.TestCase):
     def setUp(self):
@@ -310,6 +332,28 @@ class ModelTest(unittest.TestCase):
         model2.load()
         assert model2._revision == mod2_old_rev
 
+    def test_load_after_store_does_not_fetch(self):
+        model = ModelFixture1()
+        model.add(self.db)
+        model.field_one = 123
+        model.store()
+
+        with patch.object(ModelFixture1, "get_fresh_from_db") as fetch:
+            model.load()
+
+        fetch.assert_not_called()
+        assert model._revision == self.db.revision
+
+    def test_load_after_add_does_not_fetch(self):
+        model = ModelFixture1(field_one=1)
+        self.db.add_many([model])
+
+        with patch.object(ModelFixture1, "get_fresh_from_db") as fetch:
+            model.load()
+
+        fetch.assert_not_called()
+        assert model._revision == self.db.revision
+
     def test_retrieve_by_id(self):
         model = ModelFixture1()
         model.add(self.db)
@@ -520,6 +564,51 @@ class FormattedMappingTest(unittest.TestCase):
         formatted = model.formatted()
         assert formatted.get("other_field", "default") == "default"
 
+    def test_formats_each_value_once(self):
+        model = ModelFixture1(field_two="foo")
+        with patch.object(
+            types.String, "format", autospec=True, return_value="formatted"
+        ) as format_:
+            assert model.formatted()["field_two"] == "formatted"
+            assert model.formatted()["field_two"] == "formatted"
+            format_.assert_called_once()
+
+    def test_changed_value_formatted_again(self):
+        model = ModelFixture1(field_two="foo")
+        assert model.formatted()["field_two"] == "foo"
+        model.field_two = "bar"
+        assert model.formatted()["field_two"] == "bar"
+
+    def test_value_changed_in_place_formatted_again(self):
+        model = ModelFixture1()
+        model.some_list = ["a"]
+        assert model.formatted()["some_list"] == "['a']"
+        model.some_list.append("b")
+        assert model.formatted()["some_list"] == "['a', 'b']"
+
+    def test_config_read_once_for_all_models(self):
+        models = [ModelFixture1(field_two=str(i)) for i in range(3)]
+        models[0].formatted(for_path=True)["field_two"]
+        with patch.object(
+            confuse.ConfigView,
+            "__getitem__",
+            autospec=True,
+            side_effect=confuse.ConfigView.__getitem__,
+        ) as getitem:
+            for model in models:
+                model.formatted(for_path=True)["field_two"]
+
+        getitem.assert_not_called()
+
+    def test_changed_config_formatted_again(self):
+        model = ModelFixture1(field_two="a/b")
+        assert model.formatted(for_path=True)["field_two"] == "a_b"
+        beets.config["path_sep_replace"] = "-"
+        try:
+            assert model.formatted(for_path=True)["field_two"] == "a-b"
+        finally:
+            beets.config["path_sep_replace"] = "_"
+
 
 class ParseTest(unittest.TestCase):
     def test_parse_fixed_field(self):
@@ -788,6 +877,14 @@ class ResultsIteratorTest(unittest.TestCase):
         objs = self.db._fetch(ModelFixture1)
         assert len(objs) == 2
 
+    def test_slow_query_length_is_aggregated(self):
+        q = query.SubstringQuery("foo", "baz", False)
+        objs = self.db._fetch(ModelFixture1, q)
+
+        assert len(objs) == 1
+        assert objs._rows is None
+        assert objs._objects == []
+
     def test_out_of_range(self):
         objs = self.db._fetch(ModelFixture1)
         with pytest.raises(IndexError):
@@ -797,6 +894,1128 @@ class ResultsIteratorTest(unittest.TestCase):
         assert self.db._fetch(ModelFixture1, query.FalseQuery()).get() is None
 
 
+class StreamedResultsTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        for i in range(5):
+            model = ModelFixture1()
+            model.field_one = i
+            model["foo"] = f"flex{i}"
+            model.add(self.db)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_stream_merges_flex_attributes_across_batches(self):
+        with patch.object(StreamedResults, "batch_size", 2):
+            objs = list(self.db._fetch(ModelFixture1, stream=True))
+
+        assert [o.field_one for o in objs] == [0, 1, 2, 3, 4]
+        assert [o.foo for o in objs] == [f"flex{i}" for i in range(5)]
+
+    def test_stream_pages_are_bounded(self):
+        query_rows = []
+        original = dbcore.db.Transaction.query
+
+        def spy(tx, *args, **kwargs):
+            rows = original(tx, *args, **kwargs)
+            query_rows.append(len(rows))
+            return rows
+
+        with (
+            patch.object(StreamedResults, "batch_size", 1),
+            patch.object(StreamedResults, "page_size", 2),
+            patch.object(dbcore.db.Transaction, "query", spy),
+        ):
+            objs = list(self.db._fetch(ModelFixture1, stream=True))
+
+        assert [o.field_one for o in objs] == [0, 1, 2, 3, 4]
+        assert max(query_rows) == 2
+
+    def test_stream_pages_follow_sort(self):
+        for i, value in enumerate([None, "b", "B", "a", None, "c"]):
+            ModelFixture1(field_one=10 + i, field_two=value).add(self.db)
+        sorts = [
+            sort.FixedFieldSort("field_two"),
+            sort.FixedFieldSort("field_two", ascending=False),
+            sort.MultipleSort(
+                [
+                    sort.FixedFieldSort("field_two", ascending=False),
+                    sort.FixedFieldSort("field_one", ascending=False),
+                ]
+            ),
+        ]
+        for s in sorts:
+            expected = [
+                (o.field_two or "").lower()
+                for o in self.db._fetch(ModelFixture1, sort=s)
+            ]
+            with patch.object(StreamedResults, "batch_size", 1):
+                objs = list(self.db._fetch(ModelFixture1, sort=s, stream=True))
+
+            assert [(o.field_two or "").lower() for o in objs] == expected
+            assert len({o.id for o in objs}) == len(objs) == 11
+        assert [o.field_one for o in objs][:3] == [15, 12, 11]
+
+    def test_stream_does_not_cache_objects(self):
+        results = self.db._fetch(ModelFixture1, stream=True)
+        assert len(list(results)) == 5
+        assert len(list(results)) == 5
+        assert results._objects == []
+
+    def test_stream_slow_query(self):
+        q = query.SubstringQuery("foo", "flex3", False)
+        results = self.db._fetch(ModelFixture1, q, stream=True)
+        assert [o.field_one for o in results] == [3]
+        assert len(results) == 1
+
+    def test_stream_fast_query_length(self):
+        q = query.NumericQuery("field_one", "1..3")
+        assert len(self.db._fetch(ModelFixture1, q, stream=True)) == 3
+
+    def test_stream_slow_sort(self):
+        s = sort.SlowFieldSort("foo", ascending=False)
+        results = self.db._fetch(ModelFixture1, sort=s, stream=True)
+        assert [o.field_one for o in results] == [4, 3, 2, 1, 0]
+
+    def test_stream_subscript(self):
+        results = self.db._fetch(ModelFixture1, stream=True)
+        assert results[2].field_one == 2
+        with pytest.raises(IndexError):
+            results[100]
+
+    def test_stream_allows_writes_while_iterating(self):
+        for obj in self.db._fetch(ModelFixture1, stream=True):
+            obj.field_two = "x"
+            obj.store()
+
+        assert {o.field_two for o in self.db._fetch(ModelFixture1)} == {"x"}
+
+    def test_other_connections_write_while_streaming(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        for wal in (False, True):
+            db = DatabaseFixture1(path, wal=wal)
+            other = DatabaseFixture1(path, wal=wal, timeout=0.01)
+            db.add_many([ModelFixture1(field_one=i) for i in range(3)])
+
+            with patch.object(StreamedResults, "batch_size", 1):
+                for obj in db._fetch(ModelFixture1, stream=True):
+                    ModelFixture1(field_one=obj.field_one).add(other)
+
+            assert len(db._fetch(ModelFixture1)) == 6
+            with db.transaction() as tx:
+                tx.mutate("DELETE FROM test")
+            other._close()
+            db._close()
+
+
+class ResultsSliceTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        for i in range(5):
+            model = ModelFixture1()
+            model.field_one = i
+            model["foo"] = f"flex{4 - i}"
+            model.add(self.db)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def fetch(self, stream, **kwargs):
+        return self.db._fetch(ModelFixture1, stream=stream, **kwargs)
+
+    def test_slice(self):
+        for stream in (False, True):
+            results = self.fetch(stream)
+            assert [o.field_one for o in results[1:3]] == [1, 2]
+            assert [o.field_one for o in results[3:]] == [3, 4]
+            assert [o.field_one for o in results[-2:]] == [3, 4]
+            assert [o.field_one for o in results[:-4]] == [0]
+            assert [o.field_one for o in results[4:2]] == []
+            assert len(results[1:3]) == 2
+
+    def test_limit_and_offset(self):
+        for stream in (False, True):
+            results = self.fetch(stream)
+            assert [o.field_one for o in results.limit(2)] == [0, 1]
+            assert [o.field_one for o in results.offset(3)] == [3, 4]
+            assert [o.field_one for o in results.offset(1).limit(2)] == [1, 2]
+            assert [o.field_one for o in results.limit(3).offset(2)] == [2]
+            assert [o.field_one for o in results.limit(3).offset(4)] == []
+
+    def test_slice_slow_query(self):
+        q = query.SubstringQuery("foo", "flex", False)
+        for stream in (False, True):
+            results = self.fetch(stream, query=q)
+            assert [o.field_one for o in results[1:3]] == [1, 2]
+            assert results[-1].field_one == 4
+
+    def test_slice_slow_sort(self):
+        s = sort.SlowFieldSort("foo")
+        for stream in (False, True):
+            results = self.fetch(stream, sort=s)
+            assert [o.field_one for o in results[1:3]] == [3, 2]
+            assert results[-1].field_one == 0
+
+    def test_slice_step_unsupported(self):
+        with pytest.raises(ValueError, match="step"):
+            self.fetch(False)[::2]
+
+    def test_fast_subscript_does_not_materialize_preceding_objects(self):
+        results = self.fetch(False)
+        assert results[3].field_one == 3
+        assert results[1:2]._objects == []
+        assert results._objects == []
+
+    def test_fast_subscripts_index_flex_attributes_once(self):
+        results = self.fetch(False)
+        with patch.object(
+            Results, "_index_flex_rows", wraps=Results._index_flex_rows
+        ) as index:
+            assert [results[i]["foo"] for i in range(5)] == [
+                f"flex{4 - i}" for i in range(5)
+            ]
+            assert results[1:3][0]["foo"] == "flex3"
+
+        index.assert_called_once()
+
+    def test_slice_is_applied_in_sql(self):
+        results = self.fetch(False).offset(1).limit(2)
+
+        assert results._rows is None
+        objs = list(results)
+        assert [o.field_one for o in objs] == [1, 2]
+        assert len(results.rows) == 2
+        assert {row["entity_id"] for row in results.flex_rows} == {
+            o.id for o in objs
+        }
+
+    def test_slice_of_fetched_rows(self):
+        results = self.fetch(False)
+        assert len(list(results)) == 5
+
+        assert results[1:3]._rows == results.rows[1:3]
+
+    def test_stream_slice_is_applied_in_sql(self):
+        results = self.fetch(True).offset(1).limit(2)
+        sql, subvals = results._window_sql
+        assert sql.endswith("LIMIT ? OFFSET ?")
+        assert subvals[-2:] == [2, 1]
+        assert len(results) == 2
+
+
+class AddManyTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_add_many(self):
+        ModelFixture1(field_one=0).add(self.db)
+        models = [ModelFixture1(field_one=i, flex=f"f{i}") for i in (1, 2)]
+        models.append(ModelFixture1())
+
+        ids = self.db.add_many(models)
+
+        assert ids == [2, 3, 4]
+        assert [m.id for m in models] == ids
+        assert not any(m._dirty for m in models)
+        stored = list(self.db._fetch(ModelFixture1))
+        assert [m.field_one for m in stored] == [0, 1, 2, 0]
+        assert [m.get("flex") for m in stored] == [None, "f1", "f2", None]
+        assert all(m.added for m in stored[1:])
+
+    def test_add_many_ids_follow_add(self):
+        self.db.add_many([ModelFixture1(), ModelFixture1()])
+        model = ModelFixture1()
+        model.add(self.db)
+
+        assert model.id == 3
+
+    def test_add_many_holds_write_lock_while_picking_ids(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        db = DatabaseFixture1(path)
+        other = DatabaseFixture1(path, timeout=0.01)
+        self.addCleanup(db._close)
+        self.addCleanup(other._close)
+        errors = []
+        query = dbcore.db.Transaction.query
+
+        def insert_meanwhile(tx, statement, *args):
+            if "MAX(id)" in statement:
+                try:
+                    ModelFixture1().add(other)
+                except sqlite3.OperationalError as exc:
+                    errors.append(exc)
+            return query(tx, statement, *args)
+
+        with patch.object(dbcore.db.Transaction, "query", insert_meanwhile):
+            ids = db.add_many([ModelFixture1(), ModelFixture1()])
+
+        assert ids == [1, 2]
+        assert "locked" in str(errors[0])
+
+
+class StoreManyTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        self.models = []
+        for i in range(3):
+            model = ModelFixture1(field_one=i, field_two="x")
+            model["flex"] = "old"
+            model.add(self.db)
+            self.models.append(model)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_store_many(self):
+        first, second, third = self.models
+        first.field_one = 10
+        first["flex"] = "new"
+        second.field_one = 20
+        second["other"] = "added"
+        del third["flex"]
+
+        with patch.object(
+            dbcore.db.Transaction,
+            "mutate_many",
+            autospec=True,
+            side_effect=dbcore.db.Transaction.mutate_many,
+        ) as mutate_many:
+            self.db.store_many(self.models)
+
+        # One statement each for the updates, insertions and deletions.
+        assert mutate_many.call_count == 3
+        assert not any(m._dirty for m in self.models)
+        stored = list(self.db._fetch(ModelFixture1))
+        assert [m.field_one for m in stored] == [10, 20, 2]
+        assert [(m.get("flex"), m.get("other")) for m in stored] == [
+            ("new", None),
+            ("old", "added"),
+            (None, None),
+        ]
+
+    def test_store_many_fields(self):
+        for model in self.models:
+            model.field_one = 5
+            model.field_two = "y"
+
+        self.db.store_many(self.models, fields=["field_two"])
+
+        stored = list(self.db._fetch(ModelFixture1))
+        assert [m.field_one for m in stored] == [0, 1, 2]
+        assert [m.field_two for m in stored] == ["y", "y", "y"]
+
+    def test_store_many_requires_id(self):
+        with pytest.raises(ValueError, match="has no id"):
+            self.db.store_many([ModelFixture1(self.db)])
+
+
+class AggregateTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        for one, two in [(1, "a"), (2, "a"), (4, "b"), (None, None)]:
+            model = ModelFixture1(field_one=one, field_two=two)
+            model["flex"] = two
+            model.add(self.db)
+
+        self.aggregates = {
+            "count": Count(),
+            "count_one": Count("field_one"),
+            "sum": Sum("field_one"),
+            "distinct": CountDistinct("field_two"),
+        }
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_fast_query_in_sql(self):
+        q = query.NumericQuery("field_one", "2..")
+        with patch.object(Count, "step") as step:
+            stats = self.db.aggregate(ModelFixture1, q, self.aggregates)
+
+        step.assert_not_called()
+        assert stats == {"count": 2, "count_one": 2, "sum": 6, "distinct": 2}
+
+    def test_slow_query_in_python(self):
+        q = query.NumericQuery("field_one", "2..", fast=False)
+        stats = self.db.aggregate(ModelFixture1, q, self.aggregates)
+
+        assert stats == {"count": 2, "count_one": 2, "sum": 6, "distinct": 2}
+
+    def test_flex_field_in_python(self):
+        stats = self.db.aggregate(
+            ModelFixture1,
+            None,
+            {
+                "fixed": CountDistinct("field_two"),
+                "flex": CountDistinct("flex"),
+            },
+        )
+
+        assert stats == {"fixed": 3, "flex": 2}
+
+    def test_null_values_agree_in_sql_and_python(self):
+        with self.db.transaction() as tx:
+            tx.mutate("UPDATE test SET field_one = NULL, field_two = NULL")
+            tx.mutate("UPDATE test SET field_two = '' WHERE id = 1")
+        fast = query.NumericQuery("id", "1..")
+        slow = query.NumericQuery("id", "1..", fast=False)
+
+        stats = self.db.aggregate(ModelFixture1, fast, self.aggregates)
+
+        # Null values stand for 0 and "", as when reading the objects.
+        assert stats == {"count": 4, "count_one": 4, "sum": 0, "distinct": 1}
+        assert self.db.aggregate(ModelFixture1, slow, self.aggregates) == stats
+
+    def test_no_matches(self):
+        stats = self.db.aggregate(
+            ModelFixture1, query.FalseQuery(), self.aggregates
+        )
+
+        assert stats == {"count": 0, "count_one": 0, "sum": 0, "distinct": 0}
+
+
+class ColumnStoreTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = mkstemp("db")
+        os.close(handle)
+        self.db = DatabaseFixture1(self.path, column_store=True)
+        for one, two in [(1, "a"), (2, "a"), (4, "b"), (None, None)]:
+            ModelFixture1(field_one=one, field_two=two).add(self.db)
+
+        self.aggregates = {
+            "count": Count(),
+            "count_one": Count("field_one"),
+            "sum": Sum("field_one"),
+            "distinct": CountDistinct("field_two"),
+        }
+
+    def tearDown(self):
+        self.db._close()
+        os.remove(self.path)
+        shutil.rmtree(f"{self.path}.columns", ignore_errors=True)
+
+    def aggregate(self, q=None):
+        with patch.object(self.db, "_aggregate") as sql_aggregate:
+            stats = self.db.aggregate(ModelFixture1, q, self.aggregates)
+
+        sql_aggregate.assert_not_called()
+        return stats
+
+    def files(self):
+        with open(f"{self.path}.columns/test.json") as f:
+            return json.load(f)["files"]
+
+    def test_aggregates_from_columns(self):
+        q = query.OrQuery(
+            [
+                query.NumericQuery("field_one", "2..3"),
+                query.NotQuery(query.NumericQuery("field_one", "..3")),
+            ]
+        )
+
+        assert self.aggregate(q) == {
+            "count": 2,
+            "count_one": 2,
+            "sum": 6,
+            "distinct": 2,
+        }
+
+    def test_unstored_fields_in_sql(self):
+        q = query.MatchQuery("field_two", "a")
+        stats = self.db.aggregate(ModelFixture1, q, self.aggregates)
+
+        assert stats == {"count": 2, "count_one": 2, "sum": 3, "distinct": 1}
+
+    def test_updates_changed_rows(self):
+        self.aggregate()
+        model = self.db._get(ModelFixture1, 1)
+        model.field_one = 10
+        model.store()
+        self.db._get(ModelFixture1, 3).remove()
+        ModelFixture1(field_one=5, field_two="c").add(self.db)
+        revision = self.db.revision
+
+        assert self.aggregate() == {
+            "count": 4,
+            "count_one": 4,
+            "sum": 17,
+            "distinct": 3,
+        }
+        # Reading the columns does not write to the database.
+        assert self.db.revision == revision
+
+    def test_picks_up_changes_of_other_connections(self):
+        self.aggregate()
+        self.db._close()
+        other = DatabaseFixture1(self.path, column_store=True)
+        ModelFixture1(field_one=8).add(other)
+        other._close()
+
+        self.db = DatabaseFixture1(self.path, column_store=True)
+        assert self.aggregate()["sum"] == 15
+
+    def test_picks_up_writes_of_other_processes_while_open(self):
+        self.aggregate()
+        other = DatabaseFixture1(self.path, column_store=True)
+        ModelFixture1(field_one=8).add(other)
+        other._close()
+
+        assert self.aggregate()["sum"] == 15
+
+    def test_rewrites_changed_arrays_only(self):
+        self.aggregate()
+        before = self.files()
+        model = self.db._get(ModelFixture1, 1)
+        model.field_one = 10
+        model.store()
+
+        assert self.aggregate()["sum"] == 16
+        after = self.files()
+        assert after["field_one"] != before["field_one"]
+        assert {k: v for k, v in after.items() if k != "field_one"} == {
+            k: v for k, v in before.items() if k != "field_one"
+        }
+        assert sorted(os.listdir(f"{self.path}.columns")) == sorted(
+            ["test.json", *after.values()]
+        )
+
+    def test_null_values_as_in_sql(self):
+        with self.db.transaction() as tx:
+            tx.mutate("UPDATE test SET field_one = NULL WHERE id = 1")
+            tx.mutate("UPDATE test SET field_two = NULL WHERE id = 2")
+        with patch.object(self.db, "_column_store", None):
+            expected = self.db.aggregate(ModelFixture1, None, self.aggregates)
+
+        assert self.aggregate() == expected
+
+    def test_disabling_keeps_columns(self):
+        self.aggregate()
+        before = self.files()
+        self.db._close()
+
+        other = DatabaseFixture1(self.path)
+        model = other._get(ModelFixture1, 1)
+        for value in range(5):
+            model.field_one = value
+            model.store()
+        other._close()
+        other = DatabaseFixture1(self.path)
+        with other.transaction() as tx:
+            rows = tx.query("SELECT entity_id FROM column_changes")
+        # One entry is kept for each row.
+        assert sorted(row[0] for row in rows) == [1, 2, 3, 4]
+        other._close()
+
+        self.db = DatabaseFixture1(self.path, column_store=True)
+        assert self.aggregate()["sum"] == 10
+        assert self.files()["field_two"] == before["field_two"]
+
+    def test_memory_database_keeps_columns_directory(self):
+        os.makedirs(":memory:.columns")
+        self.addCleanup(shutil.rmtree, ":memory:.columns")
+
+        DatabaseFixture1(":memory:")._close()
+
+        assert os.path.isdir(":memory:.columns")
+
+
+class LargeFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch.object(
+            ModelFixture1, "_large_fields", ("field_two",)
+        )
+        self.patcher.start()
+        self.db = DatabaseFixture1(":memory:", large_field_storage="compressed")
+
+    def tearDown(self):
+        self.db._connection().close()
+        self.patcher.stop()
+
+    def test_values_are_stored_separately(self):
+        model = ModelFixture1(field_one=1, field_two="text")
+        model.add(self.db)
+        self.db.add_many([ModelFixture1(field_one=2, field_two="more")])
+
+        with self.db.transaction() as tx:
+            assert (
+                tx.query("SELECT * FROM test WHERE field_two IS NOT NULL") == []
+            )
+            stored = tx.query("SELECT entity_id, value FROM test_large")
+        assert [(r[0], dbcore.db.inflate(r[1])) for r in stored] == [
+            (1, "text"),
+            (2, "more"),
+        ]
+
+    def test_values_are_loaded_on_access(self):
+        ModelFixture1(field_one=1, field_two="text").add(self.db)
+
+        model = self.db._get(ModelFixture1, 1)
+        with patch.object(
+            self.db, "_load_large_fields", return_value={"field_two": "text"}
+        ) as load:
+            assert "field_two" in model
+            load.assert_not_called()
+            assert model.field_two == "text"
+            assert model.field_two == "text"
+        load.assert_called_once()
+
+    def test_query_and_update(self):
+        model = ModelFixture1(field_one=1, field_two="text")
+        model.add(self.db)
+        q = query.SubstringQuery("field_two", "ex")
+
+        assert [m.id for m in self.db._fetch(ModelFixture1, q)] == [1]
+
+        model.field_two = ""
+        model.store()
+        assert list(self.db._fetch(ModelFixture1, q)) == []
+        model.remove()
+        with self.db.transaction() as tx:
+            assert tx.query("SELECT * FROM test_large") == []
+
+
+class ChangeJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:", change_journal=True)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_writes_are_journaled(self):
+        model = ModelFixture1(field_one=1)
+        model.add(self.db)
+        revision = self.db.change_revision
+        other_id = self.db.add_many([ModelFixture1(field_one=2)])[0]
+        model.field_one = 3
+        model["flex"] = "value"
+        model.store()
+        model.store()
+        model.remove()
+
+        changes = self.db.changes(revision)
+        assert [(c.id, c.op, c.fields) for c in changes] == [
+            (other_id, "add", None),
+            (model.id, "update", ("field_one", "flex")),
+            (model.id, "remove", None),
+        ]
+        assert {c.table for c in changes} == {"test"}
+        assert self.db.change_revision == changes[-1].revision
+
+    def test_compact_changes(self):
+        model = ModelFixture1(field_one=1)
+        model.add(self.db)
+        kept = ModelFixture1(field_one=1)
+        kept.add(self.db)
+        model.field_one = 2
+        model.store()
+        model["flex"] = "value"
+        model.store()
+        kept.field_two = "text"
+        kept.store()
+        revision = self.db.change_revision
+
+        # Adding an object also journals the update of its fields.
+        assert self.db.compact_changes() == 5
+        assert [(c.id, c.op, c.fields) for c in self.db.changes()] == [
+            (model.id, "add", None),
+            (kept.id, "add", None),
+        ]
+        assert self.db.change_revision == revision
+
+        kept.remove()
+        assert self.db.compact_changes() == 1
+        [removed] = self.db.changes(revision)
+        assert (removed.id, removed.op) == (kept.id, "remove")
+
+    def test_journal_is_compacted_when_opened(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        models = [ModelFixture1(field_one=i) for i in range(3)]
+        for run in range(5):
+            db = DatabaseFixture1(path, change_journal=True)
+            if run == 0:
+                db.add_many(models)
+            for model in db._fetch(ModelFixture1):
+                model.field_one += 1
+                model.store()
+            # One change for each object plus those written in this run.
+            assert len(db.changes()) <= 2 * len(models)
+            db._close()
+
+    def test_fields_changed(self):
+        model = ModelFixture1(field_one=1)
+        model.add(self.db)
+        written = self.db.write_count
+        model.field_one = 2
+        model.store()
+
+        assert self.db.fields_changed(written, ["field_one"])
+        assert not self.db.fields_changed(written, ["field_two"])
+        assert not self.db.fields_changed(self.db.write_count)
+
+    def test_journal_disabled(self):
+        db = DatabaseFixture1(":memory:")
+        ModelFixture1(field_one=1).add(db)
+
+        with db.transaction() as tx:
+            assert not tx.query(
+                "SELECT name FROM sqlite_master WHERE name = 'changes'"
+            )
+
+    def test_journal_is_kept_when_opened_without_option(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        db = DatabaseFixture1(path, change_journal=True)
+        model = ModelFixture1(field_one=1)
+        model.add(db)
+        revision = db.change_revision
+        db._close()
+
+        db = DatabaseFixture1(path)
+        model = db._get(ModelFixture1, model.id)
+        model.field_one = 2
+        model.store()
+
+        assert db.change_journal
+        [change] = db.changes(revision)
+        assert (change.id, change.fields) == (model.id, ("field_one",))
+        db._close()
+
+    def test_revisions_grow_after_removal(self):
+        model = ModelFixture1(field_one=1)
+        model.add(self.db)
+        revision = self.db.change_revision
+
+        self.db.remove_changes()
+        model.field_one = 2
+        model.store()
+        self.db._make_changes_table()
+        self.db.change_journal = True
+        model.field_one = 3
+        model.store()
+
+        [change] = self.db.changes()
+        assert change.revision > revision
+
+
+class WalTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = mkstemp("db")
+        os.close(handle)
+        self.db = DatabaseFixture1(self.path, wal=True, page_cache_size=1024)
+        ModelFixture1(field_one=1).add(self.db)
+
+    def tearDown(self):
+        self.db._close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def read(self):
+        return [m.field_one for m in self.db._fetch(ModelFixture1)]
+
+    def test_read_while_writing(self):
+        read = []
+        with self.db.transaction() as tx:
+            tx.mutate("UPDATE test SET field_one = 2")
+            # A reader in another thread neither waits for the write nor
+            # sees it before it is committed.
+            thread = threading.Thread(target=lambda: read.extend(self.read()))
+            thread.start()
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+
+        assert read == [1]
+        assert self.read() == [2]
+        with self.db.transaction() as tx:
+            assert tx.query("PRAGMA journal_mode")[0][0] == "wal"
+            assert tx.query("PRAGMA cache_size")[0][0] == -1024
+
+    def test_no_writes_in_read_only_transaction(self):
+        with self.db.transaction(read_only=True) as tx:
+            with pytest.raises(RuntimeError):
+                with self.db.transaction():
+                    pass
+            with pytest.raises(RuntimeError):
+                tx.mutate("UPDATE test SET field_one = 2")
+
+        assert self.read() == [1]
+
+    def test_journal_mode_kept_without_wal(self):
+        self.db._close()
+
+        self.db = DatabaseFixture1(self.path)
+
+        with self.db.transaction() as tx:
+            assert tx.query("PRAGMA journal_mode")[0][0] == "wal"
+
+    def test_connections_of_ended_threads_are_closed(self):
+        thread = threading.Thread(target=self.read)
+        thread.start()
+        thread.join()
+        assert thread.ident in self.db._connections
+
+        self.read()
+
+        assert set(self.db._connections) == {threading.get_ident()}
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = mkstemp("db")
+        os.close(handle)
+        self.db = DatabaseFixture1(self.path, write_queue=True)
+
+    def tearDown(self):
+        self.db._close()
+        os.remove(self.path)
+
+    def test_queued_writes_share_a_transaction(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocking_write():
+            started.set()
+            release.wait()
+
+        self.db.submit(blocking_write)
+        started.wait()
+        roots = []
+
+        def add(model):
+            with self.db._tx_stack() as stack:
+                roots.append(stack[0])
+            model.add(self.db)
+
+        futures = [
+            self.db.submit(add, ModelFixture1(field_one=i)) for i in range(3)
+        ]
+        release.set()
+        for future in futures:
+            future.result()
+
+        assert len(set(roots)) == 1
+        assert [m.field_one for m in self.db._fetch(ModelFixture1)] == [0, 1, 2]
+
+    def test_failed_write_is_undone_alone(self):
+        def failing_write():
+            with self.db.transaction() as tx:
+                tx.mutate("INSERT INTO test (field_one) VALUES (1)")
+            raise ValueError("failed")
+
+        started, release = threading.Event(), threading.Event()
+        self.db.submit(lambda: (started.set(), release.wait()))
+        started.wait()
+        failed = self.db.submit(failing_write)
+        stored = self.db.submit(ModelFixture1(field_one=2).add, self.db)
+        release.set()
+
+        with pytest.raises(ValueError, match="failed"):
+            failed.result()
+        stored.result()
+        assert [m.field_one for m in self.db._fetch(ModelFixture1)] == [2]
+
+    def test_store_waits_for_write(self):
+        model = ModelFixture1(field_one=1)
+        model.add(self.db)
+        model.field_one = 2
+        model.store()
+
+        with self.db.transaction() as tx:
+            assert tx.query("SELECT field_one FROM test")[0][0] == 2
+            # Writes in a transaction run right away.
+            assert self.db.submit(lambda: "now").done()
+
+
+class IdentityMapTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:", model_cache_size=2)
+        self.models = []
+        for i in range(3):
+            model = ModelFixture1(field_one=i)
+            model.add(self.db)
+            self.models.append(model)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_disabled_by_default(self):
+        db = DatabaseFixture1(":memory:")
+        model = ModelFixture1(field_one=1)
+        model.add(db)
+
+        assert db._get(ModelFixture1, model.id) is not db._get(
+            ModelFixture1, model.id
+        )
+
+    def test_repeated_get_returns_same_object(self):
+        first = self.db._get(ModelFixture1, self.models[0].id)
+        with patch.object(self.db, "_fetch") as fetch:
+            second = self.db._get(ModelFixture1, self.models[0].id)
+
+        fetch.assert_not_called()
+        assert second is first
+
+    def test_store_drops_changed_row(self):
+        first = self.db._get(ModelFixture1, self.models[0].id)
+        self.models[0].field_one = 10
+        self.models[0].store()
+
+        fresh = self.db._get(ModelFixture1, self.models[0].id)
+        assert fresh is not first
+        assert fresh.field_one == 10
+
+    def test_store_keeps_other_rows(self):
+        first = self.db._get(ModelFixture1, self.models[0].id)
+        self.models[1].field_one = 10
+        self.models[1].store()
+
+        assert self.db._get(ModelFixture1, self.models[0].id) is first
+
+    def test_remove_drops_row(self):
+        self.db._get(ModelFixture1, self.models[0].id)
+        self.models[0].remove()
+
+        assert self.db._get(ModelFixture1, self.models[0].id) is None
+
+    def test_untracked_write_drops_all_rows(self):
+        first = self.db._get(ModelFixture1, self.models[0].id)
+        with self.db.transaction() as tx:
+            tx.mutate(f"UPDATE {ModelFixture1._table} SET field_one = 5")
+
+        fresh = self.db._get(ModelFixture1, self.models[0].id)
+        assert fresh is not first
+        assert fresh.field_one == 5
+
+    def test_least_recently_used_is_evicted(self):
+        first, _, third = (
+            self.db._get(ModelFixture1, m.id) for m in self.models
+        )
+
+        assert self.db._get(ModelFixture1, self.models[0].id) is not first
+        assert self.db._get(ModelFixture1, self.models[2].id) is third
+
+    def test_load_keeps_own_values(self):
+        shared = self.db._get(ModelFixture1, self.models[0].id)
+        self.models[0].load()
+
+        assert self.models[0] is not shared
+        self.models[0].field_one = 10
+        assert shared.field_one == 0
+
+    def test_get_does_not_wait_for_writes_in_wal_mode(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        db = DatabaseFixture1(path, model_cache_size=2, wal=True)
+        self.addCleanup(db._close)
+        ModelFixture1(field_one=1).add(db)
+        got = []
+
+        with db.transaction() as tx:
+            tx.mutate("UPDATE test SET field_one = 2", rows=[("test", 1)])
+            thread = threading.Thread(
+                target=lambda: got.append(db._get(ModelFixture1, 1))
+            )
+            thread.start()
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+
+        # The object read before the commit is not kept.
+        assert got[0].field_one == 1
+        assert db._get(ModelFixture1, 1).field_one == 2
+
+    def test_nested_write_drops_rows_read_before_commit(self):
+        with self.db.transaction():
+            with self.db.transaction() as tx:
+                tx.mutate(
+                    "UPDATE test SET field_one = 5 WHERE id = 1",
+                    rows=[("test", 1)],
+                )
+            # A concurrent reader could still see the old row and cache it.
+            stale = ModelFixture1(self.db, fixed_values={"id": 1})
+            self.db._identity_map.add(stale, self.db.revision)
+
+        assert self.db._get(ModelFixture1, 1) is not stale
+
+
+class ProjectionTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        for one, two in [(1, "a"), (2, "b")]:
+            model = ModelFixture1(field_one=one, field_two=two)
+            model["flex"] = two
+            model["other"] = "other"
+            model.add(self.db)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def fetch(self, stream, fields, q=None):
+        return list(
+            self.db._fetch(
+                ModelFixture1,
+                q,
+                sort.FixedFieldSort("field_one"),
+                stream=stream,
+                fields=fields,
+            )
+        )
+
+    def test_fetches_only_projected_fields(self):
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                first, _ = self.fetch(stream, ["field_one", "flex"])
+
+                assert set(first._values_fixed) == {"id", "field_one"}
+                assert set(first._values_flex) == {"flex"}
+                assert first.flex == "a"
+
+    def test_loads_other_fields_on_access(self):
+        first, second = self.fetch(False, ["field_one"])
+
+        assert first.field_two == "a"
+        assert first._projection is None
+        assert second._projection is not None
+        assert {"field_two", "flex", "other"} <= second.keys()
+
+    def test_load_keeps_modified_values(self):
+        first, _ = self.fetch(False, ["field_one"])
+        first.field_one = 10
+        first.flex = "new"
+
+        assert first.other == "other"
+        assert (first.field_one, first.flex) == (10, "new")
+
+    def test_slow_query_fields_are_fetched(self):
+        q = query.SubstringQuery("other", "oth", fast=False)
+        objs = self.fetch(False, ["field_one"], q)
+
+        assert len(objs) == 2
+        assert all("other" in obj._values_flex for obj in objs)
+
+    def test_formatted_uses_projected_fields(self):
+        first, _ = self.fetch(False, ["field_one", "flex"])
+
+        assert (
+            first.evaluate_template("$field_one $flex $other") == "1 a $other"
+        )
+        assert first._projection is not None
+
+
+class SuggestIndicesTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:", record_queries=True)
+        ModelFixture1(field_one=1, field_two="a").add(self.db)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def fetch(self, q):
+        return list(self.db._fetch(ModelFixture1, q))
+
+    def test_suggests_columns_of_fast_conjuncts(self):
+        q = query.AndQuery(
+            [
+                query.NumericQuery("field_one", "1.."),
+                query.MatchQuery("field_two", "a"),
+                query.MatchQuery("flex", "a", fast=False),
+            ]
+        )
+        self.fetch(q)
+        self.fetch(q)
+
+        [suggestion] = self.db.suggest_indices()
+
+        assert suggestion.table == "test"
+        assert suggestion.index == Index(
+            "test_by_field_two_field_one", ("field_two", "field_one")
+        )
+        assert suggestion.count == 2
+
+    def test_skips_covered_and_infrequent_queries(self):
+        self.fetch(query.MatchQuery("field_one", 1))
+        self.fetch(query.MatchQuery("field_two", "a"))
+        self.fetch(query.MatchQuery("id", 1))
+
+        assert [s.index.columns for s in self.db.suggest_indices()] == [
+            ("field_two",)
+        ]
+        assert self.db.suggest_indices(min_count=2) == []
+
+    def test_created_index_is_used(self):
+        self.db.add_many(ModelFixture1(field_two=str(i)) for i in range(100))
+        self.fetch(query.MatchQuery("field_two", "a"))
+
+        self.db.create_indices(self.db.suggest_indices())
+        self.db.analyze()
+
+        assert self.db.suggest_indices() == []
+        with self.db.transaction() as tx:
+            plan = tx.query(
+                "EXPLAIN QUERY PLAN SELECT * FROM test WHERE field_two = ?",
+                ("a",),
+            )
+        assert "test_by_field_two" in plan[0]["detail"]
+
+    def test_counts_are_saved_on_close(self):
+        handle, path = mkstemp("db")
+        os.close(handle)
+        db = DatabaseFixture1(path, record_queries=True)
+        list(db._fetch(ModelFixture1, query.MatchQuery("field_two", "a")))
+        db._close()
+
+        db = DatabaseFixture1(path)
+        [suggestion] = db.suggest_indices()
+        db._close()
+        os.remove(path)
+
+        assert suggestion.count == 1
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseFixture1(":memory:")
+        self.db.profiler = SQLProfiler(explain=True)
+
+    def tearDown(self):
+        self.db._connection().close()
+
+    def test_records_statements(self):
+        with self.db.transaction() as tx:
+            tx.mutate_many(
+                "INSERT INTO test (field_one) VALUES (?)", [(1,), (2,)]
+            )
+            tx.query("SELECT * FROM test WHERE field_one > ?", (0,))
+            tx.query("SELECT * FROM test WHERE field_one > ?", (1,))
+
+        insert, select = sorted(
+            self.db.profiler.stats.values(), key=lambda s: s.statement
+        )
+        assert (insert.calls, insert.binds, insert.rows) == (1, 2, 2)
+        assert (select.calls, select.binds, select.rows) == (2, 2, 3)
+        assert select.time > 0
+        [plan] = self.db.profiler.plans[select.statement]
+        assert "field_one_index" in plan
+        assert insert.statement not in self.db.profiler.plans
+
+    def test_records_slow_queries(self):
+        q = query.MatchQuery("field_one", 1, fast=False)
+        for _ in self.db._fetch(ModelFixture1, q):
+            pass
+
+        assert self.db.profiler.slow_queries == {f"test query: {q!r}": 1}
+
+
 class TestException:
     @pytest.mark.parametrize("model", [DatabaseFixture1])
     @pytest.mark.filterwarnings(
@@ -32,6 +32,7 @@ import beets.dbcore.query
 import beets.library
 from beets import config, plugins, util
 from beets.library import Album
+from beets.library.unique import UniqueIndex
 from beets.test import _common
 from beets.test._common import item
 from beets.test.helper import TestHelper
@@ -546,6 +547,76 @@ class TestDestination(PytestItemHelper):
         assert item_in_db.destination() == np("one/foo/two")
 
 
+class TestDestinations(PytestItemHelper):
+    def set_path_formats(self):
+        self.lib.directory = b"one"
+        self.lib.path_formats = [
+            ("default", "$flex/$title"),
+            ("singleton:true", "singles/$title"),
+            ("comp:true", "comp/$album/$title"),
+        ]
+
+    def test_match_item_destination(self):
+        self.set_path_formats()
+        self.lib.add(_common.item(title="single"))
+        album_items = [
+            _common.item(self.lib, title=f"t{i}", comp=False) for i in range(3)
+        ]
+        album = self.lib.add_album(album_items)
+        album["flex"] = "foo"
+        album.store()
+        comp_item = _common.item(self.lib)
+        comp_item.comp = True
+        self.lib.add_album([comp_item])
+
+        items = list(self.lib.items())
+        expected = [(item, item.destination()) for item in items]
+
+        assert list(self.lib.destinations(items, batch_size=2)) == expected
+        assert np("one/foo/t1") in {path for _, path in expected}
+
+    def test_relative_to_libdir_and_basedir(self, item_in_db):
+        self.set_path_formats()
+        item_in_db.title = "x"
+        self.lib.add_album([item_in_db])
+
+        [(_, relative)] = self.lib.destinations(
+            [item_in_db], relative_to_libdir=True
+        )
+        [(_, based)] = self.lib.destinations([item_in_db], basedir=b"two")
+
+        assert relative == item_in_db.destination(relative_to_libdir=True)
+        assert based == item_in_db.destination(basedir=b"two")
+
+    def test_albums_of_old_batches_are_forgotten(self):
+        self.set_path_formats()
+        for i in range(6):
+            self.lib.add_album(
+                [_common.item(self.lib, album=f"a{i}", comp=False)]
+            )
+        items = list(self.lib.items())
+        expected = [(item, item.destination()) for item in items]
+
+        with patch.object(self.lib, "albums", wraps=self.lib.albums) as albums:
+            assert list(self.lib.destinations(items, batch_size=2)) == expected
+            assert list(self.lib.destinations(items * 2, batch_size=4)) == (
+                expected * 2
+            )
+
+        # Only the albums of about the last two batches are kept, and the
+        # others are fetched again when they are needed.
+        fetched = [len(c.args[0].pattern) for c in albums.call_args_list]
+        assert fetched == [2, 2, 2, 4, 2, 2]
+
+    def test_path_formats_parsed_once(self):
+        assert self.lib.parsed_path_formats() is self.lib.parsed_path_formats()
+
+        self.lib.path_formats = [("default", "two")]
+        [(query, template)] = self.lib.parsed_path_formats()
+        assert query is None
+        assert template.original == "two"
+
+
 class TestItemFormattedMapping(PytestItemHelper):
     def test_formatted_item_value(self, item_in_db):
         formatted = item_in_db.formatted()
@@ -828,6 +899,41 @@ class TestDisambiguation(TestHelper, PathFormattingMixin):
         self._setf("foo%aunique{albumartist album flex,year}/$title")
         self._assert_dest(b"/base/foo/the title", i1)
 
+    def test_key_computed_field(self, items):
+        i1, _i2 = items
+        self._setf("foo%aunique{albumartist album albumtotal,year}/$title")
+        self._assert_dest(b"/base/foo [2001]/the title", i1)
+
+    def test_added_album_updates_disambiguation(self, items):
+        i1, i2 = items
+        album2 = self.lib.get_album(i2)
+        album2.album = "different album"
+        album2.store()
+        self._assert_dest(b"/base/foo/the title", i1)
+
+        i3 = item()
+        i3.year = 2003
+        self.lib.add_album([i3])
+        self._assert_dest(b"/base/foo [2001]/the title", i1)
+
+    def test_unrelated_change_keeps_index(self, items):
+        i1, _i2 = items
+        build = UniqueIndex._build
+        with patch.object(
+            UniqueIndex, "_build", autospec=True, side_effect=build
+        ) as mock_build:
+            self._assert_dest(b"/base/foo [2001]/the title", i1)
+            album1 = self.lib.get_album(i1)
+            album1.comments = "unrelated"
+            album1.store()
+            self._assert_dest(b"/base/foo [2001]/the title", i1)
+            assert mock_build.call_count == 1
+
+            album1.year = 2003
+            album1.store()
+            self._assert_dest(b"/base/foo [2003]/the title", i1)
+            assert mock_build.call_count == 2
+
 
 class TestSingletonDisambiguation(TestHelper, PathFormattingMixin):
     @pytest.fixture(autouse=True)
@@ -76,6 +76,21 @@ class TestPluginRegistration(IOMixin, PluginTestHelper):
         ):
             Item._types
 
+    def test_template_function_registered(self):
+        class ShoutPlugin(plugins.BeetsPlugin):
+            def __init__(self):
+                super().__init__()
+                self.template_funcs["shout"] = str.upper
+
+        self.register_plugin(ShoutPlugin)
+        item = Item(title="hello", artist="a")
+
+        assert (
+            item.evaluate_template("%shout{$title} %ifdef{artist,yes}")
+            == "HELLO yes"
+        )
+        assert Item(title="bye").evaluate_template("%shout{$title}") == "BYE"
+
     def test_listener_registered(self):
         self.RatingPlugin()
         item = self.add_item_fixture(artist="XXX")
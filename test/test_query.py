@@ -16,19 +16,23 @@
 
 import logging
 import os
+import sqlite3
 import sys
 from functools import partial
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
 from beets import util
 from beets.dbcore import types
+from beets.dbcore.db import Results, Transaction
 from beets.dbcore.query import (
     AndQuery,
     BooleanQuery,
     DateQuery,
     FalseQuery,
+    FullTextQuery,
     MatchQuery,
     NoneQuery,
     NotQuery,
@@ -42,7 +46,7 @@ from beets.dbcore.query import (
     SubstringQuery,
     TrueQuery,
 )
-from beets.library import Item
+from beets.library import Item, Library, parse_query_string
 from beets.test import _common
 
 # Because the absolute path begins with something like C:, we
@@ -306,6 +310,180 @@ class TestMatch:
         assert q.match(item) == should_match
         assert not NotQuery(q).match(item) == should_match
 
+        # Compiled predicates agree.
+        assert q.compile(Item)(item) == should_match
+        assert not NotQuery(q).compile(Item)(item) == should_match
+
+
+class TestCompile:
+    @pytest.fixture(scope="class")
+    def lib(self, helper):
+        helper.add_item(title="first", year=2001, flex="x")
+        helper.add_item(title="second", year=2002, flex="y")
+        return helper.lib
+
+    @pytest.mark.parametrize(
+        "q, expected_titles",
+        [
+            _p(NumericQuery("year", "2001", fast=False), {"first"}, id="fixed"),
+            _p(
+                OrQuery(
+                    [
+                        StringQuery("title", "FIRST", fast=False),
+                        NotQuery(RegexpQuery("title", "s", fast=False)),
+                    ]
+                ),
+                {"first"},
+                id="compound",
+            ),
+        ],
+    )
+    def test_row_predicate(self, lib, q, expected_titles):
+        assert q.compile_row(Item) is not None
+
+        with patch.object(
+            Results,
+            "_make_model",
+            autospec=True,
+            side_effect=Results._make_model,
+        ) as make_model:
+            titles = {i.title for i in lib.items(q)}
+
+        assert titles == expected_titles
+        # Objects are only built for the matching rows.
+        assert make_model.call_count == len(expected_titles)
+
+    @pytest.mark.parametrize(
+        "q, expected_titles",
+        [
+            _p(SubstringQuery("flex", "x", fast=False), {"first"}, id="flex"),
+            _p(
+                BooleanQuery("singleton", True, fast=False),
+                {"first", "second"},
+                id="computed",
+            ),
+            _p(
+                AndQuery(
+                    [
+                        MatchQuery("year", 2001, fast=False),
+                        SubstringQuery("flex", "x", fast=False),
+                    ]
+                ),
+                {"first"},
+                id="partly-flex",
+            ),
+        ],
+    )
+    def test_object_predicate(self, lib, q, expected_titles):
+        assert q.compile_row(Item) is None
+        assert {i.title for i in lib.items(q)} == expected_titles
+
+    def test_overridden_match_is_used(self):
+        class OddYearQuery(NumericQuery):
+            def match(self, obj):
+                return obj.year % 2 == 1
+
+        q = OddYearQuery("year", "2002", fast=False)
+
+        assert q.compile_row(Item) is None
+        assert q.compile(Item)(Item(year=2001))
+
+
+class TestSplit:
+    FAST = MatchQuery("artist", "one")
+    SLOW = SubstringQuery("flex", "x", fast=False)
+
+    @pytest.mark.parametrize(
+        "q, expected_fast, expected_slow",
+        [
+            _p(FAST, FAST, None, id="fast"),
+            _p(SLOW, TrueQuery(), SLOW, id="slow"),
+            _p(AndQuery([FAST, SLOW]), AndQuery([FAST]), SLOW, id="and"),
+            _p(
+                AndQuery([SLOW, AndQuery([FAST, SLOW])]),
+                AndQuery([AndQuery([FAST])]),
+                AndQuery([SLOW, SLOW]),
+                id="nested-and",
+            ),
+            _p(
+                OrQuery([FAST, SLOW]),
+                TrueQuery(),
+                OrQuery([FAST, SLOW]),
+                id="or-is-not-split",
+            ),
+            _p(
+                NotQuery(AndQuery([FAST, SLOW])),
+                TrueQuery(),
+                NotQuery(AndQuery([FAST, SLOW])),
+                id="not-is-not-split",
+            ),
+        ],
+    )
+    def test_split(self, q, expected_fast, expected_slow):
+        assert q.split() == (expected_fast, expected_slow)
+
+    def test_split_query_results(self, helper):
+        helper.add_item(title="first", artist="one", flex="x")
+        helper.add_item(title="second", artist="one", flex="y")
+        helper.add_item(title="third", artist="two", flex="x")
+
+        q = AndQuery([self.FAST, self.SLOW])
+        assert [i.title for i in helper.lib.items(q)] == ["first"]
+
+
+class TestFlexQuery:
+    @pytest.fixture(scope="class")
+    def lib(self, helper):
+        album = helper.lib.add_album(
+            [
+                helper.create_item(title="inherits", flexint=2, mood="calm"),
+                helper.create_item(title="overrides", flexint=5, genre2="x"),
+            ]
+        )
+        album.genre2 = "pop"
+        album.store(inherit=False)
+        helper.add_item(title="single", flexint=10, mood="Angry", genre2="")
+        helper.add_item(title="bare")
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(Item, "_types", {"flexint": types.Integer()})
+            yield helper.lib
+
+    @pytest.mark.parametrize(
+        "q, expected_titles",
+        [
+            _p("mood:calm", {"inherits"}, id="substring"),
+            _p("mood:angry", {"single"}, id="substring-case-insensitive"),
+            _p("mood:=calm", {"inherits"}, id="exact"),
+            _p("mood::^A", {"single"}, id="regexp"),
+            _p(
+                "mood:", {"inherits", "overrides", "single", "bare"}, id="empty"
+            ),
+            _p("-mood:calm", {"overrides", "single", "bare"}, id="negated"),
+            _p("flexint:2..5", {"inherits", "overrides"}, id="numeric-range"),
+            _p("flexint:10", {"single"}, id="numeric-typed"),
+            _p("flexint:..", {"inherits", "overrides", "single"}, id="any"),
+            _p("genre2:pop", {"inherits"}, id="album-fallback"),
+            _p("genre2:x", {"overrides"}, id="item-overrides-album"),
+            _p("genre2:=", {"single"}, id="exact-empty"),
+            _p("genre2:pop mood:calm", {"inherits"}, id="and"),
+        ],
+    )
+    def test_flex_query(self, lib, q, expected_titles):
+        query, _ = parse_query_string(q, Item)
+        assert query.clause()[0], "query is evaluated in Python"
+
+        assert {i.title for i in lib.items(q)} == expected_titles
+        # SQL and Python agree.
+        assert {i.title for i in lib.items() if query.match(i)} == (
+            expected_titles
+        )
+
+    @pytest.mark.parametrize("q", ["has_cover_art:true", "filesize:1"])
+    def test_computed_field_query_is_slow(self, lib, q):
+        query, _ = parse_query_string(q, Item)
+        assert query.split()[1] is not None
+
 
 class TestPathQuery:
     """Tests for path-based querying functionality in the database system.
@@ -548,6 +726,132 @@ class TestDefaultSearchFields:
         assert bool(getattr(lib, entity)(q)) == should_match
 
 
+class TestFullTextSearch:
+    @pytest.fixture(scope="class")
+    def lib(self, helper):
+        helper.config["full_text_search"] = True
+        lib = Library(":memory:", helper.libdir)
+        for title, artist, comments in [
+            ("Help!", "The Beatles", ""),
+            ("Heroes", "David Bowie", 'say "hello"'),
+            ("Caf\xe9", "Anonymous", "b\xe9"),
+        ]:
+            lib.add(Item(title=title, artist=artist, comments=comments))
+        lib.add_album([Item(title="Title", album="Abbey Road")])
+        return lib
+
+    @pytest.mark.parametrize(
+        "q, expected_titles",
+        [
+            _p("beat", {"Help!"}, id="substring"),
+            _p("BEATLES", {"Help!"}, id="case-insensitive"),
+            _p("he", {"Help!", "Heroes"}, id="short-term-like-fallback"),
+            _p('"hello"', {"Heroes"}, id="quotes"),
+            _p("caf\xe9", {"Caf\xe9"}, id="unicode"),
+            _p("road", {"Title"}, id="album-field"),
+            _p("^beat", {"Heroes", "Caf\xe9", "Title"}, id="negated"),
+            _p("beat bowie", set(), id="conjunction"),
+        ],
+    )
+    def test_search(self, lib, q, expected_titles):
+        assert {i.title for i in lib.items(q)} == expected_titles
+
+    def test_uses_index(self, lib):
+        assert isinstance(lib._parse_query(Item, "beat")[0][0], FullTextQuery)
+        assert isinstance(lib._parse_query(Item, "be")[0][0], OrQuery)
+
+    def test_albums(self, lib):
+        assert {a.album for a in lib.albums("abbey")} == {"Abbey Road"}
+
+    def test_index_follows_writes(self, lib):
+        item_id = lib.add(Item(title="Tomorrow Never Knows"))
+        assert {i.title for i in lib.items("never")} == {"Tomorrow Never Knows"}
+
+        item = lib.get_item(item_id)
+        item.title = "Rain"
+        item.store()
+        assert not lib.items("never")
+        assert {i.title for i in lib.items("rain")} == {"Rain"}
+
+        item.remove()
+        assert not lib.items("rain")
+
+
+class TestFullTextSearchIndex:
+    @pytest.fixture
+    def open_lib(self, helper, tmp_path):
+        libs = []
+
+        def open_lib(full_text_search):
+            helper.config["full_text_search"] = full_text_search
+            libs.append(Library(str(tmp_path / "library.db"), helper.libdir))
+            return libs[-1]
+
+        yield open_lib
+        for lib in libs:
+            lib._close()
+
+    def _has_index(self, lib):
+        with lib.transaction() as tx:
+            return bool(
+                tx.query(
+                    "SELECT 1 FROM sqlite_master WHERE name = ?",
+                    (Item._fts_table,),
+                )
+            )
+
+    def test_index_is_kept_without_option(self, open_lib):
+        open_lib(True)
+        lib = open_lib(False)
+        lib.add(Item(title="Tomorrow Never Knows"))
+
+        assert self._has_index(lib)
+        assert not isinstance(
+            lib._parse_query(Item, "never")[0][0], FullTextQuery
+        )
+        lib = open_lib(True)
+        assert {i.title for i in lib.items("never")} == {"Tomorrow Never Knows"}
+
+    def test_index_is_not_rebuilt(self, open_lib):
+        open_lib(True)
+        open_lib(False)
+        with patch.object(Transaction, "script", autospec=True) as script:
+            open_lib(True)
+
+        assert not any("rebuild" in c.args[1] for c in script.call_args_list)
+
+    def test_remove_index(self, open_lib):
+        lib = open_lib(True)
+        lib.remove_fts_tables()
+        lib.add(Item(title="Tomorrow Never Knows"))
+
+        assert not self._has_index(lib)
+        assert not isinstance(
+            lib._parse_query(Item, "never")[0][0], FullTextQuery
+        )
+        assert {i.title for i in lib.items("never")} == {"Tomorrow Never Knows"}
+
+    def test_remove_index_without_fts5(self, open_lib):
+        lib = open_lib(True)
+        script = Transaction.script
+
+        def no_fts5(tx, statements):
+            if "DROP TABLE" in statements:
+                raise sqlite3.OperationalError("no such module: fts5")
+            script(tx, statements)
+
+        with patch.object(Transaction, "script", no_fts5):
+            lib.remove_fts_tables()
+        lib.add(Item(title="Tomorrow Never Knows"))
+
+        with lib.transaction() as tx:
+            assert not tx.query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                "AND name LIKE ?",
+                (f"{Item._fts_table}%",),
+            )
+
+
 class TestRelatedQueries:
     """Test album-level queries with track-level filters and vice-versa."""
 
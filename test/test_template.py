@@ -14,7 +14,10 @@
 
 """Tests for template engine."""
 
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 
 from beets.util import functemplate
 
@@ -268,3 +271,54 @@ class EvalTest(unittest.TestCase):
 
     def test_function_call_with_empty_arg(self):
         assert self._eval("%len{}") == "0"
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "templates")
+
+    def tearDown(self):
+        functemplate.configure_cache()
+        self.temp_dir.cleanup()
+
+    def test_compiled_template_reused_from_disk(self):
+        functemplate.configure_cache(directory=self.cache_dir)
+        functemplate.Template("foo $bar %lower{X}")
+        assert len(os.listdir(self.cache_dir)) == 1
+
+        with patch.object(functemplate, "compile_module") as compile_module:
+            tmpl = functemplate.Template("foo $bar %lower{X}")
+
+        compile_module.assert_not_called()
+        assert tmpl.compiled != tmpl.interpret
+        values, functions = {"bar": "baz"}, {"lower": str.lower}
+        assert tmpl.substitute(values, functions) == "foo baz x"
+
+    def test_corrupt_cache_file_ignored(self):
+        functemplate.configure_cache(directory=self.cache_dir)
+        functemplate.Template("$foo")
+        [name] = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(b"garbage")
+
+        tmpl = functemplate.Template("$foo")
+        assert tmpl.compiled != tmpl.interpret
+        assert tmpl.substitute({"foo": "bar"}) == "bar"
+
+    def test_compile_error_falls_back_to_interpreter(self):
+        with patch.object(
+            functemplate, "compile_module", side_effect=RecursionError
+        ):
+            tmpl = functemplate.Template("$foo")
+
+        assert tmpl.compiled == tmpl.interpret
+        assert tmpl.substitute({"foo": "bar"}) == "bar"
+
+    def test_cache_size(self):
+        functemplate.configure_cache(size=1)
+        tmpl = functemplate.template("$foo")
+        assert functemplate.template("$foo") is tmpl
+
+        functemplate.template("$bar")
+        assert functemplate.template("$foo") is not tmpl
@@ -0,0 +1,43 @@
+import pytest
+
+from beets import ui
+from beets.test.helper import BeetsTestCase, IOMixin
+
+
+class ChangesCommandTest(IOMixin, BeetsTestCase):
+    def setup_beets(self):
+        self.config["change_journal"] = True
+        super().setup_beets()
+
+    def test_show_changes_since_revision(self):
+        item = self.add_item(title="old")
+        revision = self.lib.change_revision
+        item.title = "new"
+        item.store()
+
+        output = self.run_with_output("changes", "--since", str(revision))
+
+        assert output == f"{revision + 1} update items {item.id} mtime title\n"
+
+    def test_compact(self):
+        item = self.add_item(title="old")
+        item.title = "new"
+        item.store()
+
+        output = self.run_with_output("changes", "--compact")
+
+        assert output == "Removed 3 merged changes.\n"
+        assert [c.op for c in self.lib.changes()] == ["add"]
+
+    def test_remove(self):
+        self.add_item()
+
+        self.run_command("changes", "--remove")
+
+        assert not self.lib.change_journal
+
+    def test_journal_disabled(self):
+        self.lib.remove_changes()
+
+        with pytest.raises(ui.UserError):
+            self.run_command("changes")
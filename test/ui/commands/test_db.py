@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import pytest
+
+from beets.dbcore.query import PathQuery
+from beets.exceptions import UserError
+from beets.library import Library
+from beets.test.helper import BeetsTestCase, IOMixin
+from beets.ui.commands.db import db_func, show_indices
+
+
+class DbCommandTest(IOMixin, BeetsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lib._close()
+        self.config["record_queries"] = True
+        self.lib = Library(":memory:", self.libdir)
+        self.add_item(albumartist="A", album="B")
+
+    def test_suggest_and_create_indices(self):
+        list(self.lib.items("albumartist:=A album:=B"))
+
+        show_indices(self.lib, True, 1)
+        output = self.io.getoutput()
+
+        assert (
+            "items_by_albumartist_album: items (albumartist, album)" in output
+        )
+        assert "Created 1 indices." in output
+        assert self.lib.suggest_indices() == []
+
+    def test_case_insensitive_path_index(self):
+        with patch("beets.util.case_sensitive", return_value=False):
+            q = PathQuery("path", self.lib_path)
+        list(self.lib.items(q))
+
+        [suggestion] = self.lib.suggest_indices()
+        self.lib.create_indices([suggestion])
+
+        assert suggestion.index.columns == ("bytelower(path)",)
+        with self.lib.transaction() as tx:
+            sql, subvals = q.clause()
+            plan = tx.query(
+                f"EXPLAIN QUERY PLAN SELECT * FROM items WHERE {sql}", subvals
+            )
+        assert any("items_by_bytelower_path" in r["detail"] for r in plan)
+
+    def test_nothing_to_suggest(self):
+        show_indices(self.lib, False, 1)
+
+        assert self.io.getoutput() == "No indices to suggest.\n"
+
+    def test_remove_search_index(self):
+        with patch.object(self.lib, "remove_fts_tables") as remove:
+            db_func(self.lib, None, ["remove-search-index"])
+
+        remove.assert_called_once_with()
+
+    def test_unknown_action(self):
+        with pytest.raises(UserError):
+            db_func(self.lib, None, ["vacuum"])
@@ -66,3 +66,11 @@ class ListTest(IOMixin, BeetsTestCase):
         stdout = self._run_list(album=True, fmt="$genres")
         assert "the genre" in stdout
         assert "the album" not in stdout
+
+    def test_list_item_format_album_flex_field(self):
+        album = self.lib.get_album(self.item)
+        album["albumflex"] = "album value"
+        album.store(inherit=False)
+
+        stdout = self._run_list(fmt="$title: $albumflex $unknown")
+        assert stdout.strip() == "the title: album value $unknown"
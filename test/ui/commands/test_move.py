@@ -1,5 +1,6 @@
 import os
 import shutil
+from unittest.mock import patch
 
 from beets import library
 from beets.test.helper import BeetsTestCase
@@ -47,6 +48,22 @@ class MoveTest(BeetsTestCase):
         assert self.i.filepath.exists()
         assert self.initial_item_path.exists()
 
+    def test_move_item_does_not_recompute_destination(self):
+        with patch.object(
+            library.Item, "destination", side_effect=AssertionError
+        ):
+            self._move()
+        self.i.load()
+        assert b"libdir" in self.i.path
+
+    def test_move_album_does_not_recompute_destination(self):
+        with patch.object(
+            library.Item, "destination", side_effect=AssertionError
+        ):
+            self._move(album=True)
+        self.i.load()
+        assert b"libdir" in self.i.path
+
     def test_move_album(self):
         self._move(album=True)
         self.i.load()
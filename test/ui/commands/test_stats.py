@@ -0,0 +1,39 @@
+from beets.test.helper import BeetsTestCase, IOMixin
+from beets.ui.commands.stats import show_stats
+
+
+class StatsTest(IOMixin, BeetsTestCase):
+    def setUp(self):
+        super().setUp()
+        for artist, length, bitrate in [
+            ("A", 60.5, 128000),
+            ("A", 120.25, 256000),
+            ("B", 30.0, 320000),
+        ]:
+            self.add_item(
+                artist=artist,
+                albumartist=artist,
+                length=length,
+                bitrate=bitrate,
+                myflex=artist,
+            )
+
+    def _run_stats(self, query=""):
+        show_stats(self.lib, query, False)
+        return self.io.getoutput()
+
+    def test_stats(self):
+        stdout = self._run_stats()
+
+        # 968000 + 3848000 + 1200000 bytes
+        assert "Tracks: 3" in stdout
+        assert "Total time: 3.5 minutes" in stdout
+        assert "Approximate total size: 5.7 MiB" in stdout
+        assert "Artists: 2" in stdout
+        assert "Album artists: 2" in stdout
+
+    def test_stats_query(self):
+        stdout = self._run_stats("myflex:A")
+
+        assert "Tracks: 2" in stdout
+        assert "Artists: 1" in stdout
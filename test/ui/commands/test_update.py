@@ -1,8 +1,10 @@
 import os
+from unittest.mock import patch
 
+import pytest
 from mediafile import MediaFile
 
-from beets import library
+from beets import library, ui
 from beets.test import _common
 from beets.test.helper import BeetsTestCase, IOMixin
 from beets.ui.commands.update import update_items
@@ -203,3 +205,30 @@ class UpdateTest(IOMixin, BeetsTestCase):
         self._update(exclude_fields=["lyrics"])
         item = self.lib.items().get()
         assert item.lyrics != "new lyrics"
+
+    def test_interrupted_update_keeps_moved_paths(self):
+        for path in (self.i.path, self.i2.path):
+            mf = MediaFile(syspath(path))
+            mf.title = "differentTitle"
+            mf.save()
+        self.i2.mtime = 0
+        self.i2.store()
+
+        show_model_changes = ui.show_model_changes
+        calls = []
+
+        def interrupt(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > 1:
+                raise KeyboardInterrupt
+            return show_model_changes(*args, **kwargs)
+
+        with (
+            patch.object(ui, "show_model_changes", interrupt),
+            pytest.raises(KeyboardInterrupt),
+        ):
+            self._update(move=True)
+
+        moved = [i for i in self.lib.items() if b"differentTitle" in i.path]
+        assert len(moved) == 1
+        assert os.path.exists(syspath(moved[0].path))
@@ -26,6 +26,7 @@ from confuse import ConfigError
 
 from beets import config, plugins, ui
 from beets.exceptions import UserError
+from beets.library import Album, Item
 from beets.test import _common
 from beets.test.helper import BeetsTestCase, IOMixin, PluginTestCase
 from beets.ui import _open_library, commands
@@ -166,6 +167,19 @@ class ConfigTest(IOMixin, TestPluginTestCase):
         assert key == "x"
         assert template.original == "y"
 
+    def test_promote_fields(self):
+        with self.write_config_file() as config:
+            config.write("promote_fields: {items: [mood], albums: [rating]}")
+
+        try:
+            self.run_command("test")
+
+            assert "mood" in Item._fields
+            assert "rating" in Album._fields
+        finally:
+            Item.promote_fields([])
+            Album.promote_fields([])
+
     def test_nonexistant_db(self):
         with self.write_config_file() as config:
             config.write("library: /xxx/yyy/not/a/real/path")
@@ -413,6 +427,16 @@ class CommonOptionsParserCliTest(IOMixin, BeetsTestCase):
         # output = self.run_with_output('stats', '-e')
         # assert 'Total size:' in output
 
+    def test_sql_profile(self):
+        with self.assertLogs("beets", "INFO") as logs:
+            self.run_command("--sql-explain", "ls", "artist:the")
+        self.lib.profiler = None
+
+        summary = logs.output[-1]
+        assert "SQL profile:" in summary
+        assert "SELECT items." in summary
+        assert "plan: " in summary
+
     def test_version(self):
         output = self.run_with_output("version")
         assert "Python version" in output